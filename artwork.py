@@ -0,0 +1,110 @@
+# artwork.py
+import os
+import hashlib
+from collections import OrderedDict
+from PIL import Image
+import customtkinter as ctk
+from instrumentation import traced
+from metadata_cache import file_key
+from workers import VISIBLE
+
+# Configuration
+THUMBNAIL_DIR = os.path.join(".cache", "thumbnails")
+PLACEHOLDER_COLOR = "#404040"
+IMAGE_CACHE = 256  # thumbnails kept in memory, about 30 KB each at 100 px; a screenful is far fewer
+
+def source_key(path):
+    """Hash an image file's path, size and mtime, so an edited file gets a new thumbnail without being read"""
+    size, mtime = file_key(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}\0{size}\0{mtime}".encode("utf-8")).hexdigest()
+
+@traced("make_thumbnail")
+def make_thumbnail(path, size, thumb_dir=THUMBNAIL_DIR):
+    """Return (source key, resized image), decoding the source only on a disk-cache miss"""
+    digest = source_key(path)
+    thumb_path = os.path.join(thumb_dir, f"{digest}_{size}.png")
+    if os.path.exists(thumb_path):
+        image = Image.open(thumb_path)
+        image.load()
+        return digest, image
+
+    image = Image.open(path).convert("RGB").resize((size, size))
+    os.makedirs(thumb_dir, exist_ok=True)
+    tmp_path = f"{thumb_path}.{os.getpid()}.tmp"
+    image.save(tmp_path, "PNG")
+    os.replace(tmp_path, thumb_path)
+    return digest, image
+
+class ArtworkLoader:
+    """Lazily builds album thumbnails on the shared worker pool and hands CTkImages back on the Tk thread"""
+
+    def __init__(self, workers, size, thumb_dir=THUMBNAIL_DIR):
+        self.workers = workers
+        self.size = size
+        self.thumb_dir = thumb_dir
+        self._images = OrderedDict()   # source key -> CTkImage, least recently used first
+        self._by_path = OrderedDict()  # artwork path -> source key, least recently used first
+        self._pending = {}  # artwork path -> (task, callbacks waiting for it)
+
+        blank = Image.new("RGB", (size, size), PLACEHOLDER_COLOR)
+        self.placeholder = ctk.CTkImage(light_image=blank, dark_image=blank, size=(size, size))
+
+    def get(self, path):
+        """Return the thumbnail for an artwork path if it has already been loaded"""
+        digest = self._by_path.get(path)
+        image = self._images.get(digest) if digest else None
+        if image is not None:
+            self._by_path.move_to_end(path)
+            self._images.move_to_end(digest)
+        return image
+
+    def request(self, path, callback, priority=VISIBLE):
+        """Call callback(image) on the Tk thread once the thumbnail for path is ready"""
+        image = self.get(path)
+        if image is not None:
+            callback(image)
+            return
+        if path in self._pending:
+            self._pending[path][1].append(callback)
+            return
+
+        task = self.workers.submit(make_thumbnail, path, self.size, self.thumb_dir, priority=priority,
+                                   on_done=lambda result, p=path: self._loaded(p, result),
+                                   on_error=lambda error, p=path: self._failed(p))
+        self._pending[path] = (task, [callback])
+
+    def forget(self, path):
+        """Drop the thumbnail for an artwork file that changed, so the next request reads it again"""
+        self._by_path.pop(path, None)
+
+    def cancel(self, path, callback):
+        """Withdraw a request, e.g. for a row scrolled away; the decode is dropped if nobody else wants it"""
+        pending = self._pending.get(path)
+        if pending is None or callback not in pending[1]:
+            return
+        pending[1].remove(callback)
+        if not pending[1]:
+            pending[0].cancel()
+            del self._pending[path]
+
+    def _loaded(self, path, result):
+        digest, pil_image = result
+        callbacks = self._pending.pop(path, (None, []))[1]
+        image = self._images.get(digest)
+        if image is None:
+            image = ctk.CTkImage(light_image=pil_image, dark_image=pil_image, size=(self.size, self.size))
+        self._remember(self._images, digest, image)
+        self._remember(self._by_path, path, digest)
+        for callback in callbacks:
+            callback(image)
+
+    def _remember(self, cache, key, value):
+        # Rows scrolled away long ago are the first to go; they are read back from the disk cache if shown again
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > IMAGE_CACHE:
+            cache.popitem(last=False)
+
+    def _failed(self, path):
+        # Missing or unreadable artwork keeps its placeholder
+        self._pending.pop(path, None)
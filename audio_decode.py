@@ -0,0 +1,78 @@
+# audio_decode.py
+import os
+import sys
+import shutil
+import argparse
+import subprocess
+import numpy as np
+
+# Configuration
+SAMPLE_RATE = 44100
+CHANNELS = 2
+BLOCK_FRAMES = SAMPLE_RATE  # frames per decoded block (one second)
+FFMPEG = shutil.which("ffmpeg")
+
+def iter_pcm(path, block_frames=BLOCK_FRAMES, rate=SAMPLE_RATE, start=0):
+    """Yield int16 arrays of shape (frames, CHANNELS) decoded from an audio file, from start seconds on.
+
+    The file is decoded by a child process and streamed through a pipe, so only one
+    block is in memory here at a time: ffmpeg, or without it this module run as a
+    script, which decodes through pygame. The caller's own mixer is never touched.
+    """
+    if FFMPEG:
+        command = [FFMPEG, "-v", "error", "-nostdin"]
+        if start:
+            command += ["-ss", str(start)]
+        command += ["-i", path, "-f", "s16le", "-acodec", "pcm_s16le", "-ac", str(CHANNELS), "-ar", str(rate), "-"]
+    else:
+        command = [sys.executable, os.path.abspath(__file__), path, "--rate", str(rate), "--start", str(start)]
+    yield from _iter_process(command, path, block_frames)
+
+def _iter_process(command, path, block_frames):
+    block_bytes = block_frames * CHANNELS * 2
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as proc:
+        finished = False
+        try:
+            while True:
+                data = proc.stdout.read(block_bytes)
+                if not data:
+                    break
+                usable = len(data) - len(data) % (CHANNELS * 2)
+                yield np.frombuffer(data[:usable], dtype=np.int16).reshape(-1, CHANNELS)
+            finished = True
+        finally:
+            if not finished:
+                # The consumer stopped early; don't leave the decoder blocked on a full pipe
+                proc.kill()
+        errors = proc.stderr.read()
+        if proc.wait() != 0:
+            raise OSError(f"could not decode {path}: {errors.decode(errors='replace').strip()}")
+
+def _decode_pygame(path, rate):
+    """Decode a whole file through pygame; only run in the child process iter_pcm starts"""
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    import pygame
+    pygame.mixer.init(frequency=rate, size=-16, channels=CHANNELS)
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if samples.ndim == 1:
+        samples = np.repeat(samples[:, None], CHANNELS, axis=1)
+    return samples.astype(np.int16, copy=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode an audio file to 16-bit stereo PCM on stdout")
+    parser.add_argument("path")
+    parser.add_argument("--rate", type=int, default=SAMPLE_RATE)
+    parser.add_argument("--start", type=float, default=0)
+    args = parser.parse_args()
+
+    try:
+        samples = _decode_pygame(args.path, args.rate)
+    except Exception as e:
+        sys.exit(str(e))
+    out = sys.stdout.buffer
+    try:
+        for i in range(int(args.start * args.rate), len(samples), BLOCK_FRAMES):
+            out.write(samples[i:i + BLOCK_FRAMES].tobytes())
+        out.flush()
+    except BrokenPipeError:
+        pass  # The reader stopped early
@@ -0,0 +1,270 @@
+# benchmark.py
+import os
+import sys
+import gc
+import json
+import atexit
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+import tracemalloc
+from synthetic_library import generate_library, iter_albums, FILE_LIMIT
+
+# Configuration
+SIZES = (100, 1000, 10000, 100000, 1000000)
+WORK_DIR = os.path.join(".cache", "benchmarks")
+OUTPUT_PATH = "benchmark_results.json"
+REPEATS = 3           # best-of runs for paths that take under REPEAT_BELOW seconds
+REPEAT_BELOW = 1.0
+XVFB_DISPLAY = ":99"
+
+def measure(fn, repeats=REPEATS):
+    """Return (best seconds, peak traced bytes) for fn(); memory is traced on a separate run"""
+    gc.collect()
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > REPEAT_BELOW:
+            break
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def retained(fn):
+    """Bytes still allocated for fn()'s result after it returns, e.g. a loaded library"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+# Benchmarked paths, returned as {name: fn} to time
+
+def core_paths(root):
+    from models import LibraryStore, Playlist, load_catalog
+    from convert_txt_to_json import parse_input_txt
+    from suggestions import SuggestionEngine
+    from search_index import SearchIndex
+    from snapshot import save_snapshot, open_snapshot
+
+    entries = list(iter_albums(_track_count(root)))
+    albums = load_catalog(os.path.join(root, "input.json"))
+    snapshot_path = os.path.join(root, "library.snapshot")
+    save_snapshot(albums[0].store, albums, os.path.join(root, "input.json"), snapshot_path)
+    warm = SuggestionEngine(Playlist)
+    warm.add_albums(albums)
+    warm.suggestions()
+    index = SearchIndex()
+    index.add_albums(albums)
+
+    def build_suggestions():
+        engine = SuggestionEngine(Playlist)
+        engine.add_albums(albums)
+        engine.suggestions()
+
+    return {
+        "load_catalog_json": lambda: load_catalog(os.path.join(root, "input.json")),
+        "load_catalog_jsonl": lambda: load_catalog(os.path.join(root, "input.jsonl")),
+        "open_snapshot": lambda: open_snapshot(os.path.join(root, "input.json"), snapshot_path),
+        "album_init": lambda: _add_albums(LibraryStore(), entries),
+        "parse_input_txt": lambda: parse_input_txt(os.path.join(root, "input.txt"), on_error=lambda *args: None),
+        "suggestions_cold": build_suggestions,
+        "suggestions_warm": warm.suggestions,
+        "search_index_build": lambda: SearchIndex().add_albums(albums),
+        "search_query": lambda: [index.search(q) for q in ("ka", "mira", "sol ven", "tomi rasu")],
+    }
+
+def footprint_paths(root):
+    """Long-lived structures whose retained size is measured rather than their build time"""
+    from models import Playlist, load_catalog
+    from suggestions import SuggestionEngine
+    from search_index import SearchIndex
+
+    def indexed_library():
+        albums = load_catalog(os.path.join(root, "input.json"))
+        index = SearchIndex()
+        index.add_albums(albums)
+        suggestions = SuggestionEngine(Playlist)
+        suggestions.add_albums(albums)
+        return albums, index, suggestions
+
+    return {
+        "library_memory": lambda: load_catalog(os.path.join(root, "input.json")),
+        "indexed_library_memory": indexed_library,
+    }
+
+def _add_albums(store, entries):
+    return [store.add_album(e["title"], e["artist"], e["artwork"], e["tracks"]) for e in entries]
+
+def gui_paths():
+    """The Tk views, built on a real MusicPlayerApp loaded from the library in the working directory"""
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import main
+    main.CONTROL_API = False
+    main.ANALYZE_LOUDNESS = False
+    main.PROGRESSIVE_LOAD = False  # The benchmarks need the whole library in place
+    main.STARTUP_REPORT = False
+    main.WATCH_LIBRARY = False
+    main.FIND_DUPLICATES = False
+    app = main.MusicPlayerApp()
+    app.update()
+
+    def show_library():
+        app._show_playlists()
+        app._show_library()
+        app.update_idletasks()
+
+    def populate_tracks():
+        dialog = main.CreatePlaylistDialog(app, app.albums, app.engine.search_index)
+        dialog.update_idletasks()
+        dialog.destroy()
+
+    def populate_track_list():
+        app._populate_track_list_album(max(app.albums[:100], key=lambda a: len(a.tracks)))
+        app.update_idletasks()
+
+    return {
+        "show_library": show_library,
+        "create_playlist_dialog": populate_tracks,
+        "populate_track_list_album": populate_track_list,
+        "generate_suggested_playlists": app._generate_suggested_playlists,
+    }, app
+
+def _track_count(root):
+    with open(os.path.join(root, "tracks"), encoding="utf-8") as f:
+        return int(f.read())
+
+def _stop_server(server):
+    server.terminate()
+    try:
+        server.wait(5)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+def ensure_display():
+    """Return None if Tk can open a window, starting Xvfb when needed; otherwise the reason it cannot"""
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        xvfb = shutil.which("Xvfb")
+        if not xvfb:
+            return "no DISPLAY and Xvfb is not installed"
+        server = subprocess.Popen([xvfb, XVFB_DISPLAY, "-screen", "0", "1600x1000x24"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        atexit.register(_stop_server, server)  # However the run ends, the server goes with it
+        os.environ["DISPLAY"] = XVFB_DISPLAY
+        time.sleep(1)
+    try:
+        import tkinter
+        tkinter.Tk().destroy()
+    except Exception as e:
+        return f"Tk is unavailable: {e}"
+    return None
+
+def prepare(size, work_dir, file_limit):
+    root = os.path.join(work_dir, f"library_{size}")
+    marker = os.path.join(root, "tracks")
+    if not os.path.exists(marker):
+        generate_library(root, size, file_limit=file_limit)
+        with open(marker, "w", encoding="utf-8") as f:
+            f.write(str(size))
+    return root
+
+def run(sizes, work_dir, file_limit, gui=True, only=None):
+    results = []
+    display_problem = ensure_display() if gui else "disabled with --no-gui"
+
+    def record(name, size, fn, footprint=False):
+        if only and name not in only:
+            return
+        try:
+            if footprint:
+                result = {"name": name, "tracks": size, "retained_bytes": retained(fn)}
+            else:
+                seconds, peak = measure(fn)
+                result = {"name": name, "tracks": size, "seconds": round(seconds, 6), "peak_bytes": peak}
+        except Exception as e:
+            result = {"name": name, "tracks": size, "error": f"{type(e).__name__}: {e}"}
+        results.append(result)
+        print(json.dumps(result), flush=True)
+
+    for size in sizes:
+        root = prepare(size, work_dir, file_limit)
+        for name, fn in core_paths(root).items():
+            record(name, size, fn)
+        for name, fn in footprint_paths(root).items():
+            record(name, size, fn, footprint=True)
+        if display_problem:
+            results.append({"name": "gui", "tracks": size, "skipped": display_problem})
+            continue
+        # Catalog paths are relative, so the app runs from inside the library
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            paths, app = gui_paths()
+            for name, fn in paths.items():
+                record(name, size, fn)
+            app.engine.shutdown()
+            app.destroy()
+        finally:
+            os.chdir(cwd)
+    return results
+
+def compare(results, baseline_path):
+    """Print each result's time or retained memory relative to the same benchmark in an earlier results file"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["name"], r["tracks"]): r for r in json.load(f)["results"]}
+    for result in results:
+        old = baseline.get((result["name"], result["tracks"]))
+        for metric, unit, scale in (("seconds", "s", 1), ("retained_bytes", " MB", 1 / 1e6)):
+            if old and old.get(metric) and metric in result:
+                ratio = result[metric] / old[metric]
+                flag = "  <-- worse" if ratio > 1.2 else ""
+                print(f"{result['name']:<28} {result['tracks']:>8}  {old[metric] * scale:.4f}{unit} -> "
+                      f"{result[metric] * scale:.4f}{unit}  x{ratio:.2f}{flag}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile LumaTune's hot paths on synthetic libraries")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="library sizes in tracks")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--compare", metavar="RESULTS", help="earlier results file to compare against")
+    parser.add_argument("--work-dir", default=WORK_DIR)
+    parser.add_argument("--file-limit", type=int, default=FILE_LIMIT, help="largest library that gets audio and artwork files")
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks")
+    parser.add_argument("--no-gui", action="store_true", help="skip the Tk benchmarks")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.work_dir, args.file_limit, gui=not args.no_gui, only=args.only)
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Wrote {len(results)} results to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
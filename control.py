@@ -0,0 +1,359 @@
+# control.py
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+
+# Configuration
+SOCKET_PATH = os.path.join(".cache", "control.sock")
+HOST = "127.0.0.1"
+PORT = 47800
+USE_UNIX_SOCKET = hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+LINE_LIMIT = 1 << 20  # longest request line accepted
+
+class ControlError(Exception):
+    pass
+
+class ControlServer:
+    """Local JSON-lines control endpoint for a PlayerEngine.
+
+    Listens on a UNIX socket, or on localhost TCP where those are unavailable. Each
+    request is one line, {"id": 1, "cmd": "next", "args": {}}, answered with
+    {"id": 1, "ok": true, "result": ...} or {"id": 1, "ok": false, "error": "..."}.
+    After {"cmd": "subscribe"} the connection also receives engine events as
+    {"event": "track", "data": ...} lines.
+
+    The server runs its own asyncio loop; commands reach the engine through
+    dispatch(fn), which must run fn on the engine's thread (Tk's after(0, fn) in the app).
+    Albums and playlists are addressed by index, tracks by album index and track index.
+    """
+
+    def __init__(self, engine, dispatch, path=SOCKET_PATH, host=HOST, port=PORT):
+        self.engine = engine
+        self.dispatch = dispatch
+        self.path = path
+        self.host = host
+        self.port = port
+        self.loop = None
+        self._server = None
+        self._subscribers = set()
+        self._album_ids = {}
+
+        # Listeners run on the engine thread; events are serialised there and handed to the loop
+        engine.on("state", lambda state: self._publish("state", state))
+        engine.on("track", lambda track: self._publish("track", self._track(track)))
+        engine.on("position", lambda seconds, duration: self._publish(
+            "position", {"seconds": round(seconds, 3), "duration": round(duration, 3)}))
+        engine.on("queue", lambda source: self._publish("queue", self.status()["source"]))
+        engine.on("ended", lambda: self._publish("ended", None))
+        engine.on("playlists", lambda: self._publish("playlists", [p.name for p in engine.playlists]))
+        engine.on("options", lambda shuffle, repeat: self._publish("options", {"shuffle": shuffle, "repeat": repeat}))
+        engine.on("changed", self._on_library_changed)
+        engine.on("duplicates", lambda: self._publish("duplicates", len(engine.duplicate_clusters())))
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        if USE_UNIX_SOCKET:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path):
+                os.unlink(self.path)  # Left behind by a player that did not shut down cleanly
+            self._server = await asyncio.start_unix_server(self._handle, self.path, limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=LINE_LIMIT)
+
+    def start_in_thread(self):
+        """Serve from a background thread, e.g. next to Tk's mainloop; returns once listening"""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, name="control", daemon=True).start()
+        ready.wait()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        def close():
+            self._server.close()
+            if USE_UNIX_SOCKET and os.path.exists(self.path):
+                os.unlink(self.path)
+        self.loop.call_soon_threadsafe(close)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._respond(line, writer)
+                writer.write(response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def _respond(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            command = request["cmd"]
+            args = request.get("args") or {}
+            if command == "subscribe":
+                # Handled here: the subscriber set belongs to the loop thread
+                self._subscribers.add(writer)
+                result = True
+            else:
+                handler = COMMANDS.get(command)
+                if handler is None:
+                    raise ControlError(f"unknown command {command!r}")
+                result = await self._call(handler, args)
+            reply = {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            reply = {"id": request_id, "ok": False, "error": str(e) or type(e).__name__}
+        return (json.dumps(reply, ensure_ascii=False) + "\n").encode("utf-8")
+
+    async def _call(self, handler, args):
+        """Run handler(self, args) on the engine thread and wait for its result"""
+        future = self.loop.create_future()
+
+        def run():
+            try:
+                result = handler(self, **args)
+            except Exception as e:
+                self.loop.call_soon_threadsafe(_settle, future, None, e)
+            else:
+                self.loop.call_soon_threadsafe(_settle, future, result, None)
+
+        self.dispatch(run)
+        return await future
+
+    def _publish(self, event, data):
+        if self.loop is None:
+            return
+        line = (json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n").encode("utf-8")
+        self.loop.call_soon_threadsafe(self._broadcast, line)
+
+    def _broadcast(self, line):
+        for writer in list(self._subscribers):
+            if writer.is_closing():
+                self._subscribers.discard(writer)
+            else:
+                writer.write(line)
+
+    def _on_library_changed(self, removed, added):
+        self._album_ids = {}  # Album ids are library positions, which the change may have shifted
+        self._publish("library", {"removed": len(removed), "added": len(added), "albums": len(self.engine.albums)})
+
+    # Engine thread helpers: translate between ids and library objects
+
+    def _album_id(self, album):
+        if len(self._album_ids) != len(self.engine.albums):
+            self._album_ids = {a: i for i, a in enumerate(self.engine.albums)}
+        return self._album_ids.get(album)
+
+    def _track(self, track):
+        if track is None:
+            return None
+        album = track.album
+        return {"album": self._album_id(album), "track": album.tracks.index(track),
+                "name": track.name, "artist": album.artist, "album_title": album.title,
+                "plays": self.engine.play_count(track)}
+
+    def _album(self, album):
+        return {"album": self._album_id(album), "title": album.title, "artist": album.artist,
+                "tracks": len(album.tracks)}
+
+    def _lookup_track(self, album, track):
+        return self.engine.albums[album].tracks[track]
+
+    def status(self):
+        engine = self.engine
+        if engine.current_album is not None:
+            source = {"album": self._album_id(engine.current_album)}
+        elif engine.current_playlist is not None:
+            playlist = engine.current_playlist
+            source = {"playlist": engine.playlists.index(playlist) if playlist in engine.playlists else None,
+                      "name": playlist.name}
+        else:
+            source = None
+        return {
+            "state": engine.playback.state,
+            "track": self._track(engine.current_track),
+            "position": round(engine.position(), 3),
+            "duration": round(engine.playback.duration, 3),
+            "volume": engine.playback.volume,
+            "normalization": engine.playback.normalization,
+            "crossfade": engine.playback.crossfade,
+            "shuffle": engine.queue.shuffle,
+            "repeat": engine.queue.repeat,
+            "source": source,
+        }
+
+def _settle(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+def _up_next(server, limit=20):
+    return [server._track(track) for track in server.engine.queue.tracks[:limit]]
+
+def _search(server, query, limit=50):
+    results = []
+    for kind, obj in server.engine.search(query, limit):
+        if kind == "artist":
+            results.append({"kind": kind, "name": obj})
+        elif kind == "album":
+            results.append(dict(server._album(obj), kind=kind))
+        else:
+            results.append(dict(server._track(obj), kind=kind))
+    return results
+
+# name -> handler(server, **args); runs on the engine thread
+COMMANDS = {
+    "ping": lambda server: "pong",
+    "status": lambda server: server.status(),
+    "albums": lambda server, offset=0, limit=100: [
+        server._album(a) for a in server.engine.albums[offset:offset + limit]],
+    "playlists": lambda server: [
+        {"playlist": i, "name": p.name, "tracks": len(p.tracks)} for i, p in enumerate(server.engine.playlists)],
+    "search": _search,
+    "queue": _up_next,
+    "play_album": lambda server, album, track=0: server.engine.play_album(server.engine.albums[album], track) or True,
+    "play_playlist": lambda server, playlist, track=0: server.engine.play_playlist(
+        server.engine.playlists[playlist], track) or True,
+    "jump": lambda server, item: server.engine.play_queued(item) or True,
+    "next": lambda server: server.engine.next() or True,
+    "previous": lambda server: server.engine.previous() or True,
+    "pause": lambda server: server.engine.pause() or True,
+    "resume": lambda server: server.engine.resume() or True,
+    "toggle": lambda server: server.engine.toggle_pause() or True,
+    "seek": lambda server, seconds: server.engine.seek(float(seconds)) or True,
+    "volume": lambda server, volume: server.engine.set_volume(min(1.0, max(0.0, float(volume)))) or True,
+    "normalization": lambda server, mode: server.engine.set_normalization(mode) or True,
+    "crossfade": lambda server, seconds: server.engine.set_crossfade(float(seconds)) or True,
+    "shuffle": lambda server, enabled: server.engine.set_shuffle(bool(enabled)) or True,
+    "repeat": lambda server, mode: server.engine.set_repeat(mode) or True,
+    "play_next": lambda server, album, track: server.engine.play_next(server._lookup_track(album, track)) or True,
+    "add_to_queue": lambda server, album, track: server.engine.add_to_queue(
+        server._lookup_track(album, track)) or True,
+    "duplicates": lambda server: [[server._track(t) for t in tracks] for tracks in server.engine.duplicate_clusters()],
+    "collapse_duplicates": lambda server, playlist: server.engine.collapse_duplicates(server.engine.playlists[playlist]),
+}
+
+class ControlClient:
+    """Blocking client for scripts and tests: client.call("next"), client.call("seek", seconds=30)"""
+
+    def __init__(self, path=SOCKET_PATH, host=HOST, port=PORT):
+        if USE_UNIX_SOCKET:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rwb")
+        self._next_id = 0
+
+    def call(self, command, **args):
+        self._next_id += 1
+        request = {"id": self._next_id, "cmd": command, "args": args}
+        self.file.write((json.dumps(request) + "\n").encode("utf-8"))
+        self.file.flush()
+        while True:
+            reply = json.loads(self.file.readline())
+            if reply.get("id") == self._next_id:
+                break  # Anything else is an event for a subscribed connection
+        if not reply["ok"]:
+            raise ControlError(reply["error"])
+        return reply["result"]
+
+    def events(self):
+        """Subscribe and yield (event, data) pairs as the player reports them"""
+        self.call("subscribe")
+        for line in self.file:
+            message = json.loads(line)
+            if "event" in message:
+                yield message["event"], message["data"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def run_headless(catalog=None):
+    """Run the engine and control server on one asyncio loop, with no window"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import instrumentation
+    from engine import PlayerEngine, AsyncioScheduler
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        scheduler = AsyncioScheduler(loop)
+        instrumentation.install(scheduler)
+        engine = PlayerEngine(scheduler)
+        engine.load_library(catalog)
+        engine.watch_library()
+        engine.find_duplicates()
+        server = ControlServer(engine, loop.call_soon)
+        await server.start()
+        print(f"LumaTune listening on {SOCKET_PATH if USE_UNIX_SOCKET else f'{HOST}:{PORT}'}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            engine.shutdown()
+            server.stop()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+def _print_round_trips(client, count=1000):
+    start = time.perf_counter()
+    for _ in range(count):
+        client.call("ping")
+    elapsed = (time.perf_counter() - start) / count
+    print(f"{count} pings, {elapsed * 1000:.3f} ms per round trip")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run LumaTune without a window, or send it a command")
+    parser.add_argument("command", nargs="?", help="e.g. status, next, toggle, seek seconds=30, events, bench")
+    parser.add_argument("args", nargs="*", help="key=value arguments; values are parsed as JSON when possible")
+    parser.add_argument("--headless", action="store_true", help="run the player and serve the control API")
+    parser.add_argument("--catalog", default=None)
+    args = parser.parse_args()
+
+    if args.headless:
+        run_headless(args.catalog)
+        sys.exit()
+    if not args.command:
+        parser.error("give a command or --headless")
+
+    client = ControlClient()
+    if args.command == "events":
+        for event, data in client.events():
+            print(event, json.dumps(data, ensure_ascii=False))
+    elif args.command == "bench":
+        _print_round_trips(client)
+    else:
+        kwargs = {}
+        for pair in args.args:
+            key, _, value = pair.partition("=")
+            try:
+                kwargs[key] = json.loads(value)
+            except ValueError:
+                kwargs[key] = value
+        print(json.dumps(client.call(args.command, **kwargs), indent=2, ensure_ascii=False))
@@ -1,33 +1,147 @@
+import os
+import re
+import sys
 import json
+import argparse
+from collections import deque
+
+FORMATS = ("pretty", "compact", "jsonl")
+# A track file line ends in a file name with an extension, whatever the format;
+# an album title or artist line met there means the record is misaligned
+TRACK_FILE = re.compile(r"[^/\\]\.\w{1,5}$")
+
+def iter_lines(f):
+    """Yield (line number, text) for every non-blank line"""
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if line:
+            yield number, line
+
+def report_error(line_number, message):
+    print(f"line {line_number}: {message}", file=sys.stderr)
+
+def iter_albums(lines, on_error=report_error):
+    """Yield albums one at a time from (line number, text) pairs.
+
+    A record is title, artist, artwork, track count, then a name and file line per track.
+    Malformed records are reported through on_error(line_number, message) and parsing
+    resumes on the line after the bad record's first line, so only one record's lines
+    are ever held in memory. Lines skipped while resyncing are not reported again, but
+    once a line is followed by a valid track count it starts a record of its own, and
+    that record's errors are reported like any other's.
+    """
+    lines = iter(lines)
+    buffer = deque()
+    resyncing = False
+
+    def fill(n):
+        while len(buffer) < n:
+            line = next(lines, None)
+            if line is None:
+                return False
+            buffer.append(line)
+        return True
+
+    while fill(1):
+        if not fill(4):
+            if not resyncing:
+                on_error(buffer[0][0], f"truncated album record {buffer[0][1]!r}")
+            return
+        (title_no, title), (_, artist), (_, artwork), (count_no, count_text) = list(buffer)[:4]
+        try:
+            num_tracks = int(count_text)
+            if num_tracks < 0:
+                raise ValueError
+        except ValueError:
+            if not resyncing:
+                on_error(count_no, f"expected a track count for album {title!r}, got {count_text!r}")
+            resyncing = True
+            buffer.popleft()
+            continue
+        resyncing = False  # A record header: whatever is wrong with it from here is its own error
 
-def parse_input_txt(txt_path):
-    with open(txt_path, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip()]
-    
-    i = 0
-    albums = []
-    while i < len(lines):
-        title = lines[i]
-        artist = lines[i+1]
-        artwork = lines[i+2]
-        num_tracks = int(lines[i+3])
-        i += 4
         tracks = []
-        for _ in range(num_tracks):
-            track_name = lines[i]
-            track_file = lines[i+1]
-            tracks.append({"name": track_name, "location": track_file})
-            i += 2
-        albums.append({
+        error = None
+        for k in range(num_tracks):
+            if not fill(6 + 2 * k):
+                error = (title_no, f"album {title!r} is truncated: expected {num_tracks} tracks, found {k}")
+                break
+            name = buffer[4 + 2 * k][1]
+            file_no, track_file = buffer[5 + 2 * k]
+            if not TRACK_FILE.search(track_file):
+                error = (file_no, f"expected a track file for {name!r} in album {title!r}, got {track_file!r}")
+                break
+            tracks.append({"name": name, "location": track_file})
+
+        if error:
+            on_error(*error)
+            resyncing = True
+            buffer.popleft()
+            continue
+
+        for _ in range(4 + 2 * num_tracks):
+            buffer.popleft()
+        yield {
             "title": title,
             "artist": artist,
             "artwork": artwork,
             "tracks": tracks
-        })
-    return albums
+        }
+
+def parse_input_txt(txt_path, on_error=report_error):
+    with open(txt_path, 'r', encoding='utf-8') as f:
+        return list(iter_albums(iter_lines(f), on_error))
+
+def write_json(albums, f, indent=4):
+    """Write albums as a JSON array one element at a time; indent=None gives compact output"""
+    count = 0
+    f.write("[")
+    for album in albums:
+        if indent is None:
+            f.write("," if count else "")
+            json.dump(album, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            # Same layout json.dump(..., indent=indent) produces for the whole list
+            f.write(",\n" if count else "\n")
+            text = json.dumps(album, indent=indent, ensure_ascii=False)
+            f.write("\n".join(" " * indent + line for line in text.split("\n")))
+        count += 1
+    f.write("\n]" if count and indent is not None else "]")
+    return count
+
+def write_jsonl(albums, f):
+    """Write one compact JSON album per line"""
+    count = 0
+    for album in albums:
+        f.write(json.dumps(album, ensure_ascii=False, separators=(",", ":")))
+        f.write("\n")
+        count += 1
+    return count
+
+def write_catalog(albums, path, fmt="pretty"):
+    """Stream albums into path in the given format, replacing the file only once it is complete"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if fmt == "jsonl":
+            count = write_jsonl(albums, f)
+        else:
+            count = write_json(albums, f, indent=None if fmt == "compact" else 4)
+    os.replace(tmp_path, path)
+    return count
 
 if __name__ == "__main__":
-    result = parse_input_txt("input.txt")
-    with open("input.json", "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=4, ensure_ascii=False)
-    print("✅ Converted input.txt to input.json")
+    parser = argparse.ArgumentParser(description="Convert input.txt into the catalog LumaTune loads")
+    parser.add_argument("input", nargs="?", default="input.txt")
+    parser.add_argument("output", nargs="?", default=None, help="default: input.json, or input.jsonl for --format jsonl")
+    parser.add_argument("--format", choices=FORMATS, default="pretty")
+    args = parser.parse_args()
+    output = args.output or ("input.jsonl" if args.format == "jsonl" else "input.json")
+
+    errors = []
+    def on_error(line_number, message):
+        errors.append(line_number)
+        report_error(line_number, message)
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        count = write_catalog(iter_albums(iter_lines(f), on_error), output, args.format)
+    print(f"✅ Converted {args.input} to {output} ({count} albums, {len(errors)} malformed records reported)")
@@ -0,0 +1,341 @@
+# crossfade.py
+import math
+import threading
+import time
+from collections import deque
+
+# NumPy, pygame and the decoder are imported by Crossfader, which is only created once
+# crossfading is switched on and the mixer is open
+
+# Configuration
+CHUNK_FRAMES = 2048     # frames mixed and handed to the channel at a time, 46 ms at 44.1 kHz
+MAX_FADE = 12.0         # longest overlap in seconds; every stream buffers this much ahead
+BUFFER_SECONDS = 2.0    # decoded audio held beyond the longest fade
+SKIP_FADE = 1.0         # seconds over which a track the user picked replaces the playing one
+FEED_INTERVAL = 0.005   # shortest wait of the feeder, e.g. while a decoder is still catching up
+
+class PcmRing:
+    """Fixed-size ring of int16 frames: a decoder thread writes, the feeder reads"""
+
+    def __init__(self, np, frames, channels):
+        self._np = np
+        self.data = np.zeros((frames, channels), dtype=np.int16)
+        self.start = 0           # oldest unread frame
+        self.count = 0           # frames written and not read yet
+        self.finished = False    # the writer is done; nothing more will arrive
+        self.closed = False
+        self._cond = threading.Condition()
+
+    def write(self, block):
+        """Copy a block in, waiting for room; returns False once the ring was closed"""
+        size = len(self.data)
+        while len(block):
+            with self._cond:
+                while self.count == size and not self.closed:
+                    self._cond.wait()
+                if self.closed:
+                    return False
+                end = (self.start + self.count) % size
+                n = min(len(block), size - self.count, size - end)
+                self.data[end:end + n] = block[:n]
+                self.count += n
+            block = block[n:]
+        return True
+
+    def read(self, n):
+        """Take up to n frames without waiting; fewer while the decoder is behind or done"""
+        with self._cond:
+            n = min(n, self.count)
+            first = min(n, len(self.data) - self.start)
+            frames = self._np.concatenate((self.data[self.start:self.start + first], self.data[:n - first]))
+            self.start = (self.start + n) % len(self.data)
+            self.count -= n
+            self._cond.notify()
+        return frames
+
+    def finish(self):
+        with self._cond:
+            self.finished = True
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+class PcmStream:
+    """One track decoded from start seconds on by its own thread into a PcmRing"""
+
+    def __init__(self, np, path, rate, token, gain, start=0):
+        from audio_decode import CHANNELS
+        self.path = path
+        self.token = token  # what the player knows the track by
+        self.gain = gain
+        self.rate = rate
+        self.frame = int(start * rate)  # frames into the track of the next read
+        self.ring = PcmRing(np, int((MAX_FADE + BUFFER_SECONDS) * rate), CHANNELS)
+        self.error = None
+        threading.Thread(target=self._decode, args=(start,), daemon=True).start()
+
+    def _decode(self, start):
+        from audio_decode import iter_pcm
+        blocks = iter_pcm(self.path, block_frames=CHUNK_FRAMES * 4, rate=self.rate, start=start)
+        try:
+            for block in blocks:
+                if not self.ring.write(block):
+                    break
+        except Exception as e:
+            self.error = e  # Played as far as it decoded, like a file that ends early
+        finally:
+            blocks.close()  # Stops ffmpeg when the stream was dropped halfway
+            self.ring.finish()
+
+    @property
+    def ready(self):
+        return self.ring.count >= CHUNK_FRAMES or self.ring.finished
+
+    @property
+    def remaining(self):
+        """Frames left, known once the decoder reached the end; None before"""
+        return self.ring.count if self.ring.finished else None
+
+    @property
+    def drained(self):
+        return self.ring.finished and not self.ring.count
+
+    def read(self, n):
+        frames = self.ring.read(n)
+        self.frame += len(frames)
+        return frames
+
+    def close(self):
+        self.ring.close()
+
+class Crossfader:
+    """Plays tracks on one reserved pygame Channel, overlapping the end of each with the next.
+
+    Every track is decoded by a PcmStream into a bounded ring, so memory stays the same
+    however long the tracks are. A feeder thread mixes CHUNK_FRAMES at a time with
+    equal-power gain curves and keeps the channel's one-sound queue filled, so a chunk
+    is always waiting behind the one playing; it wakes about once per chunk while playing,
+    and not at all while paused or stopped. The player polls events() on its own thread:
+
+        ("advanced", token)   the queued track started fading in by itself
+        ("ended", token)      the last track ran out with nothing queued after it
+    """
+
+    def __init__(self, fade):
+        import numpy as np
+        import pygame
+        rate, size, channels = pygame.mixer.get_init()
+        if size != -16:
+            raise ValueError(f"crossfading needs a 16-bit mixer, not {size}")
+        self._np = np
+        self._pygame = pygame
+        self.rate = rate
+        self.channels = channels
+        self.fade = fade
+        self.channel = pygame.mixer.Channel(0)
+        pygame.mixer.set_reserved(1)  # Sound.play() elsewhere never takes this channel
+        self.current = None     # stream mixed at full gain, or fading in
+        self.next = None        # stream faded into once the current one nears its end
+        self._outgoing = None   # stream fading out
+        self._fade_length = 1   # frames in the running fade
+        self._fade_done = 0
+        self._picked = None     # stream the user picked, faded into as soon as it is ready
+        self._chunks = deque()  # (token, seconds, length) of the chunk playing and the one queued
+        self._playing = None    # (token, seconds, length, monotonic time it started)
+        self._paused_at = None
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)  # notified whenever there may be something to feed
+        self._running = True
+        threading.Thread(target=self._feed, daemon=True).start()
+
+    # Control, from the player's thread
+
+    def play(self, path, token, gain, start=0, fade=True):
+        """Start a track, fading over from the playing one unless fade is False (e.g. when seeking)"""
+        stream = PcmStream(self._np, path, self.rate, token, gain, start)
+        with self._lock:
+            self._drop(self.next)
+            self._drop(self._picked)
+            self.next = self._picked = None
+            if fade and self.current is not None and self._paused_at is None:
+                self._picked = stream
+                return
+            self._drop(self._outgoing)
+            self._drop(self.current)
+            self._outgoing = None
+            self.current = stream
+            self.channel.stop()
+            self._chunks.clear()
+            self._playing = None
+            self._paused_at = None
+            self._wake.notify()
+
+    def queue(self, path, token, gain):
+        """Set the track to fade into when the current one ends; a path of None clears it"""
+        stream = PcmStream(self._np, path, self.rate, token, gain) if path else None
+        with self._lock:
+            self._drop(self.next)
+            self.next = stream
+            self._wake.notify()
+
+    def set_gain(self, token, gain):
+        with self._lock:
+            for stream in (self.current, self._picked, self.next):
+                if stream is not None and stream.token == token:
+                    stream.gain = gain
+
+    def pause(self):
+        with self._lock:
+            if self._paused_at is None:
+                self.channel.pause()
+                self._paused_at = time.monotonic()
+
+    def resume(self):
+        with self._lock:
+            if self._paused_at is not None:
+                self.channel.unpause()
+                if self._playing:
+                    token, seconds, length, started = self._playing
+                    self._playing = (token, seconds, length, started + time.monotonic() - self._paused_at)
+                self._paused_at = None
+                self._wake.notify()
+
+    def stop(self):
+        with self._lock:
+            for stream in (self._outgoing, self.current, self._picked, self.next):
+                self._drop(stream)
+            self._outgoing = self.current = self._picked = self.next = None
+            self.channel.stop()
+            self._chunks.clear()
+            self._playing = None
+            self._paused_at = None
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._running = False
+            self._wake.notify()
+
+    def position(self):
+        """(token, seconds into it) of the audio playing now, or None"""
+        with self._lock:
+            if self._playing is None:
+                return None
+            token, seconds, length, started = self._playing
+            now = self._paused_at or time.monotonic()
+            return token, seconds + min(max(now - started, 0), length)
+
+    def events(self):
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+    def _drop(self, stream):
+        if stream is not None:
+            stream.close()
+
+    # Feeding, on the feeder thread
+
+    def _feed(self):
+        with self._wake:
+            while self._running:
+                if self._paused_at is not None or (self.current is None and self._picked is None):
+                    self._wake.wait()  # Nothing to play until play(), resume() or close()
+                    continue
+                self._fill()
+                self._wake.wait(self._feed_delay())
+
+    def _feed_delay(self):
+        """Seconds until the channel can take another chunk: once the playing one ends, if one is queued"""
+        if self.channel.get_queue() is None or self._playing is None:
+            return FEED_INTERVAL
+        _, _, length, started = self._playing
+        return max(FEED_INTERVAL, started + length - time.monotonic())
+
+    def _fill(self):
+        channel = self.channel
+        if channel.get_queue() is not None:
+            return  # A chunk is already waiting behind the one playing
+        busy = channel.get_busy()
+        if busy and len(self._chunks) > 1:
+            self._chunks.popleft()  # The queued chunk has started, the moment the one before it ended
+            now = time.monotonic()
+            started = min(now, self._playing[3] + self._playing[2]) if self._playing else now
+            self._playing = (*self._chunks[0], started)
+        elif not busy:
+            self._chunks.clear()
+
+        mixed = self._mix()
+        if mixed is None:
+            current = self.current
+            if not busy and current is not None and current.drained and self.next is None and self._picked is None:
+                self._events.append(("ended", current.token))
+                self._drop(current)
+                self.current = None
+                self._playing = None
+            return
+        frames, chunk = mixed
+        sound = self._pygame.mixer.Sound(buffer=frames.tobytes())
+        if busy:
+            channel.queue(sound)
+        else:
+            channel.play(sound)
+            self._playing = (*chunk, time.monotonic())
+        self._chunks.append(chunk)
+
+    def _mix(self):
+        """Mix the next chunk; returns (int16 frames, (token, seconds, length)) or None if there is nothing yet"""
+        np = self._np
+        current, incoming = self.current, self.next
+        if self._picked is not None and self._picked.ready:
+            self._begin_fade(self._picked, int(min(self.fade, SKIP_FADE) * self.rate))
+            self._picked = None
+        elif current is not None and incoming is not None and incoming.ready and self._outgoing is None:
+            # Fade once the rest of the current track fits the overlap; a fade of 0 still
+            # blends the last chunk, so tracks follow each other without a gap
+            remaining = current.remaining
+            if remaining is not None and remaining <= max(int(self.fade * self.rate), CHUNK_FRAMES):
+                self._begin_fade(incoming, remaining)
+                self.next = None
+                self._events.append(("advanced", incoming.token))
+        current = self.current
+        if current is None:
+            return None
+
+        seconds = current.frame / self.rate
+        frames = current.read(CHUNK_FRAMES)
+        outgoing = self._outgoing
+        if outgoing is None:
+            if not len(frames):
+                return None
+            mixed = frames * np.float32(current.gain)
+        else:
+            old = outgoing.read(CHUNK_FRAMES)
+            n = max(len(frames), len(old))
+            if not n:
+                return None
+            # Equal-power curves keep the loudness steady through the overlap
+            t = np.minimum((self._fade_done + np.arange(n, dtype=np.float32)) / self._fade_length, 1)[:, None]
+            mixed = np.zeros((n, old.shape[1]), dtype=np.float32)
+            mixed[:len(frames)] = frames * (np.sin(t[:len(frames)] * (math.pi / 2)) * current.gain)
+            mixed[:len(old)] += old * (np.cos(t[:len(old)] * (math.pi / 2)) * outgoing.gain)
+            self._fade_done += n
+            if outgoing.drained or self._fade_done >= self._fade_length:
+                self._drop(outgoing)
+                self._outgoing = None
+
+        if self.channels != mixed.shape[1]:
+            mixed = np.repeat(mixed.mean(axis=1, keepdims=True), self.channels, axis=1)
+        frames = np.clip(mixed, -32768, 32767).astype(np.int16)
+        return frames, (current.token, seconds, len(frames) / self.rate)
+
+    def _begin_fade(self, stream, length):
+        self._drop(self._outgoing)
+        self._outgoing = self.current
+        self.current = stream
+        self._fade_length = max(length, 1)
+        self._fade_done = 0
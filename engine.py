@@ -0,0 +1,710 @@
+# engine.py
+import os
+import asyncio
+from models import Playlist, LibraryStore, iter_catalog
+from metadata_cache import MetadataCache
+from play_queue import PlayQueue, REPEAT_MODES, REPEAT_ONE
+from playback import Playback, PLAYING
+from search_index import SearchIndex, MAX_RESULTS
+from suggestions import SuggestionEngine
+from loudness import LoudnessAnalyzer, ALBUM
+from persistence import HistoryStore
+from snapshot import open_snapshot, save_snapshot, SNAPSHOT_PATH
+from workers import WorkerPool, LIBRARY, PREFETCH, report_error
+from instrumentation import traced
+
+# Configuration
+CATALOG_PATHS = ("input.jsonl", "input.json")
+GAPLESS = True  # Queue the next track in the mixer so album tracks play back-to-back
+NORMALIZATION = ALBUM  # Loudness normalization: off, track or album
+CROSSFADE = 0  # seconds consecutive tracks overlap; 0 for gapless playback
+LOAD_BATCH = 50  # albums handed over at a time while loading, small enough to index between redraws
+MUSIC_DIR = "musics"   # folders followed by watch_library(), as laid out by scanner.py
+IMAGES_DIR = "images"
+LIBRARY_SNAPSHOT = SNAPSHOT_PATH  # binary copy of the library mapped at startup; None to always parse the catalog
+SNAPSHOT_DELAY = 2000  # ms after the last library change before the snapshot is rewritten
+
+def catalog_path():
+    """Use whichever catalog (input.jsonl or input.json) was written most recently"""
+    existing = [path for path in CATALOG_PATHS if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else CATALOG_PATHS[-1]
+
+class AsyncioScheduler:
+    """The after()/after_cancel() pair Tk provides, on an asyncio loop, for running without a window"""
+
+    def __init__(self, loop):
+        self.loop = loop
+
+    def after(self, ms, callback, *args):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not self.loop:
+            # Called from another thread, which Tk allows too; there is no id to cancel it by
+            self.loop.call_soon_threadsafe(self.loop.call_later, ms / 1000, callback, *args)
+            return None
+        return self.loop.call_later(ms / 1000, callback, *args)
+
+    def after_cancel(self, handle):
+        handle.cancel()
+
+class PlayerEngine:
+    """Library, play queue and playback with no UI attached.
+
+    scheduler supplies after(ms, callback) and after_cancel(id): the Tk root in the app,
+    an AsyncioScheduler when headless. All methods must be called on the scheduler's
+    thread. Listeners registered with on() receive:
+
+        state(state)                 stopped / loading / playing / paused
+        track(track)                 the current track changed
+        position(seconds, duration)
+        queue(source)                an album or playlist was loaded into the play queue
+        ended()                      the queue ran out
+        playlists()                  a playlist was created, edited, deleted or restored
+        options(shuffle, repeat)     shuffle or repeat mode changed
+        library(albums)              albums were added to the library
+        loaded()                     the whole catalog has been loaded
+        changed(removed, added)      files changed on disk: albums were removed, replaced or added
+        artwork(paths)               artwork files changed on disk
+        duplicates()                 duplicate recordings were found or changed
+        ready()                      the audio device is open
+    """
+
+    def __init__(self, scheduler, metadata=None, history=None, gapless=GAPLESS, normalization=NORMALIZATION,
+                 crossfade=CROSSFADE):
+        self.scheduler = scheduler
+        self.workers = WorkerPool(scheduler)  # all blocking I/O, shared with the UI's artwork loader
+        self.metadata = metadata or MetadataCache()
+        self.history = history or HistoryStore(load=False)  # playlists and plays saved across sessions
+        self._restoring = False  # the library loaded before the history did, so matching waits for it
+        self._played = {}  # location -> track played before the history was matched to the library
+        self.watcher = None
+        self._syncing = None  # task working out the albums affected by the last batch of file changes
+        self._catalog = None  # catalog the library was loaded from, which the snapshot is checked against
+        self._snapshot_stale = False  # the catalog was parsed, so the snapshot needs writing once loaded
+        self._snapshot_after = None
+        self._snapshot_task = None
+        self.duplicate_finder = None
+        self.duplicate_index = None  # FingerprintIndex, once the first pass is done
+        self._duplicate_groups = {}  # location -> number of its duplicate cluster
+        self._finding = None         # task fingerprinting the library's latest changes
+        self._stale_fingerprints = set()  # locations changed since, re-fingerprinted one batch at a time
+        self.store = LibraryStore()  # columns behind every Track and Album view
+        self.albums = []
+        self.playlists = []
+        self.queue = PlayQueue()
+        self.current_track = None
+        self.current_album = None
+        self.current_playlist = None
+        self._failures = 0  # tracks in a row that could not be read
+        self.search_index = SearchIndex()  # built on a worker, one batch of album changes at a time
+        self._index_changes = []  # (removed, added) album lists not yet handed to the indexing task
+        self._indexing = None
+        self.suggestions = SuggestionEngine(Playlist)
+        self.loudness_analyzer = LoudnessAnalyzer(self.metadata)
+        self._listeners = {}
+
+        self.playback = Playback(scheduler, self.metadata, self.workers, gapless=gapless,
+                                 normalization=normalization, crossfade=crossfade)
+        self.playback.on("state", lambda state: self._emit("state", state))
+        self.playback.on("track_started", self._on_track_started)
+        self.playback.on("track_end", self._on_track_end)
+        self.playback.on("track_failed", self._on_track_failed)
+        self.playback.on("position", lambda seconds, duration: self._emit("position", seconds, duration))
+        self.playback.on("ready", lambda: self._emit("ready"))
+        self.workers.submit(self.history.load, on_done=self._history_loaded)
+
+    def on(self, event, callback):
+        self._listeners.setdefault(event, []).append(callback)
+
+    def _emit(self, event, *args):
+        for callback in self._listeners.get(event, ()):
+            callback(*args)
+
+    @property
+    def playing(self):
+        return self.playback.state == PLAYING
+
+    # Library
+
+    @traced("PlayerEngine.load_library")
+    def load_library(self, filename=None, analyze=True):
+        """Load the catalog, index it, and start measuring loudness for albums that need it"""
+        self._add_albums(list(self._iter_library(filename or catalog_path())))
+        self._library_loaded(analyze)
+
+    def load_library_in_background(self, filename=None, analyze=True, batch=LOAD_BATCH):
+        """Parse the catalog on a worker and add its albums batch by batch as they arrive"""
+        albums = self._iter_library(filename or catalog_path())
+
+        def read():
+            chunk = []
+            for album in albums:
+                chunk.append(album)
+                if len(chunk) == batch:
+                    self.workers.post(self._add_albums, chunk)
+                    chunk = []
+            return chunk
+
+        def finished(rest):
+            if rest:
+                self._add_albums(rest)
+            self._library_loaded(analyze)
+
+        def failed(error):
+            self._snapshot_stale = False  # A partial library must not be saved as the catalog's
+            self._library_loaded(analyze)  # Keep whatever loaded before the error
+            raise error
+
+        self.workers.submit(read, priority=LIBRARY, on_done=finished, on_error=failed)
+
+    def _iter_library(self, path):
+        """Albums from the library snapshot if it is up to date with the catalog at path, else from the catalog"""
+        self._catalog = path
+        store = open_snapshot(path, LIBRARY_SNAPSHOT) if LIBRARY_SNAPSHOT else None
+        if store is None:
+            self._snapshot_stale = True
+            return iter_catalog(path, self.store)
+        self.store = store
+        self._snapshot_stale = False
+        return map(store.album, range(len(store.album_first)))
+
+    def _add_albums(self, albums):
+        self.albums.extend(albums)
+        self._update_search_index(added=albums)
+        self.suggestions.add_albums(albums)
+        self._emit("library", albums)
+
+    def _update_search_index(self, removed=(), added=()):
+        """Queue album changes for the search index, applied in order by one task at a time"""
+        self._index_changes.append((list(removed), list(added)))
+        self._start_indexing()
+
+    def _start_indexing(self):
+        if self._indexing is None and self._index_changes:
+            changes, self._index_changes = self._index_changes, []
+            self._indexing = self.workers.submit(self._index_albums, changes, priority=LIBRARY,
+                                                 on_done=self._search_indexed, on_error=self._indexing_failed)
+
+    def _index_albums(self, changes):
+        """Worker: apply (removed, added) album lists to the search index, which locks itself per album"""
+        for removed, added in changes:
+            for album in removed:
+                self.search_index.remove_album(album)
+            self.search_index.add_albums(added)
+
+    def _search_indexed(self, result):
+        self._indexing = None
+        self._start_indexing()
+
+    def _indexing_failed(self, error):
+        self._indexing = None
+        report_error(error)
+        self._start_indexing()
+
+    def _library_loaded(self, analyze):
+        if analyze:
+            # Playback picks results up as they land in the metadata cache; the locations are read on its thread
+            self.loudness_analyzer.start(self.store.album_locations(list(self.albums)))
+        self._restore_history()
+        if self._snapshot_stale:
+            self._schedule_snapshot()
+        self._emit("loaded")
+
+    def _schedule_snapshot(self):
+        """Rewrite the snapshot once library changes have settled"""
+        if not LIBRARY_SNAPSHOT or self._catalog is None:
+            return
+        if self._snapshot_after is not None:
+            self.scheduler.after_cancel(self._snapshot_after)
+        self._snapshot_after = self.scheduler.after(SNAPSHOT_DELAY, self._save_snapshot)
+
+    def _save_snapshot(self):
+        self._snapshot_after = None
+        # Written straight from the columns, even ones still mapped from the file being replaced
+        self._snapshot_task = self.workers.submit(save_snapshot, self.store, list(self.albums), self._catalog,
+                                                  LIBRARY_SNAPSHOT, priority=PREFETCH)
+
+    def _history_loaded(self, result):
+        if self._restoring:
+            self._restoring = False
+            self._restore_history()
+
+    def _restore_history(self):
+        """Match saved playlists and play counts to the library's tracks, scanning it on a worker"""
+        history = self.history
+        if not history.loaded:
+            self._restoring = True  # Still being read on a worker
+            return
+        locations = set(history.plays)
+        locations.update(history.recent)
+        for _, tracks in history.playlists.values():
+            locations.update(tracks)
+        self.workers.submit(self.store.tracks_at, locations, priority=LIBRARY, on_done=self._history_restored)
+
+    def _history_restored(self, found):
+        history = self.history
+        found.update(self._played or {})  # Plays recorded while the scan ran
+        self._played = None
+        self.suggestions.restore_history(
+            {found[location]: count for location, count in history.plays.items() if location in found},
+            [found[location] for location in history.recent if location in found])
+
+        # Playlists made this session are already listed; saved ones go before them
+        listed = {playlist.id for playlist in self.playlists}
+        restored = []
+        for playlist_id, (name, locations) in history.playlists.items():
+            if playlist_id not in listed:
+                playlist = Playlist(name, [found[location] for location in locations if location in found])
+                playlist.id = playlist_id
+                restored.append(playlist)
+        if restored:
+            self.playlists[:0] = restored
+            self._emit("playlists")
+
+    # Live library updates
+
+    def watch_library(self, music_dir=MUSIC_DIR, images_dir=IMAGES_DIR):
+        """Follow the music and artwork folders and apply file changes to the loaded library"""
+        from watcher import watch
+        self._music_dir = music_dir
+        self._images_dir = images_dir
+        # The watcher's thread wakes this thread only once a batch of changes has settled
+        self.watcher = watch((music_dir, images_dir), on_ready=lambda: self.workers.post(self._take_changes))
+
+    def _take_changes(self):
+        # One batch at a time; changes arriving meanwhile are gathered into the next
+        if self.watcher is None or self._syncing is not None:
+            return
+        batch = self.watcher.take()
+        if batch:
+            self._syncing = self.workers.submit(self._plan_changes, *batch, list(self.albums),
+                                                priority=LIBRARY, on_done=self._apply_changes,
+                                                on_error=self._changes_failed)
+
+    def _plan_changes(self, paths, rescan, albums):
+        """Worker: re-read the changed files and return ([(album or None, new entry or None)], artwork paths)"""
+        from scanner import (AUDIO_EXTENSIONS, IMAGE_EXTENSIONS, group_albums, slugify, walk_music,
+                             index_images, find_artwork)
+        audio = {p for p in paths if p.lower().endswith(AUDIO_EXTENSIONS)}
+        images = [p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS)]
+        if rescan:
+            # Events were lost: compare the music folder with the library in full
+            on_disk = {path for path, _, _ in walk_music(self._music_dir)}
+            prefix = self._music_dir.rstrip("/") + "/"
+            listed = {t.location for album in albums for t in album.tracks if t.location.startswith(prefix)}
+            audio |= on_disk ^ listed
+
+        self.metadata.forget(audio)
+        # Replaced albums stay behind in the store, so only tracks of albums still listed count
+        live = set(albums)
+        existing = {path: t for path, t in self.store.tracks_at(audio).items() if t.album in live}
+        present = {path for path in audio if os.path.exists(path)}
+        new_files = {}
+        for path in present - existing.keys():
+            data = self.metadata.get(path)
+            if data is not None:  # Unreadable files stay out, as when scanning
+                new_files[path] = data
+        gone = {existing[path] for path in audio - present if path in existing}
+
+        entries = {}  # album, or (artist, title) for a new one -> catalog entry
+
+        def entry(album):
+            if album not in entries:
+                entries[album] = {"title": album.title, "artist": album.artist, "artwork": album.artwork_path,
+                                  "tracks": [{"name": t.name, "location": t.location} for t in album.tracks]}
+            return entries[album]
+
+        gone_locations = {track.location for track in gone}
+        for album in {track.album for track in gone}:
+            e = entry(album)
+            e["tracks"] = [t for t in e["tracks"] if t["location"] not in gone_locations]
+
+        if new_files:
+            by_key = {(album.artist, album.title): album for album in albums}
+            image_index = None
+            for (artist, title), tracks in group_albums(new_files).items():
+                album = by_key.get((artist, title))
+                if album is not None:
+                    e = entry(album)
+                else:
+                    if image_index is None:
+                        image_index = index_images(self._images_dir)
+                    artwork = find_artwork(title, [path for _, _, path in tracks], image_index, self._images_dir)
+                    e = entries[(artist, title)] = {"title": title, "artist": artist, "artwork": artwork, "tracks": []}
+                e["tracks"].extend({"name": name, "location": path} for _, name, path in tracks)
+
+        # New artwork in images/ goes to albums of the same name that have none on disk
+        artwork = set(images)
+        slugs = {slugify(os.path.splitext(os.path.basename(p))[0]): p for p in images if os.path.exists(p)}
+        if slugs:
+            for album in albums:
+                path = slugs.get(slugify(album.title))
+                if path and album.artwork_path != path and not os.path.exists(album.artwork_path):
+                    entry(album)["artwork"] = path
+
+        changes = [(album if not isinstance(album, tuple) else None, e if e["tracks"] else None)
+                   for album, e in entries.items()]
+        return changes, artwork
+
+    def _apply_changes(self, result):
+        self._syncing = None
+        changes, artwork = result
+        replaced = {}
+        added = []
+        for album, e in changes:
+            new = self.store.add_album(e["title"], e["artist"], e["artwork"], e["tracks"]) if e else None
+            if album is None:
+                if new is not None:
+                    added.append(new)
+            else:
+                replaced[album] = new
+        if replaced or added:
+            self.replace_albums(replaced, added)
+        if artwork:
+            self._emit("artwork", artwork)
+        self._take_changes()
+
+    def _changes_failed(self, error):
+        self._syncing = None
+        report_error(error)
+        self._take_changes()
+
+    def replace_albums(self, replaced, added=()):
+        """Swap albums for replacements ({old: new, or None to remove}) and append added ones, in place"""
+        position = {album: i for i, album in enumerate(self.albums)}
+        tracks = {}  # old track -> its replacement, or None
+        for old, new in replaced.items():
+            self.suggestions.remove_album(old)
+            by_location = {t.location: t for t in new.tracks} if new else {}
+            for track in old.tracks:
+                tracks[track] = by_location.get(track.location)
+            if old in position:
+                self.albums[position[old]] = new
+        self.albums[:] = [album for album in self.albums if album is not None]
+        self.albums.extend(added)
+
+        fresh = [new for new in replaced.values() if new is not None] + list(added)
+        self._update_search_index(replaced, fresh)
+        self.suggestions.add_albums(fresh)
+        # Plays were counted against the old views; saved counts carry over by location
+        plays = self.history.plays
+        self.suggestions.add_play_counts({t: plays[t.location] for album in fresh for t in album.tracks
+                                          if t.location in plays})
+
+        if tracks:
+            playing = self.current_album in replaced
+            if playing:
+                self.current_album = replaced[self.current_album]
+            edited = [playlist for playlist in self.playlists if playlist.replace_tracks(tracks)]
+            if playing or self.current_playlist in edited:
+                self._reload_queue(self.current_album or self.current_playlist, tracks)
+            if edited:
+                self._emit("playlists")
+        self._schedule_snapshot()
+        if self.duplicate_finder is not None:
+            self._refresh_duplicates([t.location for t in tracks] + [t.location for album in fresh for t in album.tracks])
+        self._emit("changed", list(replaced), fresh)
+
+    # Duplicates
+
+    def find_duplicates(self):
+        """Fingerprint the whole library on a background thread, after loudness analysis, then follow its changes"""
+        from fingerprint import DuplicateFinder
+        if self.duplicate_finder is not None:
+            return
+        self.duplicate_finder = DuplicateFinder(self.metadata)
+        # Read on the finder's thread, after loudness analysis
+        locations = (location for paths in self.store.album_locations(list(self.albums)) for location in paths)
+        self.duplicate_finder.start(locations, on_done=lambda index: self.workers.post(self._duplicates_found, index),
+                                    on_error=lambda error: self.workers.post(self._duplicates_failed, error),
+                                    wait_for=self.loudness_analyzer)
+
+    def _duplicates_found(self, index):
+        self.duplicate_index = index
+        self._group_duplicates(index.clusters())
+        self._emit("duplicates")
+        self._refresh_duplicates(())
+
+    def _duplicates_failed(self, error):
+        self._finding = None
+        report_error(error)
+
+    def _refresh_duplicates(self, locations):
+        # Changed files are dropped from the index and fingerprinted again if still listed
+        self._stale_fingerprints.update(locations)
+        if self.duplicate_index is None or self._finding is not None or not self._stale_fingerprints:
+            return
+        stale, self._stale_fingerprints = self._stale_fingerprints, set()
+        self._finding = self.workers.submit(self._fingerprint_changes, stale, list(self.albums), priority=PREFETCH,
+                                            on_done=self._fingerprints_changed, on_error=self._duplicates_failed)
+
+    def _fingerprint_changes(self, stale, albums):
+        """Worker: re-index the stale locations still in the library and return the new clusters.
+
+        Only one such task runs at a time, so the index is never touched by two threads.
+        Files are decoded in the worker processes, as in the full pass.
+        """
+        index = self.duplicate_index
+        live = {t.location for album in albums for t in album.tracks}
+        for location in stale:
+            index.remove(location)
+        index.add_many(self.duplicate_finder.fingerprint([location for location in stale if location in live],
+                                                        self.workers.processes))
+        return index.clusters()
+
+    def _fingerprints_changed(self, clusters):
+        self._finding = None
+        self._group_duplicates(clusters)
+        self._emit("duplicates")
+        self._refresh_duplicates(())
+
+    def _group_duplicates(self, clusters):
+        self._duplicate_groups = {location: i for i, cluster in enumerate(clusters) for location in cluster}
+
+    def duplicate_clusters(self):
+        """Lists of tracks holding the same recording, largest first"""
+        clusters = {}
+        for album in self.albums:
+            for track in album.tracks:
+                group = self._duplicate_groups.get(track.location)
+                if group is not None:
+                    clusters.setdefault(group, []).append(track)
+        return sorted((tracks for tracks in clusters.values() if len(tracks) > 1), key=len, reverse=True)
+
+    def duplicates_in(self, playlist):
+        """Positions of tracks that repeat a recording already earlier in the playlist"""
+        kept = {}  # cluster -> location of its first track in the playlist
+        positions = []
+        for i, track in enumerate(playlist.tracks):
+            group = self._duplicate_groups.get(track.location)
+            if group is None:
+                continue
+            first = kept.setdefault(group, track.location)
+            if first != track.location:  # The same file listed twice is left alone
+                positions.append(i)
+        return positions
+
+    def collapse_duplicates(self, playlist):
+        """Keep only the first copy of each recording in a playlist; returns how many tracks were removed"""
+        positions = self.duplicates_in(playlist)
+        tracks = playlist.tracks
+        for i in reversed(positions):
+            self.history.remove_from_playlist(playlist.id, tracks[i].location, self._copies_before(tracks, i))
+            playlist.remove_track(i)
+            if playlist is self.current_playlist:
+                self.queue.remove(i)
+        if positions:
+            if playlist is self.current_playlist:
+                self._prefetch_next()
+            self._emit("playlists")
+        return len(positions)
+
+    @traced("PlayerEngine.search")
+    def search(self, query, limit=MAX_RESULTS):
+        return self.search_index.search(query, limit)
+
+    @traced("PlayerEngine.suggested_playlists")
+    def suggested_playlists(self):
+        return self.suggestions.suggestions()
+
+    # Playlists
+
+    def add_playlist(self, playlist):
+        playlist.id = self.history.create_playlist(playlist.name, [t.location for t in playlist.tracks])
+        self.playlists.append(playlist)
+        self._emit("playlists")
+
+    def copy_playlist(self, playlist):
+        """Save a copy of e.g. a suggested playlist under the same name"""
+        copy = Playlist(playlist.name, playlist.tracks)
+        self.add_playlist(copy)
+        return copy
+
+    def delete_playlist(self, playlist):
+        self.playlists.remove(playlist)
+        self.history.delete_playlist(playlist.id)
+        self._emit("playlists")
+
+    def _copies_before(self, tracks, index):
+        """How many earlier entries of a playlist are the same file, which tells the history which copy went.
+
+        Saved playlists can list files the library no longer has, so an index here is not one there.
+        """
+        location = tracks[index].location
+        return sum(1 for track in tracks[:index] if track.location == location)
+
+    def remove_from_playlist(self, playlist, index):
+        if not 0 <= index < len(playlist.tracks):
+            return
+        tracks = playlist.tracks
+        self.history.remove_from_playlist(playlist.id, tracks[index].location, self._copies_before(tracks, index))
+        playlist.remove_track(index)
+        if playlist is self.current_playlist:
+            # Queue entries are addressed by source position; order, shuffle and queued tracks stay as they are
+            self.queue.remove(index)
+            self._prefetch_next()  # The removed track may be the one read ahead or queued in the mixer
+        self._emit("playlists")
+
+    # Playback
+
+    def play_album(self, album, start=0):
+        if album.tracks:
+            self.current_album = album
+            self.current_playlist = None
+            self._load_queue(album, album.tracks, start)
+
+    def play_playlist(self, playlist, start=0):
+        if playlist.tracks:
+            self.current_playlist = playlist
+            self.current_album = None
+            self._load_queue(playlist, playlist.tracks, start)
+
+    def _load_queue(self, source, tracks, start):
+        self.queue.load(tracks, start)
+        self._emit("queue", source)
+        self.play_track(self.queue.current)
+
+    def _reload_queue(self, source, replacements):
+        """Follow a rescan of the album or playlist being played without interrupting the current track"""
+        self.queue.replace_tracks(source.tracks if source is not None else [], replacements)
+        if replacements.get(self.current_track) is not None:
+            self.current_track = replacements[self.current_track]  # Same file, through the new album's view
+        if source is not None:
+            self._emit("queue", source)  # Track list rows are queue ids, so they are redrawn with it
+        self._prefetch_next()
+
+    def play_track(self, track):
+        if not track:
+            return
+        self._set_current_track(track)
+        self.playback.play(track)
+
+    def play_queued(self, item_id):
+        """Play an entry of the current queue, e.g. a row clicked in the track list"""
+        self.play_track(self.queue.jump(item_id))
+
+    def next(self):
+        if self.current_track:
+            self.play_track(self.queue.next())
+
+    def previous(self):
+        if self.current_track:
+            self.play_track(self.queue.previous())
+
+    def pause(self):
+        self.playback.pause()
+
+    def resume(self):
+        self.playback.resume()
+
+    def toggle_pause(self):
+        if self.playing:
+            self.playback.pause()
+        else:
+            self.playback.resume()
+
+    def seek(self, seconds):
+        if self.current_track:
+            self.playback.seek(seconds)
+
+    def set_volume(self, volume):
+        self.playback.set_volume(volume)
+
+    def set_normalization(self, mode):
+        self.playback.set_normalization(mode)
+
+    def set_crossfade(self, seconds):
+        self.playback.set_crossfade(seconds)
+
+    def set_shuffle(self, enabled):
+        self.queue.set_shuffle(enabled)
+        self._options_changed()
+
+    def set_repeat(self, mode):
+        if mode not in REPEAT_MODES:
+            raise ValueError(f"unknown repeat mode {mode!r}")
+        self.queue.repeat = mode
+        self._options_changed()
+
+    def cycle_repeat(self):
+        mode = self.queue.cycle_repeat()
+        self._options_changed()
+        return mode
+
+    def _options_changed(self):
+        self._prefetch_next()
+        self._emit("options", self.queue.shuffle, self.queue.repeat)
+
+    def play_next(self, track):
+        self.queue.play_next(track)
+        self._prefetch_next()
+
+    def add_to_queue(self, track):
+        self.queue.add_to_queue(track)
+        self._prefetch_next()
+
+    def position(self):
+        return self.playback.position() if self.current_track else 0
+
+    def play_count(self, track):
+        return self.suggestions.play_count(track)
+
+    def shutdown(self):
+        self.loudness_analyzer.stop()
+        if self.duplicate_finder is not None:
+            self.duplicate_finder.stop()
+        if self._snapshot_after is not None or (self._snapshot_task and self._snapshot_task.cancel()):
+            # Changes from the last moments would otherwise be missing at the next start
+            if self._snapshot_after is not None:
+                self.scheduler.after_cancel(self._snapshot_after)
+            save_snapshot(self.store, list(self.albums), self._catalog, LIBRARY_SNAPSHOT)
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.playback.close()
+        self.workers.shutdown()
+        self.history.close()
+
+    def _set_current_track(self, track):
+        self.current_track = track
+        self._emit("track", track)
+
+    def _prefetch_next(self):
+        """Read ahead whatever the queue will play next so the transition needs no disk I/O"""
+        self.playback.prefetch(self.queue.peek_next())
+
+    def _on_track_started(self, track, auto):
+        self._failures = 0
+        self.suggestions.record_play(track)
+        self.history.record_play(track.location)
+        if self._played is not None:
+            self._played[track.location] = track
+        if auto:
+            # The mixer already moved on to the queued track; catch the queue up
+            self.queue.next(auto=True)
+            self._set_current_track(track)
+        self._prefetch_next()
+
+    def _on_track_end(self):
+        """Advance to the next track when the current one ends"""
+        track = self.queue.next(auto=True)
+        if track:
+            self.play_track(track)
+        else:
+            self._emit("ended")
+
+    def _on_track_failed(self, track):
+        """Skip a track whose file could not be read, e.g. one deleted since it was listed"""
+        self._failures += 1
+        if self._failures >= len(self.queue):
+            self._failures = 0
+            self._emit("ended")  # Every track in the queue failed in turn; don't go round again
+            return
+        # Repeating a track that cannot be read would only fail again
+        track = self.queue.next(auto=self.queue.repeat != REPEAT_ONE)
+        if track:
+            self.play_track(track)
+        else:
+            self._emit("ended")
@@ -0,0 +1,318 @@
+# fingerprint.py
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# NumPy and the decoder are imported inside the functions that use them, which run on
+# workers and in worker processes; the player starts without them
+
+# Configuration
+RATE = 11025            # Hz tracks are decoded at; the bands below 3 kHz are all that is compared
+FRAME = 2048            # samples per spectrum
+BAND_EDGES = (300, 400, 510, 630, 770, 920, 1080, 1270, 1480, 1720, 2000, 2320, 3000)  # Hz, 12 bands
+SEGMENTS = 16           # stretches of the track each band is averaged over
+SILENCE = 1e-4          # frames quieter than this fraction of the loudest are trimmed from both ends
+SIGNATURE_BANDS = 24    # LSH: tracks sharing any band of their signature are compared
+SIGNATURE_BITS = 15     # bits per signature band
+SIMILARITY = 0.92       # cosine similarity at which two fingerprints count as the same recording
+DURATION_TOLERANCE = 0.03   # and their lengths may differ by at most this fraction
+SEED = 20240611         # fixes the random hyperplanes, so signatures are comparable across runs
+BLOB_KIND = "fingerprint"
+CHUNK_SIZE = 16         # files handed to each worker process at a time
+STORE_BATCH = 256       # fingerprints written to the metadata cache per transaction
+COMPARE_BATCH = 65536   # candidate pairs scored at a time, bounding the temporary arrays
+
+_HEADER = struct.Struct("<f")  # duration in seconds; the int8 feature vector follows
+DIMENSIONS = SEGMENTS * (len(BAND_EDGES) - 1)
+
+def fingerprint_file(path):
+    """Worker: return a fingerprint blob for an audio file, or None if it has too little sound.
+
+    The track is decoded at RATE, split into FRAME-sample spectra and summed into
+    log-spaced bands; after trimming silence, each band's log energy is averaged over
+    SEGMENTS stretches. Subtracting every stretch's mean keeps only the spectral shape,
+    so re-encodes, bitrates and volume changes of one recording give nearly the same vector.
+    """
+    import numpy as np
+    from audio_decode import iter_pcm
+    bins = np.fft.rfftfreq(FRAME, 1 / RATE)
+    starts = np.searchsorted(bins, BAND_EDGES)
+    window = np.hanning(FRAME).astype(np.float32)
+    energies = []
+    carry = np.zeros(0, dtype=np.float32)
+    samples = 0
+    for block in iter_pcm(path, block_frames=RATE * 4, rate=RATE):
+        mono = np.concatenate((carry, block.mean(axis=1, dtype=np.float32)))
+        samples += len(block)
+        n = len(mono) // FRAME
+        carry = mono[n * FRAME:]
+        if n:
+            # Every frame of the block in one FFT call
+            power = np.square(np.abs(np.fft.rfft(mono[:n * FRAME].reshape(n, FRAME) * window, axis=1)))
+            energies.append(np.add.reduceat(power[:, starts[0]:starts[-1]], starts[:-1] - starts[0], axis=1))
+    if not energies:
+        return None
+    energies = np.concatenate(energies)
+
+    loudness = energies.sum(axis=1)
+    sound = np.flatnonzero(loudness > loudness.max() * SILENCE)
+    if len(sound) < SEGMENTS:
+        return None
+    levels = np.log10(energies[sound[0]:sound[-1] + 1] + 1e-9)
+    bounds = np.arange(SEGMENTS) * len(levels) // SEGMENTS
+    sizes = np.diff(np.append(bounds, len(levels)))[:, None]
+    shape = np.add.reduceat(levels, bounds, axis=0) / sizes
+    shape -= shape.mean(axis=1, keepdims=True)
+
+    vector = shape.ravel()
+    vector -= vector.mean()
+    scale = np.abs(vector).max()
+    if not scale:
+        return None
+    quantized = np.round(vector * (127 / scale)).astype(np.int8)
+    return _HEADER.pack(samples / RATE) + quantized.tobytes()
+
+def _fingerprint(path):
+    try:
+        return path, fingerprint_file(path)
+    except Exception:
+        return path, None  # Undecodable files are left out, and retried when they change
+
+def _fingerprint_many(paths):
+    return [_fingerprint(path) for path in paths]
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key):
+        parent = self.parent.setdefault(key, key)
+        while parent != key:
+            grandparent = self.parent[parent]
+            self.parent[key] = grandparent  # Path halving keeps later finds short
+            key, parent = parent, grandparent
+        return key
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[b] = a
+
+class FingerprintIndex:
+    """Locality-sensitive index of fingerprints that finds near matches without comparing all pairs.
+
+    Each vector gets a SimHash signature from random hyperplanes; vectors at a small
+    angle agree on most bits, so they very likely share at least one SIGNATURE_BITS-bit
+    band. Only tracks with an equal band are compared, by cosine similarity and length.
+    The bands are int16 columns searched by sorting, so a batch costs a few sorts of the
+    library, not a comparison with every track. Matches are kept as an edge list, so
+    tracks can be added and removed one at a time and clusters() groups them with union-find.
+    """
+
+    def __init__(self):
+        import numpy as np
+        self._np = np
+        rng = np.random.default_rng(SEED)
+        self._planes = rng.standard_normal((SIGNATURE_BANDS * SIGNATURE_BITS, DIMENSIONS)).astype(np.float32)
+        self._weights = 1 << np.arange(SIGNATURE_BITS, dtype=np.int32)
+        # By row, grown by doubling; vectors stay int8 and are converted when compared
+        self._vectors = np.zeros((1024, DIMENSIONS), dtype=np.int8)
+        self._norms = np.zeros(1024, dtype=np.float32)
+        self._durations = np.zeros(1024, dtype=np.float32)
+        self._keys = np.zeros((1024, SIGNATURE_BANDS), dtype=np.int16)  # -1 once removed
+        self._rows = {}       # location -> row
+        self._locations = []  # row -> location, None once removed
+        self._matches = {}    # location -> set of matching locations
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, location):
+        return location in self._rows
+
+    def add_many(self, items):
+        """Add (location, fingerprint blob) pairs; one call for many is much cheaper than one each"""
+        np = self._np
+        items = [(location, blob) for location, blob in dict(items).items()
+                 if blob and location not in self._rows]
+        if not items:
+            return
+        vectors = np.stack([np.frombuffer(blob, dtype=np.int8, offset=_HEADER.size) for _, blob in items])
+        floats = vectors.astype(np.float32)
+        bits = (floats @ self._planes.T > 0).reshape(len(items), SIGNATURE_BANDS, SIGNATURE_BITS)
+
+        first = len(self._locations)
+        end = first + len(items)
+        if end > len(self._vectors):
+            size = max(end, 2 * len(self._vectors))
+            self._vectors = np.resize(self._vectors, (size, DIMENSIONS))
+            self._keys = np.resize(self._keys, (size, SIGNATURE_BANDS))
+            self._norms = np.resize(self._norms, size)
+            self._durations = np.resize(self._durations, size)
+        self._vectors[first:end] = vectors
+        self._keys[first:end] = bits.astype(np.int32) @ self._weights
+        self._norms[first:end] = np.linalg.norm(floats, axis=1)
+        self._durations[first:end] = [_HEADER.unpack_from(blob)[0] for _, blob in items]
+        for i, (location, _) in enumerate(items):
+            self._rows[location] = first + i
+        self._locations.extend(location for location, _ in items)
+        self._link(first, end)
+
+    def add(self, location, blob):
+        self.add_many([(location, blob)])
+
+    def _candidates(self, first, end):
+        # Pairs (new row, earlier row) that agree on some band, each pair once
+        np = self._np
+        rows = np.arange(first, end)
+        pairs = []
+        for band in range(SIGNATURE_BANDS):
+            column = self._keys[:end, band]
+            order = np.argsort(column, kind="stable")
+            ordered = column[order]
+            keys = column[first:end]
+            lo = np.searchsorted(ordered, keys, "left")
+            counts = np.searchsorted(ordered, keys, "right") - lo
+            total = counts.sum()
+            # Expand each new row's run of equal keys into (row, other) pairs
+            starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+            others = order[starts + np.arange(total)]
+            mine = np.repeat(rows, counts)
+            earlier = others < mine
+            pairs.append(mine[earlier].astype(np.int64) * end + others[earlier])
+        pairs = np.sort(np.concatenate(pairs))
+        pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])]  # Pairs agreeing on several bands, once
+        return pairs // end, pairs % end
+
+    def _link(self, first, end):
+        np = self._np
+        rows, others = self._candidates(first, end)
+        for i in range(0, len(rows), COMPARE_BATCH):
+            a, b = rows[i:i + COMPARE_BATCH], others[i:i + COMPARE_BATCH]
+            dots = np.einsum("ij,ij->i", self._vectors[a].astype(np.float32), self._vectors[b].astype(np.float32))
+            durations = np.maximum(self._durations[a], self._durations[b])
+            similar = ((dots >= SIMILARITY * self._norms[a] * self._norms[b])
+                       & (np.abs(self._durations[a] - self._durations[b]) <= DURATION_TOLERANCE * durations))
+            for row, other in zip(a[similar].tolist(), b[similar].tolist()):
+                location, match = self._locations[row], self._locations[other]
+                self._matches.setdefault(location, set()).add(match)
+                self._matches.setdefault(match, set()).add(location)
+
+    def remove(self, location):
+        row = self._rows.pop(location, None)
+        if row is None:
+            return
+        self._locations[row] = None  # The row stays allocated; with its keys cleared it is never a candidate
+        self._keys[row] = -1
+        for match in self._matches.pop(location, ()):
+            self._matches[match].discard(location)
+            if not self._matches[match]:
+                del self._matches[match]
+
+    def clusters(self):
+        """Groups of locations holding the same recording, largest first"""
+        union = _UnionFind()
+        for location, matches in self._matches.items():
+            for match in matches:
+                union.union(location, match)
+        groups = {}
+        for location in self._matches:
+            groups.setdefault(union.find(location), []).append(location)
+        return sorted(groups.values(), key=len, reverse=True)
+
+class DuplicateFinder:
+    """Fingerprints a library in a process pool on a background thread, reusing fingerprints stored in the metadata cache.
+
+    Fingerprints are cached per file like seek indexes, so only new or changed files are
+    decoded again and an interrupted pass resumes where it stopped. scan() returns a
+    FingerprintIndex; start() runs it on its own thread, after any analysis passed as
+    wait_for, so two passes never decode the library against each other.
+    """
+
+    def __init__(self, metadata, workers=None):
+        self.metadata = metadata
+        self.workers = workers
+        self.total = 0
+        self.done = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, locations, on_done, on_error, wait_for=None):
+        """Index locations, an iterable read on the new thread, in the background; on_done(index) or on_error(error) is called on that thread"""
+        self._thread = threading.Thread(target=self._run, args=(locations, on_done, on_error, wait_for),
+                                        name="fingerprints", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, locations, on_done, on_error, wait_for):
+        try:
+            if wait_for is not None:
+                wait_for.join()
+            index = self.scan(locations)
+        except Exception as e:
+            on_error(e)
+            return
+        if index is not None:
+            on_done(index)
+
+    def scan(self, locations):
+        """Return a FingerprintIndex of locations, or None if stop() was called first"""
+        found = []
+        missing = []
+        for location in locations:
+            blob = self.metadata.get_blob(location, BLOB_KIND)
+            if blob is not None:
+                found.append((location, blob))
+            elif os.path.exists(location):
+                missing.append(location)
+        self.total = len(missing)
+        if missing:
+            workers = self.workers or os.cpu_count() or 1
+            chunks = [missing[i:i + CHUNK_SIZE] for i in range(0, len(missing), CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                limit = 2 * workers
+                inflight = set()
+                batch = []
+                while (chunks or inflight) and not self._stop.is_set():
+                    # Keep only a few chunks queued so stop() takes effect quickly
+                    while chunks and len(inflight) < limit:
+                        inflight.add(pool.submit(_fingerprint_many, chunks.pop()))
+                    done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for location, blob in future.result():
+                            self.done += 1
+                            if blob is not None:
+                                batch.append((location, blob))
+                    if len(batch) >= STORE_BATCH:
+                        self.metadata.put_blobs(BLOB_KIND, batch)  # Kept if the pass is interrupted
+                        found.extend(batch)
+                        batch = []
+                for future in inflight:
+                    future.cancel()
+                self.metadata.put_blobs(BLOB_KIND, batch)
+                found.extend(batch)
+        if self._stop.is_set():
+            return None
+        # Indexed in one go: a batch costs a sort of every band, whatever its size
+        index = FingerprintIndex()
+        index.add_many(found)
+        return index
+
+    def fingerprint(self, locations, processes):
+        """Fingerprints for a few files, e.g. ones just added; missing ones are computed in the processes pool"""
+        found = []
+        missing = []
+        for location in locations:
+            blob = self.metadata.get_blob(location, BLOB_KIND)
+            if blob is not None:
+                found.append((location, blob))
+            elif os.path.exists(location):
+                missing.append(location)
+        futures = [processes.submit(_fingerprint_many, missing[i:i + CHUNK_SIZE])
+                   for i in range(0, len(missing), CHUNK_SIZE)]
+        computed = [(location, blob) for future in futures for location, blob in future.result() if blob is not None]
+        self.metadata.put_blobs(BLOB_KIND, computed)
+        return found + computed
@@ -0,0 +1,273 @@
+# instrumentation.py
+import os
+import json
+import time
+import atexit
+import threading
+from functools import wraps
+
+# Configuration
+ENV_VAR = "LUMATUNE_TRACE"  # "1" traces to TRACE_PATH; any other value is used as the trace path
+TRACE_PATH = os.path.join(".cache", "trace.json")
+MAX_EVENTS = 500000     # trace events kept; later ones are only counted in the summary
+LAG_INTERVAL = 50       # ms between event-loop lag probes
+SUMMARY_INTERVAL = 10   # seconds between printed summaries
+SUMMARY_TOP = 8         # spans listed per summary
+
+_setting = os.environ.get(ENV_VAR, "")
+enabled = _setting not in ("", "0")
+trace_path = (TRACE_PATH if _setting == "1" else _setting) if enabled else None
+
+class _NullSpan:
+    """Shared do-nothing context manager returned by span() when tracing is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Stat:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+class Recorder:
+    """Collects spans and counters as Chrome trace events plus per-name totals.
+
+    Spans may finish on any thread; the lock only guards the append.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self.stats = {}    # span name -> _Stat since the last summary
+        self.widgets = [0, 0]  # tkinter widgets created, destroyed
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _append(self, event):
+        if len(self.events) < self.max_events:
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def add_span(self, name, start, end, args=None):
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._append(event)
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = _Stat()
+            stat.add(end - start)
+
+    def add_counter(self, name, values):
+        event = {"name": name, "ph": "C", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (time.perf_counter() - self._origin) * 1e6, "args": values}
+        with self._lock:
+            self._append(event)
+
+    def take_stats(self):
+        with self._lock:
+            stats, self.stats = self.stats, {}
+        return stats
+
+    def write(self, path):
+        """Write the events as a Chrome trace (chrome://tracing, Perfetto)"""
+        with self._lock:
+            events = list(self.events)
+        names = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": t.ident, "args": {"name": t.name}}
+                 for t in threading.enumerate()]
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": names + events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": self.dropped}}, f)
+        os.replace(tmp_path, path)
+
+recorder = Recorder() if enabled else None
+_installed = False
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        recorder.add_span(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+def span(name, **args):
+    """Time a block: with span("decode", path=p): ..."""
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+def traced(name=None, widgets=False):
+    """Decorator that times every call; when tracing is off the function is returned unchanged.
+
+    With widgets=True the span also records how many widgets the call created and destroyed,
+    for view switches and list rebuilds.
+    """
+    def decorate(fn):
+        if not enabled:
+            return fn
+        label = name or fn.__qualname__
+
+        if widgets:
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                created, destroyed = recorder.widgets
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    end = time.perf_counter()
+                    now_created, now_destroyed = recorder.widgets
+                    recorder.add_span(label, start, end, {"created": now_created - created,
+                                                          "destroyed": now_destroyed - destroyed,
+                                                          "live": now_created - now_destroyed})
+            return wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.add_span(label, start, time.perf_counter())
+        return wrapper
+    return decorate
+
+def _count_widgets():
+    """Patch tkinter so every widget creation and destruction is counted; CTk widgets are built from these"""
+    try:
+        import tkinter
+    except ImportError:
+        return  # Headless installs may lack Tk, and have no widgets to count
+    setup = tkinter.BaseWidget._setup
+    destroy = tkinter.BaseWidget.destroy
+
+    def counted_setup(self, *args, **kwargs):
+        recorder.widgets[0] += 1
+        return setup(self, *args, **kwargs)
+
+    def counted_destroy(self):
+        recorder.widgets[1] += 1
+        return destroy(self)
+
+    tkinter.BaseWidget._setup = counted_setup
+    tkinter.BaseWidget.destroy = counted_destroy
+
+class Monitor:
+    """Probes the event loop's lag and prints a summary of the slowest spans every few seconds.
+
+    root is anything with Tk's after(ms, callback): the app window, or an AsyncioScheduler.
+    """
+
+    def __init__(self, root, lag_interval=LAG_INTERVAL, summary_interval=SUMMARY_INTERVAL):
+        self.root = root
+        self.lag_interval = lag_interval
+        self.summary_interval = summary_interval
+        self._expected = None
+        self._lags = []
+        self._last_summary = time.perf_counter()
+
+    def start(self):
+        self._expected = time.perf_counter() + self.lag_interval / 1000
+        self.root.after(self.lag_interval, self._probe)
+
+    def _probe(self):
+        # A callback runs late by however long the loop was busy with something else
+        now = time.perf_counter()
+        lag = max(0.0, now - self._expected)
+        self._lags.append(lag)
+        recorder.add_counter("loop_lag_ms", {"lag": round(lag * 1000, 3)})
+        if now - self._last_summary >= self.summary_interval:
+            self.print_summary(now)
+        self._expected = time.perf_counter() + self.lag_interval / 1000
+        self.root.after(self.lag_interval, self._probe)
+
+    def print_summary(self, now=None):
+        now = now or time.perf_counter()
+        elapsed = now - self._last_summary
+        self._last_summary = now
+        lags, self._lags = sorted(self._lags), []
+        stats = sorted(recorder.take_stats().items(), key=lambda item: item[1].total, reverse=True)
+        created, destroyed = recorder.widgets
+        recorder.add_counter("widgets", {"live": created - destroyed})
+
+        lines = [f"📊 Last {elapsed:.0f}s: {created - destroyed} live widgets ({created} created, {destroyed} destroyed)"]
+        if lags:
+            lines.append(f"   Loop lag: median {lags[len(lags) // 2] * 1000:.1f} ms, "
+                         f"p99 {lags[int(len(lags) * 0.99)] * 1000:.1f} ms, max {lags[-1] * 1000:.1f} ms")
+        for name, stat in stats[:SUMMARY_TOP]:
+            lines.append(f"   {name:<40} {stat.count:>6}x  total {stat.total * 1000:8.1f} ms  "
+                         f"max {stat.max * 1000:7.1f} ms")
+        print("\n".join(lines), flush=True)
+
+class StartupReport:
+    """Times startup phases from a start timestamp and prints them once every phase has been marked"""
+
+    def __init__(self, started, phases):
+        self.started = started
+        self.waiting = list(phases)
+        self.marks = []  # (phase, seconds since start, note)
+
+    def mark(self, phase, note=None, at=None):
+        if phase not in self.waiting:
+            return
+        now = at or time.perf_counter()
+        self.waiting.remove(phase)
+        self.marks.append((phase, now - self.started, note))
+        if enabled:
+            recorder.add_span(f"startup:{phase}", self.started, now)
+        if not self.waiting:
+            self.print()
+
+    def print(self):
+        parts = []
+        for phase, seconds, note in self.marks:
+            parts.append(f"{phase} {seconds * 1000:.0f} ms" + (f" ({note})" if note else ""))
+        print("🚀 Startup: " + ", ".join(parts), flush=True)
+
+def install(root=None):
+    """Start the widget counters, the event-loop lag probe (given a root with after()) and trace export at exit"""
+    global _installed
+    if not enabled:
+        return None
+    if not _installed:
+        _installed = True
+        _count_widgets()
+        atexit.register(write_trace)
+    if root is None:
+        return None
+    monitor = Monitor(root)
+    monitor.start()
+    return monitor
+
+def write_trace(path=None):
+    if enabled:
+        recorder.write(path or trace_path)
@@ -0,0 +1,256 @@
+# library_store.py
+import threading
+from array import array
+from itertools import accumulate
+
+def _owned(column):
+    """An array copy of a column that is a read-only memoryview, e.g. over a snapshot; arrays pass through"""
+    if not isinstance(column, memoryview):
+        return column
+    copy = array(column.format)
+    copy.frombytes(column.cast("B"))
+    return copy
+
+class StringTable:
+    """Append-only strings packed as UTF-8 into one buffer, addressed by integer id"""
+
+    def __init__(self, data=None, ends=None):
+        # Either may be a read-only memoryview, copied on the first append
+        self._data = bytearray() if data is None else data
+        self._ends = array("Q") if ends is None else ends  # id -> end offset in _data; the start is the previous end
+
+    def __len__(self):
+        return len(self._ends)
+
+    def buffers(self, count=None):
+        """The raw (data, ends) of the first count strings, e.g. for writing them out"""
+        count = len(self._ends) if count is None else count
+        return self._data[:self._ends[count - 1] if count else 0], self._ends[:count]
+
+    def own(self):
+        if isinstance(self._data, memoryview):
+            self._data = bytearray(self._data)
+        self._ends = _owned(self._ends)
+
+    def add(self, text):
+        self.own()
+        self._data += text.encode("utf-8")
+        self._ends.append(len(self._data))
+        return len(self._ends) - 1
+
+    def extend(self, texts):
+        """Append several strings at once; returns the id of the first"""
+        self.own()
+        first = len(self._ends)
+        encoded = [text.encode("utf-8") for text in texts]
+        self._ends.extend(accumulate(map(len, encoded), initial=len(self._data)))
+        del self._ends[first]  # accumulate() also yields the starting offset
+        self._data += b"".join(encoded)
+        return first
+
+    def extend_from(self, table, first, end):
+        """Append strings first..end-1 of another table, copying their bytes in one piece"""
+        self.own()
+        start = table._ends[first - 1] if first else 0
+        shift = len(self._data) - start
+        self._ends.extend(offset + shift for offset in table._ends[first:end])
+        self._data += table._data[start:table._ends[end - 1] if end > first else start]
+
+    def __getitem__(self, i):
+        start = self._ends[i - 1] if i else 0
+        return str(self._data[start:self._ends[i]], "utf-8")
+
+    def find(self, texts):
+        """Return {text: id} for those of texts in the table, the newest id for repeated ones.
+
+        One pass over the raw bytes, from the end, stopping once everything was found.
+        """
+        wanted = {text.encode("utf-8"): text for text in texts}
+        found = {}
+        data, ends = self._data, self._ends
+        for i in range(len(ends) - 1, -1, -1):
+            if len(found) == len(wanted):
+                break
+            text = wanted.get(bytes(data[ends[i - 1] if i else 0:ends[i]]))
+            if text is not None and text not in found:
+                found[text] = i
+        return found
+
+class Track:
+    """View of one track in a LibraryStore; the store hands out one view per track, so identity works"""
+
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, track_id):
+        self.store = store
+        self.id = track_id
+
+    @property
+    def name(self):
+        return self.store.track_names[self.id]
+
+    @property
+    def location(self):
+        return self.store.track_locations[self.id]
+
+    @property
+    def album(self):
+        return self.store.album(self.store.track_album[self.id])
+
+class Album:
+    """View of one album in a LibraryStore; its tracks are the ids first..first+count-1"""
+
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, album_id):
+        self.store = store
+        self.id = album_id
+
+    @property
+    def title(self):
+        return self.store.strings[self.store.album_title[self.id]]
+
+    @property
+    def artist(self):
+        return self.store.strings[self.store.album_artist[self.id]]
+
+    @property
+    def artwork_path(self):
+        # Thumbnail is decoded lazily by ArtworkLoader
+        return self.store.strings[self.store.album_artwork[self.id]]
+
+    @property
+    def tracks(self):
+        first = self.store.album_first[self.id]
+        return self.store.tracks(range(first, first + self.store.album_count[self.id]))
+
+class LibraryStore:
+    """Columnar storage for a whole library.
+
+    Albums and tracks are rows in parallel arrays, addressed by integer id. Track names
+    and locations are packed into StringTables; artists, album titles and artwork paths
+    repeat across albums and are interned into a shared list. An album's tracks have
+    consecutive ids. Track and Album objects are views created on first use and kept,
+    so the same id always gives the same object, usable as a dict key. Rows are never
+    removed: an album edited on disk is appended again and the old rows are left unused.
+    Columns opened from a snapshot are memoryviews over the file, copied on the first append.
+    """
+
+    COLUMNS = ("track_album", "album_title", "album_artist", "album_artwork", "album_first", "album_count")
+
+    def __init__(self):
+        self.strings = StringTable()   # interned album-level strings
+        self._string_ids = {}      # string -> index in strings, built on first use for an opened snapshot
+        self.track_names = StringTable()      # indexed by track id
+        self.track_locations = StringTable()
+        self.track_album = array("I")     # track id -> album id
+        self.album_title = array("I")     # album id -> index in strings
+        self.album_artist = array("I")
+        self.album_artwork = array("I")
+        self.album_first = array("I")     # album id -> its first track id
+        self.album_count = array("I")
+        self._track_views = []   # track id -> Track, or None until asked for
+        self._album_views = []
+        self._views_lock = threading.Lock()  # workers create views too, e.g. while indexing
+
+    def __len__(self):
+        return len(self.track_album)
+
+    @classmethod
+    def from_columns(cls, strings, track_names, track_locations, **columns):
+        """A store over existing columns, e.g. memoryviews into a snapshot; views are still made on first use"""
+        store = cls()
+        store.strings = strings
+        store._string_ids = None
+        store.track_names = track_names
+        store.track_locations = track_locations
+        for name in cls.COLUMNS:
+            setattr(store, name, columns[name])
+        store._track_views = [None] * len(store.track_album)
+        store._album_views = [None] * len(store.album_first)
+        return store
+
+    def own(self):
+        """Copy columns opened from a snapshot into memory, releasing the file"""
+        for table in (self.strings, self.track_names, self.track_locations):
+            table.own()
+        for name in self.COLUMNS:
+            setattr(self, name, _owned(getattr(self, name)))
+
+    def is_compact(self, albums):
+        """Whether albums are exactly this store's first len(albums) albums, in order"""
+        return all(album.id == i for i, album in enumerate(albums))
+
+    def compacted(self, albums):
+        """A new store holding just the given albums, in order, without rows of replaced ones"""
+        store = LibraryStore()
+        for album in albums:
+            first = self.album_first[album.id]
+            end = first + self.album_count[album.id]
+            store.track_names.extend_from(self.track_names, first, end)
+            store.track_locations.extend_from(self.track_locations, first, end)
+            store._add_album_row(album.title, album.artist, album.artwork_path)
+        return store
+
+    def intern(self, text):
+        if self._string_ids is None:
+            self._string_ids = {self.strings[i]: i for i in range(len(self.strings))}
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = self._string_ids[text] = self.strings.add(text)
+        return string_id
+
+    def add_album(self, title, artist, artwork_path, tracks):
+        """Append an album with its tracks ({"name", "location"} dicts) and return its view"""
+        self.track_names.extend([t['name'] for t in tracks])
+        self.track_locations.extend([t['location'] for t in tracks])
+        return self._add_album_row(title, artist, artwork_path)
+
+    def _add_album_row(self, title, artist, artwork_path):
+        # The album's track names and locations were just appended
+        self.own()
+        album_id = len(self.album_first)
+        first = len(self.track_album)
+        count = len(self.track_names) - first
+        self.track_album.extend(array("I", [album_id]) * count)
+        self._track_views.extend([None] * count)
+        self.album_title.append(self.intern(title))
+        self.album_artist.append(self.intern(artist))
+        self.album_artwork.append(self.intern(artwork_path))
+        self.album_first.append(first)
+        self.album_count.append(count)
+        self._album_views.append(None)
+        return self.album(album_id)
+
+    def track(self, track_id):
+        view = self._track_views[track_id]
+        if view is None:
+            with self._views_lock:
+                view = self._track_views[track_id]
+                if view is None:
+                    view = self._track_views[track_id] = Track(self, track_id)
+        return view
+
+    def tracks(self, track_ids):
+        views = self._track_views
+        return [views[i] or self.track(i) for i in track_ids]
+
+    def album_locations(self, albums):
+        """Yield each album's track locations, read from the column without creating Track views"""
+        locations = self.track_locations
+        for album in albums:
+            first = self.album_first[album.id]
+            yield [locations[i] for i in range(first, first + self.album_count[album.id])]
+
+    def tracks_at(self, locations):
+        """Return {location: Track} for the given file locations in the store, the newest track for each"""
+        return {location: self.track(i) for location, i in self.track_locations.find(locations).items()}
+
+    def album(self, album_id):
+        view = self._album_views[album_id]
+        if view is None:
+            with self._views_lock:
+                view = self._album_views[album_id]
+                if view is None:
+                    view = self._album_views[album_id] = Album(self, album_id)
+        return view
@@ -0,0 +1,205 @@
+# loudness.py
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from metadata_cache import MetadataCache
+from waveform import BLOB_KIND
+
+# NumPy and the decoder are imported inside the analysis functions, which run in worker
+# processes; the player itself only needs the modes and gain_factor() and starts without them
+
+# Configuration
+REFERENCE_LEVEL = -18.0  # dBFS the loud parts of every track are brought to
+WINDOW = 0.05            # seconds per RMS window, as in ReplayGain
+PERCENTILE = 0.95        # a track's loudness is the level 95% of its windows stay below
+MIN_LEVEL = -100.0       # dBFS of the quietest histogram bin
+LEVEL_STEP = 0.01        # dB per histogram bin
+LEVEL_BINS = 10000
+STORE_BATCH = 16         # albums written to the metadata cache per transaction
+
+# Normalization modes
+OFF = "off"
+TRACK = "track"
+ALBUM = "album"
+MODES = (OFF, TRACK, ALBUM)
+
+def _level_histogram(power):
+    """Bin the mean-square power of each window by its level in dBFS"""
+    import numpy as np
+    levels = 10 * np.log10(np.maximum(power, 1e-10))
+    bins = ((levels - MIN_LEVEL) / LEVEL_STEP).astype(np.int64)
+    return np.bincount(np.clip(bins, 0, LEVEL_BINS - 1), minlength=LEVEL_BINS)
+
+def analyze_file(path):
+    """Return (level histogram, peak, Waveform) over the 50 ms windows of a file, one decoded block at a time.
+
+    The waveform overview is built from the same blocks, so the file is decoded only once.
+    """
+    import numpy as np
+    from audio_decode import iter_pcm, SAMPLE_RATE, CHANNELS
+    from waveform import WaveformBuilder
+    window = int(SAMPLE_RATE * WINDOW)
+    histogram = np.zeros(LEVEL_BINS, dtype=np.int64)
+    peak = 0.0
+    carry = None
+    waveform = WaveformBuilder()
+    for block in iter_pcm(path):
+        waveform.add(block)
+        if carry is not None and len(carry):
+            block = np.concatenate((carry, block))
+        samples = block.astype(np.float32) / 32768.0
+        peak = max(peak, float(np.abs(samples).max(initial=0.0)))
+        n = len(samples) // window
+        carry = block[n * window:]
+        if n:
+            # Mean square over both channels of every window in the block at once
+            power = np.square(samples[:n * window]).reshape(n, window * CHANNELS).mean(axis=1)
+            histogram += _level_histogram(power)
+    return histogram, peak, waveform.finish()
+
+def _gain(histogram):
+    import numpy as np
+    total = histogram.sum()
+    if not total:
+        return None
+    index = int(np.searchsorted(np.cumsum(histogram), PERCENTILE * total))
+    return round(REFERENCE_LEVEL - (MIN_LEVEL + index * LEVEL_STEP), 2)
+
+def analyze_album(paths):
+    """Worker: return ({path: loudness}, {path: waveform bytes}) for an album's files; unreadable files map to None"""
+    import numpy as np
+    results = {}
+    waveforms = {}
+    album_histogram = np.zeros(LEVEL_BINS, dtype=np.int64)
+    album_peak = 0.0
+    for path in paths:
+        try:
+            histogram, peak, waveform = analyze_file(path)
+        except Exception:
+            results[path] = None
+            continue
+        if waveform is not None:
+            waveforms[path] = waveform.to_bytes()
+        album_histogram += histogram
+        album_peak = max(album_peak, peak)
+        results[path] = {"track_gain": _gain(histogram), "track_peak": round(peak, 4)}
+
+    album_gain = _gain(album_histogram)
+    for loudness in results.values():
+        if loudness:
+            loudness["album_gain"] = album_gain
+            loudness["album_peak"] = round(album_peak, 4)
+    return results, waveforms
+
+def gain_factor(loudness, mode):
+    """Volume multiplier for stored loudness data, limited so the peak never clips"""
+    if mode == OFF or not loudness:
+        return 1.0
+    if mode == ALBUM and loudness.get("album_gain") is not None:
+        gain, peak = loudness["album_gain"], loudness.get("album_peak")
+    elif loudness.get("track_gain") is not None:
+        gain, peak = loudness["track_gain"], loudness.get("track_peak")
+    else:
+        return 1.0
+    factor = 10 ** (gain / 20)
+    if peak:
+        factor = min(factor, 1 / peak)
+    return factor
+
+class LoudnessAnalyzer:
+    """Analyses every album that has no loudness data yet, in a process pool on a background thread.
+
+    Results are written to the metadata cache as albums finish, so an interrupted run
+    resumes where it stopped. A file that is re-read after changing on disk loses its
+    result with the rest of its old metadata and is analysed again on the next run.
+    """
+
+    def __init__(self, metadata, workers=None):
+        self.metadata = metadata
+        self.workers = workers
+        self.total = 0
+        self.done = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, albums):
+        """Analyse albums (lists of track paths, which may be produced lazily on the analysis thread) in the background"""
+        self._thread = threading.Thread(target=self.run, args=(albums,), name="loudness", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        """Wait for the analysis start() began to finish or stop; returns at once if none was started"""
+        if self._thread is not None:
+            self._thread.join()
+
+    def pending(self, albums):
+        """Albums with at least one track the cache holds no loudness result for"""
+        entries = self.metadata.entries()
+        return [paths for paths in albums
+                if paths and any(path not in entries or "loudness" not in entries[path][2] for path in paths)]
+
+    def run(self, albums):
+        albums = self.pending(albums)
+        self.total = len(albums)
+        if not albums:
+            return
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            limit = 2 * workers
+            inflight = set()
+            finished = []
+            for paths in albums:
+                if self._stop.is_set():
+                    break
+                inflight.add(pool.submit(analyze_album, paths))
+                if len(inflight) >= limit:
+                    # Keep only a few albums queued so stop() takes effect quickly
+                    done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                    finished.extend(done)
+                    if len(finished) >= STORE_BATCH:
+                        self._store(finished)
+                        finished = []
+            if self._stop.is_set():
+                for future in inflight:
+                    future.cancel()
+            done, _ = wait(inflight)
+            self._store(finished + [f for f in done if not f.cancelled()])
+
+    def _store(self, futures):
+        updates = []
+        waveforms = []
+        for future in futures:
+            try:
+                results, album_waveforms = future.result()
+            except Exception:
+                continue
+            updates.extend((path, {"loudness": loudness}) for path, loudness in results.items())
+            waveforms.extend(album_waveforms.items())
+            self.done += 1
+        if updates:
+            self.metadata.update_many(updates)
+        if waveforms:
+            self.metadata.put_blobs(BLOB_KIND, waveforms)
+
+def _catalog_albums(path):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    return [[track["location"] for track in entry["tracks"]] for entry in entries]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure loudness for every album in the catalog")
+    parser.add_argument("catalog", nargs="?", default="input.json")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    analyzer = LoudnessAnalyzer(MetadataCache(), args.workers)
+    analyzer.run(_catalog_albums(args.catalog))
+    print(f"✅ Analysed {analyzer.done} of {analyzer.total} albums that needed it")
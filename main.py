@@ -1,55 +1,84 @@
 # music_player.py
+import time
+STARTED = time.perf_counter()  # taken before the heavy imports so the startup report includes them
 import os
-import json
+import bisect
+from collections import OrderedDict
+import tkinter as tk
 import customtkinter as ctk
 from tkinter import filedialog, messagebox, simpledialog
 from PIL import Image
-import pygame
-from mutagen.mp3 import MP3
+from models import Album, Playlist
+from artwork import ArtworkLoader
+from virtual_list import VirtualList
+from waveform import load_waveform
+from waveform_view import WaveformView
+from workers import VISIBLE
+from play_queue import REPEAT_OFF, REPEAT_ONE
+from playback import PLAYING
+from search_index import ARTIST, ALBUM
+from loudness import MODES
+from engine import PlayerEngine, NORMALIZATION, CROSSFADE
+import instrumentation
+from instrumentation import traced, StartupReport
+IMPORTED = time.perf_counter()
 
 # Configuration
 SCREEN_W, SCREEN_H = 1200, 750
 SIDEBAR_WIDTH = 220
 BAR_HEIGHT = 100
 ARTWORK_SIZE = 100
+CONTROL_API = True  # Serve the local control socket so scripts can drive the player
+ANALYZE_LOUDNESS = True  # Measure loudness in the background for albums that have none stored
+PROGRESSIVE_LOAD = True  # Draw the window first and add albums to it as the catalog is parsed
+STARTUP_REPORT = True  # Print how long each startup phase took
+WATCH_LIBRARY = True  # Pick up files added to or removed from musics/ and images/ while running
+FIND_DUPLICATES = True  # Fingerprint the library in the background to spot the same recording filed twice
+ALBUM_ROW_HEIGHT = ARTWORK_SIZE + 40
+TRACK_ROW_HEIGHT = 40
+SEARCH_DELAY = 80  # ms of typing pause before a search runs
+CROSSFADE_CHOICES = (0, 2, 4, 6, 8, 12)  # seconds offered in the crossfade menu
+WAVEFORM_CACHE = 64  # overviews of recent tracks kept in memory, about 1 KB each
+
+class TrackSelection:
+    """Ordered set of tracks with O(1) membership, insert and remove"""
 
-# Data models
-class Track:
-    def __init__(self, name, location, album=None):
-        self.name = name
-        self.location = location
-        self.album = album
-
-class Album:
-    def __init__(self, title, artist, artwork_path, tracks):
-        self.title = title
-        self.artist = artist
-        self.artwork_path = artwork_path
-        self.artwork = Image.open(artwork_path).resize((ARTWORK_SIZE, ARTWORK_SIZE))
-        self.ctk_artwork = ctk.CTkImage(light_image=self.artwork, dark_image=self.artwork, size=(ARTWORK_SIZE, ARTWORK_SIZE))
-        self.tracks = [Track(t['name'], t['location'], self) for t in tracks]
-
-class Playlist:
-    def __init__(self, name):
-        self.name = name
-        self.tracks = []
+    def __init__(self):
+        self._tracks = {}  # dicts keep insertion order, so keys double as the ordering
 
-    def add_track(self, track):
-        if track not in self.tracks:
-            self.tracks.append(track)
+    def add(self, track):
+        if track in self._tracks:
+            return False
+        self._tracks[track] = None
+        return True
+
+    def remove(self, track):
+        if track not in self._tracks:
+            return False
+        del self._tracks[track]
+        return True
 
-    def remove_track(self, index):
-        if 0 <= index < len(self.tracks):
-            self.tracks.pop(index)
+    def __contains__(self, track):
+        return track in self._tracks
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    def __len__(self):
+        return len(self._tracks)
 
 # Custom Dialog for Creating Playlist
 class CreatePlaylistDialog(ctk.CTkToplevel):
-    def __init__(self, parent, albums):
+    def __init__(self, parent, albums, search_index):
         super().__init__(parent)
         self.parent = parent
         self.albums = albums
+        self.search_index = search_index
+        self.groups = [(album, album.tracks) for album in albums]  # (album, tracks shown under it)
+        self._search_after = None
         self.result = None
-        self.selected_tracks = []
+        self.selected_tracks = TrackSelection()
+        self.selected_rows = {}  # track -> row widget in the selected pane
         
         self.title("Create New Playlist")
         self.geometry("800x600")
@@ -74,8 +103,13 @@ class CreatePlaylistDialog(ctk.CTkToplevel):
         
         ctk.CTkLabel(left_frame, text="Available Tracks", font=("Segoe UI", 16, "bold")).pack(pady=10)
         
-        self.tracks_scroll = ctk.CTkScrollableFrame(left_frame)
-        self.tracks_scroll.pack(fill="both", expand=True, padx=10, pady=10)
+        self.search_entry = ctk.CTkEntry(left_frame, placeholder_text="Search tracks...")
+        self.search_entry.pack(fill="x", padx=10)
+        self.search_entry.bind("<KeyRelease>", self._schedule_search)
+        
+        self.tracks_list = VirtualList(left_frame, TRACK_ROW_HEIGHT, self._create_track_row,
+                                       self._bind_track_row, fg_color="#1a1a1a")
+        self.tracks_list.pack(fill="both", expand=True, padx=10, pady=10)
         
         # Right side - Selected tracks
         right_frame = ctk.CTkFrame(content_frame)
@@ -94,56 +128,102 @@ class CreatePlaylistDialog(ctk.CTkToplevel):
         ctk.CTkButton(button_frame, text="Create Playlist", command=self.create_playlist).pack(side="right", padx=10)
         
         self.populate_tracks()
-        self.update_selected_display()
         
+    @traced("CreatePlaylistDialog.populate_tracks", widgets=True)
     def populate_tracks(self):
-        for album in self.albums:
+        # One header row per album followed by its tracks; row_starts[i] is the first row of group i
+        self.row_starts = []
+        total = 0
+        for album, tracks in self.groups:
+            self.row_starts.append(total)
+            total += len(tracks) + 1
+        self.tracks_list.set_count(total)
+
+    def _row_item(self, index):
+        group = bisect.bisect_right(self.row_starts, index) - 1
+        album, tracks = self.groups[group]
+        offset = index - self.row_starts[group]
+        return album, (tracks[offset - 1] if offset else None)
+
+    def _schedule_search(self, event=None):
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DELAY, self._apply_search)
+
+    def _apply_search(self):
+        self._search_after = None
+        query = self.search_entry.get()
+        if not query.strip():
+            self.groups = [(album, album.tracks) for album in self.albums]
+        else:
+            # Artist and album hits bring in all their tracks; track hits only themselves
+            groups = {}
+            whole = set()  # albums already listed with all their tracks
+            for kind, obj in self.search_index.search(query):
+                if kind == ARTIST:
+                    for album in self.search_index.artist_albums(obj):
+                        groups[album] = album.tracks
+                        whole.add(album)
+                elif kind == ALBUM:
+                    groups[obj] = obj.tracks
+                    whole.add(obj)
+                elif obj.album not in whole:
+                    groups.setdefault(obj.album, []).append(obj)
+            self.groups = list(groups.items())
+        self.tracks_list.scroll_to(0)
+        self.populate_tracks()
+
+    def _create_track_row(self, parent):
+        row = ctk.CTkFrame(parent, fg_color="#1a1a1a")
+        row.label = ctk.CTkLabel(row, text="", anchor="w")
+        row.label.pack(side="left", padx=10, fill="x", expand=True)
+        row.add_btn = ctk.CTkButton(row, text="Add", width=50)
+        row.add_btn.pack(side="right", padx=5)
+        row.is_header = False
+        return row
+
+    def _bind_track_row(self, row, index):
+        album, track = self._row_item(index)
+        if track is None:
             # Album header
-            album_frame = ctk.CTkFrame(self.tracks_scroll, fg_color="#2a2a2a")
-            album_frame.pack(fill="x", pady=5)
-            
-            album_label = ctk.CTkLabel(album_frame, text=f"{album.artist} - {album.title}", 
-                                     font=("Segoe UI", 12, "bold"))
-            album_label.pack(pady=5)
-            
-            # Tracks
-            for track in album.tracks:
-                track_frame = ctk.CTkFrame(self.tracks_scroll, fg_color="#1a1a1a")
-                track_frame.pack(fill="x", pady=2)
-                
-                track_label = ctk.CTkLabel(track_frame, text=track.name, anchor="w")
-                track_label.pack(side="left", padx=10, fill="x", expand=True)
-                
-                add_btn = ctk.CTkButton(track_frame, text="Add", width=50,
-                                      command=lambda t=track: self.add_track(t))
-                add_btn.pack(side="right", padx=5)
-                
+            row.configure(fg_color="#2a2a2a")
+            row.label.configure(text=f"{album.artist} - {album.title}", font=("Segoe UI", 12, "bold"), anchor="center")
+            if not row.is_header:
+                row.add_btn.pack_forget()
+                row.is_header = True
+            return
+
+        row.configure(fg_color="#1a1a1a")
+        row.label.configure(text=track.name, font=("Segoe UI", 13), anchor="w")
+        if row.is_header:
+            row.add_btn.pack(side="right", padx=5)
+            row.is_header = False
+        row.add_btn.configure(command=lambda t=track: self.add_track(t),
+                              state="disabled" if track in self.selected_tracks else "normal")
+
     def add_track(self, track):
-        if track not in self.selected_tracks:
-            self.selected_tracks.append(track)
-            self.update_selected_display()
-            
+        if self.selected_tracks.add(track):
+            self._insert_selected_row(track)
+            self.tracks_list.refresh(rebind=True)
+
     def remove_track(self, track):
-        if track in self.selected_tracks:
-            self.selected_tracks.remove(track)
-            self.update_selected_display()
-            
-    def update_selected_display(self):
-        for widget in self.selected_scroll.winfo_children():
-            widget.destroy()
-            
-        for track in self.selected_tracks:
-            track_frame = ctk.CTkFrame(self.selected_scroll, fg_color="#1a1a1a")
-            track_frame.pack(fill="x", pady=2)
-            
-            track_info = f"{track.album.artist} - {track.name}"
-            track_label = ctk.CTkLabel(track_frame, text=track_info, anchor="w")
-            track_label.pack(side="left", padx=10, fill="x", expand=True)
-            
-            remove_btn = ctk.CTkButton(track_frame, text="Remove", width=60,
-                                     command=lambda t=track: self.remove_track(t))
-            remove_btn.pack(side="right", padx=5)
-            
+        if self.selected_tracks.remove(track):
+            self.selected_rows.pop(track).destroy()
+            self.tracks_list.refresh(rebind=True)
+
+    def _insert_selected_row(self, track):
+        track_frame = ctk.CTkFrame(self.selected_scroll, fg_color="#1a1a1a")
+        track_frame.pack(fill="x", pady=2)
+
+        track_info = f"{track.album.artist} - {track.name}"
+        track_label = ctk.CTkLabel(track_frame, text=track_info, anchor="w")
+        track_label.pack(side="left", padx=10, fill="x", expand=True)
+
+        remove_btn = ctk.CTkButton(track_frame, text="Remove", width=60,
+                                 command=lambda t=track: self.remove_track(t))
+        remove_btn.pack(side="right", padx=5)
+        self.selected_rows[track] = track_frame
+
     def create_playlist(self):
         name = self.name_entry.get().strip()
         if not name:
@@ -154,9 +234,7 @@ class CreatePlaylistDialog(ctk.CTkToplevel):
             messagebox.showerror("Error", "Please select at least one track")
             return
             
-        playlist = Playlist(name)
-        for track in self.selected_tracks:
-            playlist.add_track(track)
+        playlist = Playlist(name, self.selected_tracks)  # Already unique, so add_track's check is skipped
             
         self.result = playlist
         self.destroy()
@@ -169,34 +247,70 @@ class CreatePlaylistDialog(ctk.CTkToplevel):
 class MusicPlayerApp(ctk.CTk):
     def __init__(self):
         super().__init__()
+        self.startup = StartupReport(STARTED, ("imports", "window", "first paint", "audio", "library")
+                                     if STARTUP_REPORT else ())
+        self.startup.mark("imports", at=IMPORTED)
         self.geometry(f"{SCREEN_W}x{SCREEN_H}")
         self.title("LumaTune")
+        # Opt-in profiling (LUMATUNE_TRACE=1): Tk lag probe, widget counts and trace export at exit
+        self.monitor = instrumentation.install(self)
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("dark-blue")
 
-        self.albums = []
-        self.playlists = []
-        self.current_album = None
-        self.current_track = None
-        self.current_playlist = None
         self.playing = False
         self.seeking = False
-        self.seek_offset = 0
         self.current_view = "library"  # Track current view
-        self.track_duration = 0  # Store current track duration
-        self.track_start_time = 0  # When track started playing
-
-        pygame.mixer.init()
-
-        self._load_data("input.json")
+        self._search_after = None
+
+        # All playback and library state lives in the engine; this window is one of its clients
+        self.engine = PlayerEngine(self)
+        self.engine.on("state", self._on_playback_state)
+        self.engine.on("track", self._set_current_track)
+        self.engine.on("position", self._on_position)
+        self.engine.on("queue", self._on_queue_loaded)
+        self.engine.on("ended", self._on_queue_ended)
+        self.engine.on("playlists", self._on_playlists_changed)
+        self.engine.on("duplicates", self._on_playlists_changed)
+        self.engine.on("options", self._on_options)
+        self.engine.on("ready", lambda: self.startup.mark("audio"))
+        self.albums = self.engine.albums
+        self.playlists = self.engine.playlists
+        self.library_items = self.albums  # albums the library view lists, narrowed by a search
+
+        self.artwork_loader = ArtworkLoader(self.engine.workers, ARTWORK_SIZE)
         self._build_ui()
-
-    def _load_data(self, filename):
-        with open(filename, "r") as f:
-            data = json.load(f)
-        for entry in data:
-            album = Album(entry['title'], entry['artist'], entry['artwork'], entry['tracks'])
-            self.albums.append(album)
+        self.startup.mark("window")
+
+        # The shell is up; albums fill in as they are parsed while the mixer opens in the background
+        self.engine.on("library", self._on_albums_added)
+        self.engine.on("loaded", self._on_library_loaded)
+        self.engine.on("changed", self._on_library_changed)
+        self.engine.on("artwork", self._on_artwork_changed)
+        if PROGRESSIVE_LOAD:
+            self.engine.load_library_in_background(analyze=ANALYZE_LOUDNESS)
+        else:
+            self.engine.load_library(analyze=ANALYZE_LOUDNESS)
+        # Idle callbacks run after Tk's pending redraws, i.e. once the window has been drawn
+        self.after_idle(lambda: self.startup.mark("first paint"))
+
+        self.control_server = None
+        if CONTROL_API:
+            self.after_idle(self._start_control_server)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+    def _start_control_server(self):
+        from control import ControlServer  # asyncio and sockets are not needed for the first paint
+        # Remote commands are handed to Tk so they run on the same thread as the UI
+        self.control_server = ControlServer(self.engine, lambda fn: self.after(0, fn))
+        self.control_server.start_in_thread()
+
+    def _on_close(self):
+        if self.monitor:
+            self.monitor.print_summary()
+        self.engine.shutdown()
+        if self.control_server:
+            self.control_server.stop()
+        self.destroy()
 
     def _build_ui(self):
         self.sidebar = ctk.CTkFrame(self, width=SIDEBAR_WIDTH, corner_radius=0, fg_color="#111111")
@@ -222,6 +336,16 @@ class MusicPlayerApp(ctk.CTk):
         self.main_frame = ctk.CTkScrollableFrame(self.main_content_wrapper, fg_color="#1a1a1a")
         self.main_frame.pack(side="left", fill="both", expand=True)
 
+        # The library view is built once and recycles its rows, so switching back to it is cheap
+        self.library_view = ctk.CTkFrame(self.main_content_wrapper, fg_color="#1a1a1a")
+        ctk.CTkLabel(self.library_view, text="Your Albums", font=("Segoe UI", 22, "bold")).pack(pady=(20, 10))
+        self.search_entry = ctk.CTkEntry(self.library_view, placeholder_text="Search artists, albums and tracks...")
+        self.search_entry.pack(fill="x", padx=20, pady=(0, 10))
+        self.search_entry.bind("<KeyRelease>", self._schedule_search)
+        self.album_list = VirtualList(self.library_view, ALBUM_ROW_HEIGHT, self._create_album_row,
+                                      self._bind_album_row, fg_color="#1a1a1a")
+        self.album_list.pack(fill="both", expand=True)
+
         self.inline_track_list = ctk.CTkScrollableFrame(self.main_content_wrapper, fg_color="#121212")
         self.inline_track_list.pack(side="right", fill="both", padx=(10, 10), pady=(10, 10))
 
@@ -243,6 +367,14 @@ class MusicPlayerApp(ctk.CTk):
         self.btn_next = ctk.CTkButton(controls_frame, text="⏭", width=40, command=self._next_track)
         self.btn_next.pack(side="left", padx=10)
 
+        self.btn_shuffle = ctk.CTkButton(controls_frame, text="🔀", width=40, fg_color="#3a3a3a",
+                                         command=self._toggle_shuffle)
+        self.btn_shuffle.pack(side="left", padx=10)
+
+        self.btn_repeat = ctk.CTkButton(controls_frame, text="🔁", width=40, fg_color="#3a3a3a",
+                                        command=self._cycle_repeat)
+        self.btn_repeat.pack(side="left", padx=10)
+
         volume_frame = ctk.CTkFrame(self.bar, fg_color="#262626")
         volume_frame.pack(pady=5)
         ctk.CTkLabel(volume_frame, text="Volume:").pack(side="left", padx=(10, 5))
@@ -259,196 +391,273 @@ class MusicPlayerApp(ctk.CTk):
         
         self.volume_slider = ctk.CTkSlider(volume_frame, from_=0, to=1, number_of_steps=20, command=self._set_volume)
         self.volume_slider.set(0.8)
+        self.engine.set_volume(self.volume_slider.get())
         self.volume_slider.pack(side="left", fill="x", expand=True, padx=(0, 10))
 
+        self.normalization_menu = ctk.CTkOptionMenu(volume_frame, values=[m.capitalize() for m in MODES], width=90,
+                                                    command=lambda value: self.engine.set_normalization(value.lower()))
+        self.normalization_menu.set(NORMALIZATION.capitalize())
+        self.normalization_menu.pack(side="left", padx=(0, 10))
+
+        self.crossfade_menu = ctk.CTkOptionMenu(volume_frame, values=[self._fade_label(s) for s in CROSSFADE_CHOICES],
+                                                width=110, command=self._set_crossfade)
+        self.crossfade_menu.set(self._fade_label(CROSSFADE))
+        self.crossfade_menu.pack(side="left", padx=(0, 10))
+
         self.seek_frame = ctk.CTkFrame(self.bar, fg_color="#262626")
         self.seek_frame.pack(fill="x", padx=10)
         self.time_label = ctk.CTkLabel(self.seek_frame, text="0:00")
         self.time_label.pack(side="left")
-        self.seek_slider = ctk.CTkSlider(self.seek_frame, from_=0, to=100, number_of_steps=100)
+        # The track's waveform overview sits directly above the slider, at the same width
+        seek_column = ctk.CTkFrame(self.seek_frame, fg_color="#262626")
+        seek_column.pack(side="left", fill="x", expand=True, padx=(10,10))
+        self.waveform_view = WaveformView(seek_column, on_seek=self._seek_fraction)
+        self.waveform_view.pack(fill="x", padx=8)
+        self.waveform_task = None
+        self._waveforms = OrderedDict()  # location -> Waveform of recently played tracks
+        self.seek_slider = ctk.CTkSlider(seek_column, from_=0, to=100, number_of_steps=100)
         self.seek_slider.set(0)
-        self.seek_slider.pack(side="left", fill="x", expand=True, padx=(10,10))
+        self.seek_slider.pack(fill="x")
         self.seek_slider.bind("<ButtonPress-1>", lambda e: setattr(self, 'seeking', True))
         self.seek_slider.bind("<ButtonRelease-1>", self._seek_to)
         self.total_label = ctk.CTkLabel(self.seek_frame, text="0:00")
         self.total_label.pack(side="right")
-        
-        # Start the update loops
-        self.after(500, self._update_seek)
-        self.after(1000, self._check_track_end)  # Check for track end every second
+
+        # Position updates only need to be frequent while the window (and its seek bar) is visible
+        self.bind("<Map>", self._on_window_visibility, add="+")
+        self.bind("<Unmap>", self._on_window_visibility, add="+")
 
         # Show library by default
         self._show_library()
 
     def _seek_to(self, event=None):
-        if self.current_track:
-            total = self._get_track_length(self.current_track.location)
-            if total:
-                percent = self.seek_slider.get() / 100.0
-                self.seek_offset = percent * total
-                self._near_end_triggered = False  # Reset end trigger when seeking
-                pygame.mixer.music.play(start=self.seek_offset)
-                self.playing = True
-                self.seeking = False
-
-    def _check_track_end(self):
-        """Check if current track has ended and auto-advance to next track"""
-        if self.current_track and self.playing:
-            try:
-                # Check if music is still playing
-                if not pygame.mixer.music.get_busy():
-                    # Track has ended, auto-advance to next track
-                    self._auto_next_track()
-            except:
-                pass
-        
-        # Schedule next check
-        self.after(1000, self._check_track_end)
-    
-    def _auto_next_track(self):
-        """Automatically advance to next track when current track ends"""
-        tracks = []
-        if self.current_playlist:
-            tracks = self.current_playlist.tracks
-        elif self.current_album:
-            tracks = self.current_album.tracks
-            
-        if tracks and self.current_track:
-            try:
-                idx = tracks.index(self.current_track)
-                if idx < len(tracks) - 1:  # Not the last track
-                    next_idx = idx + 1
-                    self._play_track(tracks[next_idx])
-                else:
-                    # Last track - stop playing
-                    self.playing = False
-                    self.track_label.configure(text="Playlist ended")
-            except ValueError:
-                # Current track not found in list, stop playing
-                self.playing = False
-    
-    def _update_seek(self):
-        if self.current_track and self.playing:
-            try:
-                pos = pygame.mixer.music.get_pos()
-                if pos == -1:
-                    return
-                
-                current_time = pos / 1000 + self.seek_offset
-                total = self._get_track_length(self.current_track.location)
-
-                if total:
-                    progress = min(100, max(0, (current_time / total) * 100))
-                    if not self.seeking:
-                        self.seek_slider.set(progress)
-                    self.time_label.configure(text=self._format_time(current_time))
-                    self.total_label.configure(text=self._format_time(total))
-
-                    if current_time >= total - 1 and not getattr(self, '_near_end_triggered', False):
-                        self._near_end_triggered = True
-                        self.after(500, self._auto_next_track)  # Auto advance after 0.5 seconds near end
-                else:
-                    self._near_end_triggered = False
-            except:
-                pass
-        self.after(500, self._update_seek)  # Update every 500ms
+        self._seek_fraction(self.seek_slider.get() / 100.0)
+        self.seeking = False
+
+    def _seek_fraction(self, fraction):
+        total = self.engine.playback.duration
+        if self.engine.current_track and total:
+            self.engine.seek(fraction * total)
+
+    def _on_window_visibility(self, event):
+        if event.widget is self:
+            self.engine.playback.set_position_updates(self.state() != "iconic" and bool(self.winfo_viewable()))
+
+    def _on_playback_state(self, state):
+        self.playing = state == PLAYING
+
+    def _on_queue_ended(self):
+        self.track_label.configure(text="Playlist ended")
+
+    def _on_queue_loaded(self, source):
+        # The engine may have been told to play by another client, so the track list follows it
+        if isinstance(source, Album):
+            self._populate_track_list_album(source)
+        else:
+            self._populate_track_list_playlist(source)
+
+    def _on_playlists_changed(self):
+        if self.current_view == "playlists":
+            self._show_playlists()
+
+    def _on_options(self, shuffle, repeat):
+        self.btn_shuffle.configure(fg_color="#1f538d" if shuffle else "#3a3a3a")
+        self.btn_repeat.configure(text="🔂" if repeat == REPEAT_ONE else "🔁",
+                                  fg_color="#3a3a3a" if repeat == REPEAT_OFF else "#1f538d")
+
+    def _on_position(self, current_time, total):
+        if total:
+            progress = min(100, max(0, (current_time / total) * 100))
+            if not self.seeking:
+                self.seek_slider.set(progress)
+            self.waveform_view.set_progress(progress / 100)
+            self.time_label.configure(text=self._format_time(current_time))
+            self.total_label.configure(text=self._format_time(total))
 
     def _format_time(self, seconds):
         mins = int(seconds) // 60
         secs = int(seconds) % 60
         return f"{mins}:{secs:02}"
 
-    def _play_track(self, track):
-        if not track:
-            return
-        
-        # Reset tracking variables
-        self.seek_offset = 0
-        self._near_end_triggered = False
-        
-        pygame.mixer.music.stop()
-        pygame.mixer.music.load(track.location)
-        pygame.mixer.music.play()
-        pygame.mixer.music.set_volume(self.volume_slider.get())
-        
+    def _set_current_track(self, track):
         self.track_label.configure(text=f"Now Playing: {track.album.artist} - {track.name}")
-        self.playing = True
-        self.current_track = track
-        
-        # Store track duration and start time for better tracking
-        self.track_duration = self._get_track_length(track.location)
-        self.track_start_time = pygame.time.get_ticks() / 1000
+        self._show_waveform(track)
+
+    def _show_waveform(self, track):
+        """Draw the track's overview at once if it was shown recently, otherwise once a worker has read it"""
+        if self.waveform_task is not None:
+            self.waveform_task.cancel()
+            self.waveform_task = None
+        waveform = self._waveforms.get(track.location)
+        self.waveform_view.show(waveform)
+        if waveform is not None:
+            self._waveforms.move_to_end(track.location)
+            return
+        # Even a stored overview is read on a worker: the cache's lock may be held by a commit
+        self.waveform_task = self.engine.workers.submit(
+            load_waveform, track.location, self.engine.metadata, self.engine.workers.processes, priority=VISIBLE,
+            on_done=lambda result, t=track: self._waveform_loaded(t, result),
+            on_error=lambda error: None)  # Undecodable files just get no overview
+
+    def _waveform_loaded(self, track, waveform):
+        self.waveform_task = None
+        if waveform is not None:
+            self._waveforms[track.location] = waveform
+            if len(self._waveforms) > WAVEFORM_CACHE:
+                self._waveforms.popitem(last=False)
+        if track is self.engine.current_track:
+            self.waveform_view.show(waveform)
 
     def _set_volume(self, value):
-        pygame.mixer.music.set_volume(float(value))
+        self.engine.set_volume(value)
+
+    def _fade_label(self, seconds):
+        return f"Fade {seconds:g} s" if seconds else "No fade"
+
+    def _set_crossfade(self, label):
+        seconds = next((s for s in CROSSFADE_CHOICES if self._fade_label(s) == label), 0)
+        self.engine.set_crossfade(seconds)
 
     def _toggle_play_pause(self):
-        if self.playing:
-            pygame.mixer.music.pause()
-        else:
-            pygame.mixer.music.unpause()
-        self.playing = not self.playing
+        self.engine.toggle_pause()
 
     def _next_track(self):
-        tracks = []
-        if self.current_playlist:
-            tracks = self.current_playlist.tracks
-        elif self.current_album:
-            tracks = self.current_album.tracks
-            
-        if tracks and self.current_track:
-            try:
-                idx = tracks.index(self.current_track)
-                next_idx = (idx + 1) % len(tracks)
-                self._play_track(tracks[next_idx])
-            except ValueError:
-                pass
+        self.engine.next()
 
     def _previous_track(self):
-        tracks = []
-        if self.current_playlist:
-            tracks = self.current_playlist.tracks
-        elif self.current_album:
-            tracks = self.current_album.tracks
-            
-        if tracks and self.current_track:
-            try:
-                idx = tracks.index(self.current_track)
-                prev_idx = (idx - 1) % len(tracks)
-                self._play_track(tracks[prev_idx])
-            except ValueError:
-                pass
-
-    def _get_track_length(self, filepath):
-        try:
-            audio = MP3(filepath)
-            return audio.info.length
-        except:
-            return 180
+        self.engine.previous()
+
+    def _toggle_shuffle(self):
+        self.engine.set_shuffle(not self.engine.queue.shuffle)
 
+    def _cycle_repeat(self):
+        self.engine.cycle_repeat()
+
+    def _play_queued(self, item_id):
+        """Play an entry of the current queue, e.g. a row clicked in the track list"""
+        self.engine.play_queued(item_id)
+
+    def _show_queue_menu(self, event, track):
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Play Next", command=lambda: self.engine.play_next(track))
+        menu.add_command(label="Add to Queue", command=lambda: self.engine.add_to_queue(track))
+        menu.tk_popup(event.x_root, event.y_root)
+
+    @traced("view:library", widgets=True)
     def _show_library(self):
         self.current_view = "library"
+        self.main_frame.pack_forget()
+        self.library_view.pack(side="left", fill="both", expand=True)
+        self.album_list.set_count(len(self.library_items))
+
+    def _on_albums_added(self, albums):
+        # While the catalog loads, grow the list, or re-run a search typed in the meantime
+        if self.search_entry.get().strip():
+            self._schedule_search()
+        else:
+            self.album_list.set_count(len(self.library_items))
+
+    def _on_library_loaded(self):
+        self.startup.mark("library", f"{len(self.albums)} albums")
+        if WATCH_LIBRARY:
+            self.engine.watch_library()
+        if FIND_DUPLICATES:
+            self.engine.find_duplicates()
+
+    def _on_library_changed(self, removed, added):
+        # Files changed on disk; hidden views pick the albums up when next shown
+        for album in removed:
+            for track in album.tracks:
+                self._waveforms.pop(track.location, None)
+        if self.search_entry.get().strip():
+            self._schedule_search()
+        elif self.current_view == "library":
+            self.album_list.set_count(len(self.library_items))
+
+    def _on_artwork_changed(self, paths):
+        for path in paths:
+            self.artwork_loader.forget(path)
+        if self.current_view == "library":
+            self.album_list.refresh(rebind=True)
+
+    def _schedule_search(self, event=None):
+        # Search as you type, but only once typing pauses
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DELAY, self._apply_search)
+
+    @traced("MusicPlayerApp._apply_search")
+    def _apply_search(self):
+        self._search_after = None
+        query = self.search_entry.get()
+        if not query.strip():
+            self.library_items = self.albums
+        else:
+            # The library lists albums, so artist and track hits are shown as their albums
+            albums = {}
+            for kind, obj in self.engine.search(query):
+                if kind == ARTIST:
+                    for album in self.engine.search_index.artist_albums(obj):
+                        albums[album] = None
+                elif kind == ALBUM:
+                    albums[obj] = None
+                else:
+                    albums[obj.album] = None
+            self.library_items = list(albums)
+        self.album_list.scroll_to(0)
+        self.album_list.set_count(len(self.library_items))
+
+    def _show_main_frame(self):
+        """Swap the library view out for the generic scrollable frame and clear it"""
+        self.library_view.pack_forget()
+        self.main_frame.pack(side="left", fill="both", expand=True)
         for widget in self.main_frame.winfo_children():
             widget.destroy()
-        header = ctk.CTkLabel(self.main_frame, text="Your Albums", font=("Segoe UI", 22, "bold"))
-        header.pack(pady=20)
-        for album in self.albums:
-            frame = ctk.CTkFrame(self.main_frame, fg_color="#2a2a2a", corner_radius=12)
-            frame.pack(padx=20, pady=10, anchor="w", fill="x")
-            
-            lbl_img = ctk.CTkLabel(frame, image=album.ctk_artwork, text="")
-            lbl_img.pack(side="left", padx=10, pady=10)
-            
-            text = f"{album.artist}\n{album.title}"
-            lbl = ctk.CTkLabel(frame, text=text, anchor="w", justify="left", font=("Segoe UI", 14))
-            lbl.pack(side="left", padx=10)
-            btn_play = ctk.CTkButton(frame, text="▶ Play", width=80, command=lambda alb=album: self._play_album(alb))
-            btn_play.pack(side="right", padx=10)
 
+    def _create_album_row(self, parent):
+        row = ctk.CTkFrame(parent, fg_color="#1a1a1a", height=ALBUM_ROW_HEIGHT)
+        frame = ctk.CTkFrame(row, fg_color="#2a2a2a", corner_radius=12)
+        frame.pack(padx=20, pady=10, fill="both", expand=True)
+
+        row.lbl_img = ctk.CTkLabel(frame, image=self.artwork_loader.placeholder, text="")
+        row.lbl_img.pack(side="left", padx=10, pady=10)
+
+        row.lbl = ctk.CTkLabel(frame, text="", anchor="w", justify="left", font=("Segoe UI", 14))
+        row.lbl.pack(side="left", padx=10)
+        row.btn_play = ctk.CTkButton(frame, text="▶ Play", width=80)
+        row.btn_play.pack(side="right", padx=10)
+        row.album = None
+        row.artwork_request = None  # (path, callback) still waiting for a thumbnail
+        return row
+
+    @traced("MusicPlayerApp._bind_album_row")
+    def _bind_album_row(self, row, index):
+        album = self.library_items[index]
+        if row.artwork_request and row.album is not album:
+            # Scrolled past before its thumbnail arrived; don't decode artwork nobody will see
+            self.artwork_loader.cancel(*row.artwork_request)
+            row.artwork_request = None
+        row.album = album
+        row.lbl.configure(text=f"{album.artist}\n{album.title}")
+        row.btn_play.configure(command=lambda alb=album: self._play_album(alb))
+
+        image = self.artwork_loader.get(album.artwork_path)
+        row.lbl_img.configure(image=image or self.artwork_loader.placeholder)
+        if image is None and row.artwork_request is None:
+            callback = lambda img, r=row, alb=album: self._set_artwork(r, alb, img)
+            row.artwork_request = (album.artwork_path, callback)
+            self.artwork_loader.request(album.artwork_path, callback)
+
+    def _set_artwork(self, row, album, image):
+        # The row may have been recycled for another album before the thumbnail arrived
+        row.artwork_request = None
+        if row.album is album:
+            row.lbl_img.configure(image=image)
+
+    @traced("view:playlists", widgets=True)
     def _show_playlists(self):
         self.current_view = "playlists"
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+        self._show_main_frame()
         
         # Header with create button
         header_frame = ctk.CTkFrame(self.main_frame, fg_color="#1a1a1a")
@@ -481,7 +690,10 @@ class MusicPlayerApp(ctk.CTk):
                 playlist_icon.pack(expand=True)
                 
                 # Playlist info
+                duplicates = len(self.engine.duplicates_in(playlist))
                 info_text = f"{playlist.name}\n{len(playlist.tracks)} tracks"
+                if duplicates:
+                    info_text += f" • {duplicates} duplicates"
                 lbl = ctk.CTkLabel(frame, text=info_text, anchor="w", justify="left", font=("Segoe UI", 14))
                 lbl.pack(side="left", padx=10, fill="x", expand=True)
                 
@@ -493,15 +705,21 @@ class MusicPlayerApp(ctk.CTk):
                                        command=lambda pl=playlist: self._play_playlist(pl))
                 btn_play.pack(side="top", pady=2)
                 
+                if duplicates:
+                    btn_collapse = ctk.CTkButton(button_frame, text="Remove Duplicates", width=80,
+                                               fg_color="#3a3a3a", hover_color="#505050",
+                                               command=lambda pl=playlist: self._collapse_duplicates(pl))
+                    btn_collapse.pack(side="top", pady=2)
+                
                 btn_delete = ctk.CTkButton(button_frame, text="Delete", width=80,
                                          fg_color="#8b0000", hover_color="#a50000",
                                          command=lambda pl=playlist: self._delete_playlist(pl))
                 btn_delete.pack(side="top", pady=2)
 
+    @traced("view:playlists_for_you", widgets=True)
     def _show_playlists_for_you(self):
         self.current_view = "playlists_for_you"
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+        self._show_main_frame()
         
         header = ctk.CTkLabel(self.main_frame, text="Playlists for You", font=("Segoe UI", 22, "bold"))
         header.pack(pady=20)
@@ -545,73 +763,39 @@ class MusicPlayerApp(ctk.CTk):
                 btn_add.pack(side="top", pady=2)
 
     def _generate_suggested_playlists(self):
-        """Generate suggested playlists based on available albums"""
-        suggested = []
-        
-        if len(self.albums) >= 2:
-            # Create "Best of Collection" playlist with first track from each album
-            best_of = Playlist("Best of Your Collection")
-            for album in self.albums[:5]:  # Limit to first 5 albums
-                if album.tracks:
-                    best_of.add_track(album.tracks[0])
-            if best_of.tracks:
-                suggested.append(best_of)
-        
-        # Create artist-specific playlists if we have multiple albums from same artist
-        artist_tracks = {}
-        for album in self.albums:
-            if album.artist not in artist_tracks:
-                artist_tracks[album.artist] = []
-            artist_tracks[album.artist].extend(album.tracks)
-        
-        for artist, tracks in artist_tracks.items():
-            if len(tracks) >= 3:  # Only create if artist has 3+ tracks
-                artist_playlist = Playlist(f"{artist} Collection")
-                for track in tracks[:8]:  # Limit to 8 tracks
-                    artist_playlist.add_track(track)
-                suggested.append(artist_playlist)
-        
-        return suggested[:3]  # Return max 3 suggested playlists
+        """Suggested playlists from the engine's cached library and play-history aggregates"""
+        return self.engine.suggested_playlists()
 
     def _create_new_playlist(self):
-        dialog = CreatePlaylistDialog(self, self.albums)
+        dialog = CreatePlaylistDialog(self, self.albums, self.engine.search_index)
         self.wait_window(dialog)
         
         if dialog.result:
-            self.playlists.append(dialog.result)
-            self._show_playlists()  # Refresh the view
+            self.engine.add_playlist(dialog.result)  # The playlists view refreshes on the engine's event
             messagebox.showinfo("Success", f"Playlist '{dialog.result.name}' created successfully!")
 
+    def _collapse_duplicates(self, playlist):
+        count = len(self.engine.duplicates_in(playlist))
+        if messagebox.askyesno("Remove Duplicates",
+                               f"Keep only the first copy of each recording in '{playlist.name}'? "
+                               f"{count} tracks will be removed."):
+            self.engine.collapse_duplicates(playlist)
+
     def _delete_playlist(self, playlist):
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete playlist '{playlist.name}'?"):
-            self.playlists.remove(playlist)
-            self._show_playlists()  # Refresh the view
+            self.engine.delete_playlist(playlist)
 
     def _add_suggested_playlist(self, playlist):
-        # Create a copy of the suggested playlist
-        new_playlist = Playlist(playlist.name)
-        for track in playlist.tracks:
-            new_playlist.add_track(track)
-        
-        self.playlists.append(new_playlist)
+        self.engine.copy_playlist(playlist)
         messagebox.showinfo("Success", f"Playlist '{playlist.name}' added to your playlists!")
 
     def _play_album(self, album):
-        if album.tracks:
-            self.current_album = album
-            self.current_playlist = None  # Clear current playlist
-            self.current_track = album.tracks[0]
-            self._populate_track_list_album(album)
-            self._play_track(self.current_track)
+        self.engine.play_album(album)
 
     def _play_playlist(self, playlist):
-        if playlist.tracks:
-            self.current_playlist = playlist
-            self.current_album = None  # Clear current album
-            self.current_track = playlist.tracks[0]
-            self._populate_track_list_playlist(playlist)
-            self._play_track(self.current_track)
+        self.engine.play_playlist(playlist)
 
+    @traced("MusicPlayerApp._populate_track_list_album", widgets=True)
     def _populate_track_list_album(self, album):
         for widget in self.inline_track_list.winfo_children():
             widget.destroy()
@@ -623,15 +807,21 @@ class MusicPlayerApp(ctk.CTk):
         ctk.CTkLabel(header_frame, text=f"{album.artist} - {album.title}", 
                     font=("Segoe UI", 14, "bold")).pack(pady=10)
         
-        for track in album.tracks:
+        for i, track in enumerate(album.tracks):
             item = ctk.CTkFrame(self.inline_track_list, fg_color="#2a2a2a", corner_radius=8)
             item.pack(fill="x", pady=4, padx=6)
             item.track = track
             label = ctk.CTkLabel(item, text=track.name, font=("Segoe UI", 13), anchor="w")
             label.pack(side="left", padx=10, fill="x", expand=True)
-            btn = ctk.CTkButton(item, text="▶", width=30, command=lambda t=track: self._play_track(t))
+            label.bind("<Button-3>", lambda e, t=track: self._show_queue_menu(e, t))
+            btn = ctk.CTkButton(item, text="▶", width=30, command=lambda idx=i: self._play_queued(idx))
             btn.pack(side="right", padx=6)
+            plays = self.engine.play_count(track)
+            if plays:
+                ctk.CTkLabel(item, text=f"{plays} play{'s' if plays != 1 else ''}", font=("Segoe UI", 11),
+                             text_color="#888888").pack(side="right", padx=6)
 
+    @traced("MusicPlayerApp._populate_track_list_playlist", widgets=True)
     def _populate_track_list_playlist(self, playlist):
         for widget in self.inline_track_list.winfo_children():
             widget.destroy()
@@ -651,8 +841,9 @@ class MusicPlayerApp(ctk.CTk):
             track_info = f"{track.album.artist} - {track.name}"
             label = ctk.CTkLabel(item, text=track_info, font=("Segoe UI", 13), anchor="w")
             label.pack(side="left", padx=10, fill="x", expand=True)
+            label.bind("<Button-3>", lambda e, t=track: self._show_queue_menu(e, t))
             
-            btn_play = ctk.CTkButton(item, text="▶", width=30, command=lambda t=track: self._play_track(t))
+            btn_play = ctk.CTkButton(item, text="▶", width=30, command=lambda idx=i: self._play_queued(idx))
             btn_play.pack(side="right", padx=6)
             
             # Add remove button for custom playlists (not suggested ones)
@@ -662,9 +853,8 @@ class MusicPlayerApp(ctk.CTk):
                 btn_remove.pack(side="right", padx=2)
 
     def _remove_track_from_playlist(self, playlist, track_index):
-        if 0 <= track_index < len(playlist.tracks):
-            playlist.remove_track(track_index)
-            self._populate_track_list_playlist(playlist)  # Refresh the display
+        self.engine.remove_from_playlist(playlist, track_index)
+        self._populate_track_list_playlist(playlist)  # Refresh the display
  
 if __name__ == '__main__':
     app = MusicPlayerApp()
@@ -0,0 +1,228 @@
+# metadata_cache.py
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from instrumentation import traced
+
+# Configuration
+CACHE_DIR = ".cache"
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "metadata.db")
+LRU_SIZE = 1024
+REVALIDATE_AFTER = 30  # Seconds before an in-memory entry is re-checked against the file
+UNREADABLE = "unreadable"  # set in the stored data of files the tags could not be read from
+
+@traced("read_metadata")
+def read_metadata(filepath):
+    """Parse duration, bitrate and tags from an MP3 file"""
+    # Imported on first use so startup does not pay for mutagen; this normally runs on a worker
+    from mutagen.mp3 import MP3
+    from mutagen.easyid3 import EasyID3
+    audio = MP3(filepath, ID3=EasyID3)
+    tags = {}
+    if audio.tags:
+        for key, values in audio.tags.items():
+            if values:
+                tags[key] = str(values[0])
+    return {
+        "duration": audio.info.length,
+        "bitrate": audio.info.bitrate,
+        "tags": tags,
+    }
+
+def is_readable(data):
+    """Whether stored data holds parsed tags; earlier scans stored unreadable files as records with no duration"""
+    return not data.get(UNREADABLE) and data.get("duration") is not None
+
+def _readable(data):
+    # Entries of unreadable files only hold results such as loudness; get() reports them as None
+    return data if is_readable(data) else None
+
+def file_key(filepath):
+    """Return the (size, mtime) pair a cache entry is validated against"""
+    st = os.stat(filepath)
+    return st.st_size, st.st_mtime_ns
+
+class MetadataCache:
+    """Track metadata keyed by path+size+mtime, with an in-memory LRU over an SQLite store.
+
+    Files whose tags cannot be read, e.g. formats other than MP3 or corrupt files, are
+    stored too, marked UNREADABLE, so they are not parsed again until they change and
+    results such as loudness can still be kept for them.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, lru_size=LRU_SIZE):
+        self.path = path
+        self.lru_size = lru_size
+        self._lru = OrderedDict()  # filepath -> [size, mtime, data, checked_at]
+        self._lock = threading.RLock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, data TEXT)"
+        )
+        # Larger per-file data such as seek indexes, validated the same way as metadata
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "path TEXT, kind TEXT, size INTEGER, mtime INTEGER, data BLOB, PRIMARY KEY (path, kind))"
+        )
+        self._db.commit()
+
+    def get(self, filepath):
+        """Return the metadata dict for a file, parsing it only when the cache is stale; None if unreadable"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._lru.get(filepath)
+            if entry and now - entry[3] < REVALIDATE_AFTER:
+                self._lru.move_to_end(filepath)
+                return _readable(entry[2])
+
+        try:
+            size, mtime = file_key(filepath)
+        except OSError:
+            return None
+
+        with self._lock:
+            if entry and entry[0] == size and entry[1] == mtime:
+                entry[3] = now
+                self._lru.move_to_end(filepath)
+                return _readable(entry[2])
+
+            data = self._load(filepath, size, mtime)
+            if data is not None:
+                self._remember(filepath, size, mtime, data, now)
+                return _readable(data)
+
+        try:
+            data = read_metadata(filepath)
+        except Exception:
+            data = {UNREADABLE: True}
+
+        with self._lock:
+            self._remember(filepath, size, mtime, data, now)
+            self._store(filepath, size, mtime, data)
+        return _readable(data)
+
+    def duration(self, filepath, default=None):
+        """Return the cached track length in seconds"""
+        data = self.get(filepath)
+        if data and data.get("duration"):
+            return data["duration"]
+        return default
+
+    def forget(self, paths):
+        """Drop in-memory entries so the next get() checks the files again, e.g. after they changed on disk"""
+        with self._lock:
+            for filepath in paths:
+                self._lru.pop(filepath, None)
+
+    def entries(self):
+        """Return {path: (size, mtime, data)} for every stored entry, for bulk validation; UNREADABLE ones included"""
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime, data FROM metadata").fetchall()
+        return {path: (size, mtime, json.loads(data)) for path, size, mtime, data in rows}
+
+    def put_many(self, items):
+        """Store (path, size, mtime, data) tuples in a single transaction"""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime, data) VALUES (?, ?, ?, ?)",
+                [(path, size, mtime, json.dumps(data)) for path, size, mtime, data in items],
+            )
+            self._db.commit()
+            for path, size, mtime, data in items:
+                if path in self._lru:
+                    self._remember(path, size, mtime, data, time.monotonic())
+
+    def update_many(self, items):
+        """Merge (path, fields) pairs into each file's cached metadata, e.g. analysis results.
+
+        Unreadable files keep the fields as well, so their analysis is not repeated.
+        """
+        rows = []
+        for filepath, fields in items:
+            self.get(filepath)  # Makes sure a valid entry exists to merge into
+            with self._lock:
+                entry = self._lru.get(filepath)
+                if entry is None:
+                    continue  # The file is gone
+                size, mtime, data = entry[:3]
+                data = dict(data, **fields)
+                self._remember(filepath, size, mtime, data, time.monotonic())
+            rows.append((filepath, size, mtime, json.dumps(data)))
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO metadata (path, size, mtime, data) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def get_blob(self, filepath, kind):
+        """Return stored bytes of the given kind for a file, or None if missing or stale"""
+        try:
+            size, mtime = file_key(filepath)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime, data FROM blobs WHERE path = ? AND kind = ?", (filepath, kind)
+            ).fetchone()
+        if row and row[0] == size and row[1] == mtime:
+            return bytes(row[2])
+        return None
+
+    def put_blob(self, filepath, kind, data):
+        try:
+            size, mtime = file_key(filepath)
+        except OSError:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO blobs (path, kind, size, mtime, data) VALUES (?, ?, ?, ?, ?)",
+                (filepath, kind, size, mtime, sqlite3.Binary(data)),
+            )
+            self._db.commit()
+
+    def put_blobs(self, kind, items):
+        """Store (path, bytes) pairs of one kind in a single transaction"""
+        rows = []
+        for filepath, data in items:
+            try:
+                size, mtime = file_key(filepath)
+            except OSError:
+                continue
+            rows.append((filepath, kind, size, mtime, sqlite3.Binary(data)))
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO blobs (path, kind, size, mtime, data) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def _load(self, filepath, size, mtime):
+        row = self._db.execute(
+            "SELECT size, mtime, data FROM metadata WHERE path = ?", (filepath,)
+        ).fetchone()
+        if row and row[0] == size and row[1] == mtime:
+            return json.loads(row[2])
+        return None
+
+    def _store(self, filepath, size, mtime, data):
+        self._db.execute(
+            "INSERT OR REPLACE INTO metadata (path, size, mtime, data) VALUES (?, ?, ?, ?)",
+            (filepath, size, mtime, json.dumps(data)),
+        )
+        self._db.commit()
+
+    def _remember(self, filepath, size, mtime, data, now):
+        self._lru[filepath] = [size, mtime, data, now]
+        self._lru.move_to_end(filepath)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,52 @@
+# models.py
+import json
+from array import array
+from library_store import LibraryStore, Track, Album
+
+# Data models: tracks and albums are views on a LibraryStore
+class Playlist:
+    """Named list of tracks, stored as an array of track ids"""
+
+    def __init__(self, name, tracks=None):
+        self.name = name
+        self.id = None     # assigned when the playlist is saved to the history store
+        self.store = None  # taken from the first track added
+        self.ids = array("I")
+        for track in tracks or ():
+            self.add_track(track, unique=False)
+
+    @property
+    def tracks(self):
+        return self.store.tracks(self.ids) if self.store else []
+
+    def add_track(self, track, unique=True):
+        if self.store is None:
+            self.store = track.store
+        if not unique or track.id not in self.ids:
+            self.ids.append(track.id)
+
+    def remove_track(self, index):
+        if 0 <= index < len(self.ids):
+            del self.ids[index]
+
+    def replace_tracks(self, replacements):
+        """Swap tracks for replacements[track], dropping those mapped to None; returns whether any were in the list"""
+        tracks = self.tracks
+        if not any(track in replacements for track in tracks):
+            return False
+        self.ids = array("I", [track.id for track in (replacements.get(t, t) for t in tracks) if track is not None])
+        return True
+
+def iter_catalog(filename, store):
+    """Add albums from input.json, or one album per line from a .jsonl catalog, yielding each"""
+    with open(filename, "r", encoding="utf-8") as f:
+        if filename.endswith(".jsonl"):
+            # JSON Lines: one album per line, parsed as it is read
+            data = (json.loads(line) for line in f if line.strip())
+        else:
+            data = json.load(f)
+        for entry in data:
+            yield store.add_album(entry['title'], entry['artist'], entry['artwork'], entry['tracks'])
+
+def load_catalog(filename, store=None):
+    return list(iter_catalog(filename, store if store is not None else LibraryStore()))
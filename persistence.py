@@ -0,0 +1,218 @@
+# persistence.py
+import os
+import json
+import time
+import queue
+import threading
+from collections import Counter, OrderedDict
+from suggestions import RECENT_SIZE
+
+# Configuration
+HISTORY_DIR = os.path.join(".cache", "history")
+SNAPSHOT_NAME = "snapshot.json"
+LOG_NAME = "log.jsonl"
+FLUSH_INTERVAL = 1.0   # seconds events wait so they are written to disk in batches
+COMPACT_AFTER = 2000   # logged events before the log is folded into a new snapshot
+
+_STOP = object()
+
+class HistoryStore:
+    """Playlists and play history, kept as a snapshot plus an append-only log of events.
+
+    Tracks are recorded by location, which stays valid when the catalog is reordered or
+    regenerated. Every change is applied in memory at once and queued for a writer
+    thread that appends a batch of JSON lines per FLUSH_INTERVAL. After COMPACT_AFTER
+    events the state is written out as a new snapshot and the log starts over, so
+    opening the store reads one snapshot and a short tail, however long the history.
+    Events carry sequence numbers and the snapshot the last one it includes, so a log
+    left over from an interrupted compaction is never applied twice. With load=False
+    the files are read by a later load(), e.g. on a worker.
+    """
+
+    def __init__(self, directory=HISTORY_DIR, compact_after=COMPACT_AFTER, load=True):
+        self.directory = directory
+        self.compact_after = compact_after
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_NAME)
+        self.log_path = os.path.join(directory, LOG_NAME)
+        self.plays = Counter()        # location -> play count
+        self.recent = OrderedDict()   # location -> None, most recent last
+        self.playlists = {}           # playlist id -> [name, list of locations], in creation order
+        self.next_id = 1
+        self.seq = 0                  # sequence number of the last event applied
+        self._logged = 0              # events in the log since the last snapshot
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        self._load_lock = threading.Lock()
+        self.loaded = False
+        if load:
+            self.load()
+
+    # Reading
+
+    def load(self):
+        """Read the snapshot and log, once; callers on other threads wait until it is done"""
+        with self._load_lock:
+            if not self.loaded:
+                self._load()
+                self.loaded = True
+
+    def _load(self):
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            snapshot = None
+        if snapshot:
+            self.seq = snapshot["seq"]
+            self.next_id = snapshot["next_id"]
+            self.plays = Counter(snapshot["plays"])
+            self.recent = OrderedDict.fromkeys(snapshot["recent"])
+            self.playlists = {int(pid): [name, tracks] for pid, name, tracks in snapshot["playlists"]}
+
+        try:
+            with open(self.log_path, "r+b") as f:
+                good = 0  # offset just past the last complete event
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete line")
+                        event = json.loads(line)
+                    except ValueError:
+                        # A batch cut short by a crash; drop it so new events are not appended to half a line
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    if event["seq"] > self.seq:
+                        self._apply(event)
+                        self.seq = event["seq"]
+                    self._logged += 1
+        except FileNotFoundError:
+            pass
+
+    def _apply(self, event):
+        op = event["op"]
+        if op == "play":
+            location = event["track"]
+            self.plays[location] += 1
+            self.recent.pop(location, None)
+            self.recent[location] = None
+            if len(self.recent) > RECENT_SIZE:
+                self.recent.popitem(last=False)
+        elif op == "create":
+            self.playlists[event["id"]] = [event["name"], list(event["tracks"])]
+            self.next_id = max(self.next_id, event["id"] + 1)
+        elif op == "delete":
+            self.playlists.pop(event["id"], None)
+        elif op == "remove":
+            playlist = self.playlists.get(event["id"])
+            if playlist:
+                # The nth copy of the track, so removing one of several copies keeps the right ones
+                positions = [i for i, location in enumerate(playlist[1]) if location == event["track"]]
+                nth = event.get("nth", 0)  # Logs from before copies were told apart removed the first
+                if nth < len(positions):
+                    del playlist[1][positions[nth]]
+
+    # Changes
+
+    def record_play(self, location):
+        self._record({"op": "play", "track": location})
+
+    def create_playlist(self, name, locations):
+        """Store a new playlist and return its id"""
+        self.load()
+        playlist_id = self.next_id
+        self._record({"op": "create", "id": playlist_id, "name": name, "tracks": list(locations)})
+        return playlist_id
+
+    def delete_playlist(self, playlist_id):
+        self._record({"op": "delete", "id": playlist_id})
+
+    def remove_from_playlist(self, playlist_id, location, nth=0):
+        """Remove the nth copy of a track from a playlist, counting from 0"""
+        self._record({"op": "remove", "id": playlist_id, "track": location, "nth": nth})
+
+    def _record(self, event):
+        self.load()  # Numbered after the saved events; only waits if a change comes in while they are read
+        self.seq += 1
+        event["seq"] = self.seq
+        self._apply(event)
+        self._send(event)
+        self._logged += 1
+        if self._logged >= self.compact_after:
+            self.compact()
+
+    def compact(self):
+        """Queue a snapshot of the current state; the writer then starts a fresh log"""
+        self.load()
+        snapshot = {
+            "seq": self.seq,
+            "next_id": self.next_id,
+            "plays": dict(self.plays),
+            "recent": list(self.recent),
+            "playlists": [[pid, name, list(tracks)] for pid, (name, tracks) in self.playlists.items()],
+        }
+        self._send(("snapshot", snapshot))
+        self._logged = 0
+
+    def close(self, timeout=5):
+        """Write everything still queued and stop the writer"""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            self._writer.join(timeout)
+            self._writer = None
+
+    # Writer thread
+
+    def _send(self, item):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="history", daemon=True)
+            self._writer.start()
+        self._queue.put(item)
+
+    def _write_loop(self):
+        os.makedirs(self.directory, exist_ok=True)
+        log = open(self.log_path, "a", encoding="utf-8")
+        try:
+            while True:
+                batch = [self._queue.get()]
+                stopping = batch[0] is _STOP
+                # Gather whatever else arrives within the flush interval into the same write
+                deadline = time.monotonic() + FLUSH_INTERVAL
+                while not stopping:
+                    try:
+                        item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    stopping = item is _STOP
+                    batch.append(item)
+
+                lines = []
+                for item in batch:
+                    if isinstance(item, dict):
+                        lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+                    elif item is not _STOP:
+                        # Snapshot: flush the events it covers, replace the snapshot, then start a new log
+                        log = self._write_snapshot(log, lines, item[1])
+                        lines = []
+                self._write_lines(log, lines)
+                if stopping:
+                    return
+        finally:
+            log.close()
+
+    def _write_lines(self, log, lines):
+        if lines:
+            log.write("".join(lines))
+            log.flush()
+            os.fsync(log.fileno())
+
+    def _write_snapshot(self, log, lines, snapshot):
+        self._write_lines(log, lines)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        log.close()
+        return open(self.log_path, "w", encoding="utf-8")
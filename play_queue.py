@@ -0,0 +1,194 @@
+# play_queue.py
+import random
+
+REPEAT_OFF = "off"
+REPEAT_ALL = "all"
+REPEAT_ONE = "one"
+REPEAT_MODES = (REPEAT_OFF, REPEAT_ALL, REPEAT_ONE)
+
+class PlayQueue:
+    """Play order over a track list with a cursor, shuffle, repeat and queue insertions.
+
+    Every queued entry gets an integer id (its index in _items), so the same track can
+    appear more than once. Tracks passed to load() keep their source position as id,
+    also after remove() takes one out of the source list.
+    """
+
+    def __init__(self, tracks=(), start=0):
+        self.shuffle = False
+        self.repeat = REPEAT_OFF
+        self.load(tracks, start)
+
+    def load(self, tracks, start=0):
+        """Replace the queue with a new source list and put the cursor on tracks[start]"""
+        self._items = list(tracks)
+        self._sources = len(self._items)  # ids below this are source positions, the rest queued insertions
+        self._natural = list(range(len(self._items)))  # source order, including queued insertions
+        self._order = self._natural
+        self._cursor = start if self._items else -1
+        if self.shuffle:
+            self._reshuffle()
+        self._queue_end = self._cursor + 1  # where "add to queue" inserts
+
+    @property
+    def current(self):
+        if 0 <= self._cursor < len(self._order):
+            return self._items[self._order[self._cursor]]
+        return None
+
+    @property
+    def tracks(self):
+        """Tracks in the order they will play"""
+        return [self._items[i] for i in self._order]
+
+    def __len__(self):
+        return len(self._order)
+
+    def next(self, auto=False):
+        """Advance the cursor; auto=True applies repeat rules for end-of-track advances"""
+        if not self._order:
+            return None
+        if auto and self.repeat == REPEAT_ONE:
+            return self.current
+
+        cursor = self._cursor + 1
+        if cursor >= len(self._order):
+            if auto and self.repeat == REPEAT_OFF:
+                return None
+            cursor = 0
+        self._cursor = cursor
+        self._queue_end = max(self._queue_end, cursor + 1)
+        return self.current
+
+    def peek_next(self):
+        """Return the track next(auto=True) would move to, without moving the cursor"""
+        if not self._order:
+            return None
+        if self.repeat == REPEAT_ONE:
+            return self.current
+        cursor = self._cursor + 1
+        if cursor >= len(self._order):
+            if self.repeat == REPEAT_OFF:
+                return None
+            cursor = 0
+        return self._items[self._order[cursor]]
+
+    def previous(self):
+        if not self._order:
+            return None
+        self._cursor = (self._cursor - 1) % len(self._order)
+        self._queue_end = self._cursor + 1
+        return self.current
+
+    def jump(self, item_id):
+        """Move the cursor to a queued entry, e.g. a row clicked in the track list"""
+        self._cursor = self._order.index(item_id)
+        self._queue_end = self._cursor + 1
+        return self.current
+
+    def play_next(self, track):
+        """Insert a track to play right after the current one"""
+        self._insert(track, self._cursor + 1)
+
+    def add_to_queue(self, track):
+        """Append a track after any other queued tracks, ahead of the rest of the source list"""
+        self._insert(track, self._queue_end)
+
+    def _insert(self, track, position):
+        item_id = len(self._items)
+        self._items.append(track)
+        if self._order is not self._natural:
+            # Keep the unshuffled order consistent: queued tracks also follow the current one there
+            natural_pos = self._natural.index(self._order[self._cursor]) + 1 if self.current is not None else 0
+            natural_pos += position - self._cursor - 1
+            self._natural.insert(natural_pos, item_id)
+        self._order.insert(position, item_id)
+        self._queue_end += 1
+
+    def remove(self, item_id):
+        """Drop an entry, e.g. a track removed from the playlist being played, keeping order and cursor.
+
+        Later ids shift down by one, as the source positions of the tracks after it do.
+        Removing the current entry leaves the cursor before the entry that followed it.
+        """
+        position = self._order.index(item_id)
+        del self._items[item_id]
+        if item_id < self._sources:
+            self._sources -= 1
+        del self._order[position]
+        if self._order is not self._natural:
+            self._natural.remove(item_id)
+            self._natural[:] = [i - (i > item_id) for i in self._natural]
+        self._order[:] = [i - (i > item_id) for i in self._order]
+        if position <= self._cursor:
+            self._cursor -= 1
+        if position < self._queue_end:
+            self._queue_end -= 1
+        self._queue_end = max(self._queue_end, self._cursor + 1)
+
+    def replace_tracks(self, tracks, replacements):
+        """Reload a source list rebuilt with tracks swapped for replacements[track] (None if dropped).
+
+        The cursor stays on the current entry, or before the entry that followed it if it
+        was dropped, and tracks added to the queue but not yet reached stay queued.
+        """
+        def replaced(track):
+            return replacements.get(track, track)
+
+        free = {}  # new track -> its positions in tracks not yet matched to an old entry
+        for i, track in enumerate(tracks):
+            free.setdefault(track, []).append(i)
+        positions = {}  # old source id -> new source id
+        for item_id in range(self._sources):
+            slots = free.get(replaced(self._items[item_id]))
+            if slots:
+                positions[item_id] = slots.pop(0)
+
+        queued = [replaced(self._items[i]) for i in self._order[self._cursor + 1:self._queue_end] if i >= self._sources]
+        current_id = self._order[self._cursor] if self.current is not None else None
+        start, before = positions.get(current_id), False
+        if start is None and current_id is not None:
+            # Played next is whatever followed the dropped entry, so the cursor goes just before it
+            following = self._order[self._cursor + 1:] + self._order[:self._cursor]
+            start = next((positions[i] for i in following if i in positions), None)
+            before = True
+
+        self.load(tracks, start or 0)
+        if start is None:
+            self._cursor = -1
+        elif before:
+            self._cursor -= 1
+        self._queue_end = self._cursor + 1
+        for track in queued:
+            if track is not None:
+                self.add_to_queue(track)
+
+    def set_shuffle(self, enabled):
+        if enabled == self.shuffle:
+            return
+        self.shuffle = enabled
+        if enabled:
+            self._reshuffle()
+        else:
+            current_id = self._order[self._cursor] if self.current is not None else None
+            self._order = self._natural
+            self._cursor = self._natural.index(current_id) if current_id is not None else -1
+        self._queue_end = self._cursor + 1
+
+    def _reshuffle(self):
+        # Precompute the whole permutation once, with the current track first
+        rest = list(self._natural)
+        if self.current is not None:
+            current_id = self._order[self._cursor]
+            rest.remove(current_id)
+            random.shuffle(rest)
+            self._order = [current_id] + rest
+            self._cursor = 0
+        else:
+            random.shuffle(rest)
+            self._order = rest
+
+    def cycle_repeat(self):
+        """Step through off -> all -> one and return the new mode"""
+        self.repeat = REPEAT_MODES[(REPEAT_MODES.index(self.repeat) + 1) % len(REPEAT_MODES)]
+        return self.repeat
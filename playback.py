@@ -0,0 +1,495 @@
+# playback.py
+import io
+import os
+from loudness import gain_factor, OFF
+from workers import PLAYBACK, PREFETCH, report_error
+from seek_index import load_index
+from instrumentation import traced
+
+pygame = None     # imported by init_mixer() on a worker so startup does not wait for SDL
+MUSIC_END = None
+
+# Configuration
+FAST_TICK = 250     # ms between position updates while the seek bar is on screen
+SLOW_TICK = 2000    # ms between checks while nobody is watching the position
+MIN_TICK = 20
+DEFAULT_LENGTH = 180
+
+# Playback states
+STOPPED = "stopped"
+LOADING = "loading"
+PLAYING = "playing"
+PAUSED = "paused"
+
+@traced("load_track")
+def load_track(track, metadata):
+    """Worker: read a track with its length, loudness and seek index so the Tk thread never touches the disk"""
+    with open(track.location, "rb") as f:
+        data = f.read()
+    info = metadata.get(track.location) or {}
+    index = load_index(track.location, data, metadata) if _namehint(track).lower() == "mp3" else None
+    # Counting frames gives the exact length, where tags and bitrate estimates can be off for VBR files
+    duration = index.duration if index else info.get("duration") or DEFAULT_LENGTH
+    return data, duration, info.get("loudness"), index
+
+def stream_info(track, metadata):
+    """Worker: the length and loudness of a track that is streamed for crossfading, without reading it"""
+    info = metadata.get(track.location) or {}
+    return info.get("duration") or DEFAULT_LENGTH, info.get("loudness")
+
+def init_mixer():
+    """Worker: import pygame and open the audio device, the slowest step of starting up"""
+    global pygame, MUSIC_END
+    import pygame as module
+    module.mixer.init()
+    MUSIC_END = module.USEREVENT + 1
+    pygame = module
+
+def _namehint(track):
+    return os.path.splitext(track.location)[1].lstrip(".")
+
+class _SliceReader(io.RawIOBase):
+    """Read-only file over data[start:] that shares the bytes instead of copying them"""
+
+    def __init__(self, data, start=0):
+        self._view = memoryview(data)[start:]
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = max(0, min(len(buffer), len(self._view) - self._pos))
+        buffer[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+class Playback:
+    """Front end for pygame.mixer.music that loads files in the background.
+
+    The next track is read ahead of time and, in gapless mode, handed to the mixer's
+    queue so it starts the moment the current one ends. With a crossfade set, tracks are
+    instead decoded and mixed by a Crossfader, overlapping by that many seconds; switching
+    between the two takes effect from the next track. Listeners registered with on()
+    receive these events on the Tk thread:
+
+        state(state)                 stopped / loading / playing / paused
+        track_started(track, auto)   auto is True when the mixer moved on by itself
+        track_end()                  playback ran out with nothing queued
+        track_failed(track)          the track play() asked for could not be read; playback stopped
+        position(seconds, duration)  while playing, more often when position updates are wanted
+        ready()                      the mixer is open; a track played before then starts now
+    """
+
+    def __init__(self, root, metadata, workers, gapless=True, normalization=OFF, crossfade=0):
+        self.root = root
+        self.metadata = metadata
+        self.workers = workers
+        self.gapless = gapless
+        self.normalization = normalization
+        self.crossfade = crossfade  # seconds tracks overlap; 0 plays through pygame.mixer.music
+        self.streaming = False      # the current track plays through the crossfader
+        self._crossfader = None     # created when crossfading is first used
+        self._next_track = None     # last track passed to prefetch()
+        self._stream_next = None    # (track, duration, loudness) queued in the crossfader
+        self.volume = 1.0
+        self.loudness = None  # stored loudness data of the current track
+        self.seek_index = None
+        self._data = None     # bytes of the current track
+        self.state = STOPPED
+        self.track = None
+        self.duration = 0
+        self.offset = 0  # seconds into the track where the mixer was last started
+        self.position_updates = True
+        self._listeners = {}
+        self._tick_id = None
+        self._load_task = None     # worker reading the track play() asked for
+        self._prefetch_task = None
+        self._buffer = None        # in-memory file the mixer is playing from
+        self._prefetched = None    # (track, data, duration, loudness, seek index) read ahead for the next track
+        self._queued = None        # track sitting in the mixer queue
+        self._queued_buffer = None
+        self._drop_queued = False  # mixer queue holds a track that should no longer play
+        self.ready = False         # the mixer opens in the background
+        self._pending_start = None  # a track that finished loading before the mixer was ready
+
+        workers.submit(init_mixer, priority=PLAYBACK, on_done=lambda result: self._on_mixer_ready())
+
+    def _on_mixer_ready(self):
+        # The end event is only posted while SDL's video subsystem is up; no window is opened.
+        # SDL expects video to be started from the main thread, so this part is not on the worker.
+        pygame.display.init()
+        pygame.mixer.music.set_endevent(MUSIC_END)
+        self.ready = True
+        self._apply_volume()
+        self._emit("ready")
+        if self._pending_start:
+            pending, self._pending_start = self._pending_start, None
+            self._start(*pending)
+
+    def on(self, event, callback):
+        self._listeners.setdefault(event, []).append(callback)
+
+    def _emit(self, event, *args):
+        for callback in self._listeners.get(event, ()):
+            callback(*args)
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self._emit("state", state)
+        if state == PLAYING:
+            self._schedule_tick()
+        else:
+            self._cancel_tick()
+
+    def play(self, track):
+        """Start a track once its bytes are in memory"""
+        # Loads still in flight are for tracks that should no longer play
+        self._cancel_loads()
+        self._queued = None
+        self._drop_queued = False
+        self._pending_start = None
+        if self.ready:
+            pygame.mixer.music.stop()  # Also discards anything queued behind the old track
+            pygame.event.clear(MUSIC_END)
+        self.track = track
+        self.duration = 0
+        self.offset = 0
+
+        if self._use_crossfade():
+            # The crossfader keeps playing the old track and fades over once the new one has decoded
+            if self._stream_next and self._stream_next[0] == track:
+                self._start_stream(*self._stream_next)
+                return
+            self._set_state(LOADING)
+            self._load_task = self.workers.submit(stream_info, track, self.metadata, priority=PLAYBACK,
+                                                  on_done=lambda result: self._start_stream(track, *result),
+                                                  on_error=lambda error: self._load_failed(track, error))
+            return
+        self._stop_stream()
+
+        if self._prefetched and self._prefetched[0] == track:
+            prefetched = self._prefetched
+            self._prefetched = None
+            self._start(*prefetched)
+            return
+
+        self._set_state(LOADING)
+        self._load_task = self.workers.submit(load_track, track, self.metadata, priority=PLAYBACK,
+                                              on_done=lambda result: self._start(track, *result),
+                                              on_error=lambda error: self._load_failed(track, error))
+
+    def prefetch(self, track):
+        """Read the track that plays next; in gapless mode also queue it behind the current one"""
+        if self._prefetch_task is not None:
+            self._prefetch_task.cancel()
+            self._prefetch_task = None
+        self._next_track = track
+        if self._use_crossfade():
+            if self._queued is not None:
+                self._drop_queued = True  # The mixer queue plays no further; the crossfader takes over
+                self._queued = None
+            self._stream_next = None
+            if self.streaming:
+                self._crossfader.queue(None, None, 0)
+            if track is not None:
+                self._prefetch_task = self.workers.submit(stream_info, track, self.metadata, priority=PREFETCH,
+                                                          on_done=lambda result: self._queue_stream(track, *result),
+                                                          on_error=self._prefetch_failed)
+            return
+        if self._stream_next is not None:
+            self._stream_next = None
+            self._crossfader.queue(None, None, 0)
+        if track is None:
+            if self._queued is not None:
+                self._drop_queued = True
+            self._queued = None
+            self._prefetched = None
+            return
+        if self._prefetched and self._prefetched[0] == track:
+            self._queue_prefetched()
+            return
+
+        self._prefetch_task = self.workers.submit(load_track, track, self.metadata, priority=PREFETCH,
+                                                  on_done=lambda result: self._store_prefetch(track, *result),
+                                                  on_error=self._prefetch_failed)
+
+    def _cancel_loads(self):
+        for task in (self._load_task, self._prefetch_task):
+            if task is not None:
+                task.cancel()
+        self._load_task = self._prefetch_task = None
+
+    def _load_failed(self, track, error):
+        # A file deleted or unreadable since it was listed is routine; anything else is a bug
+        if not isinstance(error, OSError):
+            report_error(error)
+        self._load_task = None
+        self._stop_stream()  # play() already stopped the mixer, so nothing plays on
+        self._set_state(STOPPED)
+        self._emit("track_failed", track)
+
+    def _prefetch_failed(self, error):
+        if not isinstance(error, OSError):
+            report_error(error)
+        self._prefetch_task = None
+        # Nothing is queued behind the current track; the next one is read again when it comes up
+
+    def seek(self, seconds):
+        if self.state not in (PLAYING, PAUSED):
+            return
+        if self.streaming:
+            # Restart the decoder at the new position; seeking never fades
+            self._crossfader.play(self.track.location, self.track, self._gain(self.loudness), start=seconds, fade=False)
+        elif self.seek_index:
+            # Restart the decoder on the exact frame; the position is then offset + get_pos() with no drift
+            start, seconds = self.seek_index.locate(self._data, seconds)
+            self._buffer = _SliceReader(self._data, start)
+            pygame.mixer.music.load(self._buffer, _namehint(self.track))
+            pygame.mixer.music.play()
+            if self._queued is not None:
+                self._queued = None
+                self._queue_prefetched()
+        else:
+            pygame.mixer.music.play(start=seconds)
+        self.offset = seconds
+        self._apply_volume()
+        pygame.event.clear(MUSIC_END)
+        self._set_state(PLAYING)
+        self._restart_tick()
+
+    def position(self):
+        """Seconds into the current track"""
+        if not self.ready:
+            return self.offset
+        if self.streaming:
+            playing = self._crossfader.position()
+            if playing is None or playing[0] is not self.track:
+                return self.offset  # The new track's first chunk is not audible yet
+            return playing[1]
+        pos = pygame.mixer.music.get_pos()
+        if pos == -1:
+            return self.offset
+        return self.offset + pos / 1000
+
+    def pause(self):
+        if self.state == PLAYING:
+            if self.streaming:
+                self._crossfader.pause()
+            else:
+                pygame.mixer.music.pause()
+            self._set_state(PAUSED)
+
+    def resume(self):
+        if self.state == PAUSED:
+            if self.streaming:
+                self._crossfader.resume()
+            else:
+                pygame.mixer.music.unpause()
+            self._set_state(PLAYING)
+
+    def set_volume(self, volume):
+        self.volume = float(volume)
+        self._apply_volume()
+
+    def set_normalization(self, mode):
+        """Switch between no, per-track and per-album loudness normalization"""
+        self.normalization = mode
+        self._apply_volume()
+
+    def set_crossfade(self, seconds):
+        """Overlap tracks by this many seconds, 0 for gapless playback through pygame.mixer.music"""
+        from crossfade import MAX_FADE
+        was = self._use_crossfade()
+        self.crossfade = min(MAX_FADE, max(0.0, float(seconds)))
+        if self._crossfader is not None:
+            self._crossfader.fade = self.crossfade
+        if self._use_crossfade() != was and self.track is not None:
+            self.prefetch(self._next_track)  # Read the next track ahead the other way
+
+    def _use_crossfade(self):
+        return self.crossfade > 0 and self.ready and self._get_crossfader() is not None
+
+    def _get_crossfader(self):
+        if self._crossfader is None:
+            from crossfade import Crossfader
+            try:
+                self._crossfader = Crossfader(self.crossfade)
+            except (ValueError, ImportError, pygame.error) as e:
+                # e.g. a mixer that is not 16-bit or has no channel to spare, or NumPy missing
+                report_error(e)
+                self.crossfade = 0  # Tracks change the plain way from now on
+        return self._crossfader
+
+    def _gain(self, loudness):
+        # Normalization scales the slider value; the mixer cannot amplify past 1.0
+        return min(1.0, self.volume * gain_factor(loudness, self.normalization))
+
+    def _apply_volume(self):
+        if not self.ready:
+            return  # Applied once the mixer opens
+        if self.streaming:
+            self._crossfader.set_gain(self.track, self._gain(self.loudness))
+            if self._stream_next:
+                track, _, loudness = self._stream_next
+                self._crossfader.set_gain(track, self._gain(loudness))
+            return
+        pygame.mixer.music.set_volume(self._gain(self.loudness))
+
+    def set_position_updates(self, enabled):
+        """Tick quickly only while someone shows the position, e.g. the seek bar is on screen"""
+        if enabled != self.position_updates:
+            self.position_updates = enabled
+            self._restart_tick()
+
+    def _start(self, track, data, duration, loudness, seek_index):
+        if not self.ready:
+            self._pending_start = (track, data, duration, loudness, seek_index)
+            return
+        self._data = data
+        self.seek_index = seek_index
+        self._buffer = io.BytesIO(data)
+        pygame.mixer.music.load(self._buffer, _namehint(track))
+        pygame.mixer.music.play()
+        self.loudness = loudness
+        self._apply_volume()
+        self.duration = duration
+        self._set_state(PLAYING)
+        self._restart_tick()
+        self._emit("track_started", track, False)
+
+    def _start_stream(self, track, duration, loudness):
+        pygame.mixer.music.stop()
+        pygame.event.clear(MUSIC_END)
+        self._queued = None
+        self._drop_queued = False
+        self._stream_next = None
+        self.streaming = True
+        self._data = None
+        self.seek_index = None
+        self._crossfader.play(track.location, track, self._gain(loudness))
+        self.loudness = loudness
+        self.duration = duration
+        self._set_state(PLAYING)
+        self._restart_tick()
+        self._emit("track_started", track, False)
+
+    def _queue_stream(self, track, duration, loudness):
+        self._stream_next = (track, duration, loudness)
+        if self.streaming:
+            self._crossfader.queue(track.location, track, self._gain(loudness))
+        # Otherwise mixer.music plays to the end and the track starts from play()
+
+    def _stop_stream(self):
+        if self.streaming:
+            self._crossfader.stop()
+            self.streaming = False
+            self._stream_next = None
+
+    def close(self):
+        if self._crossfader is not None:
+            self._crossfader.close()
+
+    def _store_prefetch(self, track, data, duration, loudness, seek_index):
+        self._prefetched = (track, data, duration, loudness, seek_index)
+        self._queue_prefetched()
+
+    def _queue_prefetched(self):
+        track, data = self._prefetched[:2]
+        if not self.gapless or not self.ready or self.streaming or self._queued == track:
+            return
+        self._queued_buffer = io.BytesIO(data)
+        pygame.mixer.music.queue(self._queued_buffer, _namehint(track))
+        self._queued = track
+        self._drop_queued = False
+
+    def _check_stream(self):
+        """Handle the crossfader's events: the queued track fading in, or the end of playback"""
+        for event, track in self._crossfader.events():
+            if event == "advanced" and self._stream_next and self._stream_next[0] is track:
+                _, self.duration, self.loudness = self._stream_next
+                self._stream_next = None
+                self.track = track
+                self.offset = 0
+                self._emit("track_started", track, True)
+            elif event == "ended" and track is self.track:
+                self.streaming = False
+                self._set_state(STOPPED)
+                self._emit("track_end")
+
+    def _check_end(self):
+        """Handle the mixer's end event: either a gapless switch or the end of playback"""
+        if self.streaming:
+            self._check_stream()
+            return
+        if not pygame.event.get(MUSIC_END):
+            return
+        if self._queued is not None and not self._drop_queued:
+            track, data, duration, loudness, seek_index = self._prefetched
+            self._data = data
+            self.seek_index = seek_index
+            self._buffer = self._queued_buffer
+            if not pygame.mixer.music.get_busy():
+                # The current track ran out before the queue call landed; start the next one by hand
+                pygame.mixer.music.load(self._buffer, _namehint(track))
+                pygame.mixer.music.play()
+            self._queued = None
+            self._prefetched = None
+            self.track = track
+            self.duration = duration
+            self.offset = 0
+            # The queued track started at the previous track's gain; correct it as soon as we notice
+            self.loudness = loudness
+            self._apply_volume()
+            self._emit("track_started", track, True)
+            return
+
+        if self._drop_queued:
+            pygame.mixer.music.stop()
+            pygame.event.clear(MUSIC_END)
+            self._drop_queued = False
+        self._set_state(STOPPED)
+        self._emit("track_end")
+
+    def _tick_interval(self):
+        interval = FAST_TICK if self.position_updates else SLOW_TICK
+        # While crossfading, the next track comes in that much before the end
+        fade = self.crossfade if self.streaming else 0
+        remaining = int((self.duration - fade - self.position()) * 1000)
+        if remaining > 0:
+            # Wake up right when the track should end so the end event is handled promptly
+            interval = min(interval, remaining + MIN_TICK)
+        return interval
+
+    def _schedule_tick(self):
+        if self._tick_id is None and self.state == PLAYING:
+            self._tick_id = self.root.after(self._tick_interval(), self._tick)
+
+    def _cancel_tick(self):
+        if self._tick_id is not None:
+            self.root.after_cancel(self._tick_id)
+            self._tick_id = None
+
+    def _restart_tick(self):
+        self._cancel_tick()
+        self._schedule_tick()
+
+    @traced("Playback._tick")
+    def _tick(self):
+        self._tick_id = None
+        self._check_end()
+        if self.state == PLAYING:
+            self._emit("position", self.position(), self.duration)
+            self._schedule_tick()
@@ -0,0 +1,170 @@
+# scanner.py
+import os
+import re
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from mutagen.id3 import ID3
+from metadata_cache import MetadataCache, read_metadata, is_readable, UNREADABLE
+from convert_txt_to_json import FORMATS, write_catalog
+
+# Configuration
+MUSIC_DIR = "musics"
+IMAGES_DIR = "images"
+OUTPUT_PATH = "input.json"
+AUDIO_EXTENSIONS = (".mp3",)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+COVER_NAMES = ("cover", "folder", "front", "album")
+CHUNK_SIZE = 64  # Files handed to each worker process at a time
+
+def slugify(text):
+    """Turn an album title into the file stem used under images/, e.g. "Bigger Love" -> "bigger_love" """
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+def walk_music(music_dir):
+    """Yield (path, size, mtime) for every audio file below music_dir"""
+    stack = [music_dir]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                st = entry.stat()
+                yield entry.path.replace(os.sep, "/"), st.st_size, st.st_mtime_ns
+
+def _read(path):
+    """Worker: parse one file; unreadable files get a record marked UNREADABLE so rescans skip them too"""
+    try:
+        return read_metadata(path)
+    except Exception:
+        return {UNREADABLE: True}
+
+def read_changed(files, cached, workers=None):
+    """Return {path: metadata} for all files, re-reading only those whose size or mtime changed"""
+    result = {}
+    stale = []
+    for path, size, mtime in files:
+        entry = cached.get(path)
+        if entry and entry[0] == size and entry[1] == mtime:
+            result[path] = entry[2]
+        else:
+            stale.append((path, size, mtime))
+
+    fresh = []
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            paths = [path for path, _, _ in stale]
+            for (path, size, mtime), data in zip(stale, pool.map(_read, paths, chunksize=CHUNK_SIZE)):
+                result[path] = data
+                fresh.append((path, size, mtime, data))
+    return result, fresh
+
+def _track_number(value):
+    # Tags store numbers like "3" or "3/12"
+    try:
+        return int(str(value).split("/")[0])
+    except ValueError:
+        return 0
+
+def group_albums(metadata):
+    """Group per-file metadata into albums keyed by (album artist, album title), leaving out unreadable files"""
+    albums = {}
+    for path, data in metadata.items():
+        if not is_readable(data):
+            continue
+        tags = data.get("tags", {})
+        artist = tags.get("albumartist") or tags.get("artist") or "Unknown Artist"
+        title = tags.get("album") or os.path.basename(os.path.dirname(path)) or "Unknown Album"
+        name = tags.get("title") or os.path.splitext(os.path.basename(path))[0]
+        order = (_track_number(tags.get("discnumber", 0)), _track_number(tags.get("tracknumber", 0)), name)
+        albums.setdefault((artist, title), []).append((order, name, path))
+
+    for key in albums:
+        albums[key].sort()
+    return albums
+
+def index_images(images_dir):
+    """Map slug -> image path for artwork already stored in images/"""
+    index = {}
+    if os.path.isdir(images_dir):
+        for entry in os.scandir(images_dir):
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in IMAGE_EXTENSIONS:
+                index[slugify(stem)] = entry.path.replace(os.sep, "/")
+    return index
+
+def find_artwork(title, track_paths, images, images_dir):
+    """Locate artwork: images/<slug>, a cover file beside the tracks, or art embedded in the first track"""
+    slug = slugify(title)
+    if slug in images:
+        return images[slug]
+
+    folder = os.path.dirname(track_paths[0])
+    for name in COVER_NAMES:
+        for ext in IMAGE_EXTENSIONS:
+            candidate = os.path.join(folder, name + ext)
+            if os.path.exists(candidate):
+                return candidate.replace(os.sep, "/")
+
+    for path in track_paths:
+        artwork = extract_embedded_artwork(path, os.path.join(images_dir, slug or "artwork"))
+        if artwork:
+            images[slug] = artwork
+            return artwork
+    return ""
+
+def extract_embedded_artwork(path, dest_stem):
+    """Write the first embedded APIC picture next to dest_stem and return its path"""
+    try:
+        pictures = ID3(path).getall("APIC")
+    except Exception:
+        return None
+    if not pictures:
+        return None
+    ext = ".png" if pictures[0].mime == "image/png" else ".jpg"
+    os.makedirs(os.path.dirname(dest_stem) or ".", exist_ok=True)
+    with open(dest_stem + ext, "wb") as f:
+        f.write(pictures[0].data)
+    return (dest_stem + ext).replace(os.sep, "/")
+
+def iter_catalog(albums, images_dir):
+    """Yield catalog entries in the input.json album format"""
+    images = index_images(images_dir)
+    for (artist, title), tracks in sorted(albums.items()):
+        paths = [path for _, _, path in tracks]
+        yield {
+            "title": title,
+            "artist": artist,
+            "artwork": find_artwork(title, paths, images, images_dir),
+            "tracks": [{"name": name, "location": path} for _, name, path in tracks],
+        }
+
+def scan(music_dir=MUSIC_DIR, images_dir=IMAGES_DIR, output=OUTPUT_PATH, cache=None, workers=None, fmt="pretty"):
+    """Scan music_dir and write the album catalog _load_data reads; returns (files, re-read, unreadable, albums)"""
+    cache = cache or MetadataCache()
+    files = list(walk_music(music_dir))
+    metadata, fresh = read_changed(files, cache.entries(), workers)
+    if fresh:
+        cache.put_many(fresh)
+
+    unreadable = sum(1 for data in metadata.values() if not is_readable(data))
+    count = write_catalog(iter_catalog(group_albums(metadata), images_dir), output, fmt)
+    return len(files), len(fresh), unreadable, count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan the music folder and write the LumaTune catalog")
+    parser.add_argument("--music-dir", default=MUSIC_DIR)
+    parser.add_argument("--images-dir", default=IMAGES_DIR)
+    parser.add_argument("--output", default=None, help="default: input.json, or input.jsonl for --format jsonl")
+    parser.add_argument("--format", choices=FORMATS, default="pretty")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    output = args.output or ("input.jsonl" if args.format == "jsonl" else OUTPUT_PATH)
+
+    files, reread, unreadable, albums = scan(args.music_dir, args.images_dir, output, workers=args.workers,
+                                             fmt=args.format)
+    print(f"✅ Scanned {files} files ({reread} re-read, {unreadable} unreadable and left out) into {albums} albums -> {output}")
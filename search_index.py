@@ -0,0 +1,283 @@
+# search_index.py
+import re
+import sys
+import bisect
+import threading
+import unicodedata
+from array import array
+
+# Configuration
+MAX_RESULTS = 200
+MIN_TYPO_LENGTH = 4        # shorter query words only match exactly or by prefix
+PREFIX_TERM_LIMIT = 2000   # vocabulary terms considered for one prefix
+VOCAB_MERGE_LIMIT = 1000   # new terms inserted one by one before the vocabulary is re-sorted
+
+# Result kinds, in ranking order
+ARTIST = "artist"
+ALBUM = "album"
+TRACK = "track"
+KIND_RANK = {ARTIST: 0, ALBUM: 1, TRACK: 2}
+
+# Match tiers, best first
+EXACT, PREFIX, TYPO = 0, 1, 2
+NO_MATCH = 3
+
+_WORD = re.compile(r"\w+")
+
+def tokenize(text):
+    """Lowercase, accent-free words of a string"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WORD.findall(text.lower())
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def _within_one_edit(a, b):
+    """True if a and b differ by one insertion, deletion, substitution or adjacent swap"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    if la > lb:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+class SearchIndex:
+    """Inverted index over artists, album titles and track names.
+
+    The last word of a query matches as a prefix, and words of MIN_TYPO_LENGTH or more
+    also match vocabulary terms one edit away (found through a table of single-character
+    deletions, so lookups never scan the vocabulary). Track documents also answer to
+    their album's artist and title words, kept once per album, so "mendes mercy" finds
+    the track. Every method takes the index's lock, so it can be built on a worker
+    while the UI searches it.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = []          # doc id -> (kind, obj), None once removed
+        self._doc_terms = []     # doc id -> the terms of the document's own text
+        self._doc_album = array("i")  # doc id -> album doc id whose context it also answers to, -1 for none
+        self._context = {}       # album doc id -> the album's artist and title terms
+        self._free = []          # doc ids available for reuse
+        self._postings = {}      # term -> set of doc ids that contain it in their own text
+        self._deletions = {}     # term with one character removed -> the term, or a set if several share it
+        self._vocab = []         # sorted terms, for prefix ranges
+        self._new_terms = []     # terms not yet merged into _vocab
+        self._album_docs = {}    # album -> (album doc id, track doc ids)
+        self._artists = {}       # artist name -> (doc id, list of albums)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs) - len(self._free)
+
+    def add_albums(self, albums):
+        for album in albums:
+            self.add_album(album)  # Locked per album, so a search never waits for a whole batch
+        with self._lock:
+            self._sorted_vocab()  # Sort once after a bulk load rather than on the first keystroke
+
+    def add_album(self, album):
+        """Index an album, its artist and its tracks"""
+        with self._lock:
+            if album in self._album_docs:
+                return
+            artist_terms = tokenize(album.artist)
+            album_terms = tokenize(album.title)
+
+            album_doc = self._add_doc(ALBUM, album, album_terms)
+            self._doc_album[album_doc] = album_doc
+            self._context[album_doc] = tuple(set(artist_terms + album_terms))
+            track_docs = [self._add_doc(TRACK, track, tokenize(track.name), album_doc) for track in album.tracks]
+            self._album_docs[album] = (album_doc, track_docs)
+
+            if album.artist in self._artists:
+                self._artists[album.artist][1].append(album)
+            else:
+                doc = self._add_doc(ARTIST, album.artist, artist_terms)
+                self._artists[album.artist] = (doc, [album])
+
+    def remove_album(self, album):
+        with self._lock:
+            if album not in self._album_docs:
+                return
+            album_doc, track_docs = self._album_docs.pop(album)
+            for doc in [album_doc] + track_docs:
+                self._remove_doc(doc)
+            del self._context[album_doc]
+
+            doc, albums = self._artists[album.artist]
+            albums.remove(album)
+            if not albums:
+                del self._artists[album.artist]
+                self._remove_doc(doc)
+
+    def artist_albums(self, artist):
+        with self._lock:
+            entry = self._artists.get(artist)
+            return list(entry[1]) if entry else []
+
+    def _add_doc(self, kind, obj, terms, album_doc=-1):
+        terms = tuple({sys.intern(term) for term in terms})  # Shared with every other document using them
+        if self._free:
+            doc = self._free.pop()
+            self._docs[doc] = (kind, obj)
+            self._doc_terms[doc] = terms
+            self._doc_album[doc] = album_doc
+        else:
+            doc = len(self._docs)
+            self._docs.append((kind, obj))
+            self._doc_terms.append(terms)
+            self._doc_album.append(album_doc)
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                self._postings[term] = postings = set()
+                self._new_terms.append(term)
+                for variant in _deletes(term) if len(term) >= MIN_TYPO_LENGTH else ():
+                    self._add_deletion(variant, term)
+            postings.add(doc)
+        return doc
+
+    def _remove_doc(self, doc):
+        for term in self._doc_terms[doc]:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.discard(doc)
+            if not postings:
+                # Stale entries in _vocab are skipped at lookup and dropped on the next re-sort
+                del self._postings[term]
+                for variant in _deletes(term):
+                    self._remove_deletion(variant, term)
+        self._docs[doc] = None
+        self._doc_terms[doc] = ()
+        self._doc_album[doc] = -1
+        self._free.append(doc)
+
+    def _add_deletion(self, variant, term):
+        # Most variants belong to a single term, which is stored without a set around it
+        terms = self._deletions.get(variant)
+        if terms is None:
+            self._deletions[variant] = term
+        elif isinstance(terms, set):
+            terms.add(term)
+        elif terms != term:
+            self._deletions[variant] = {terms, term}
+
+    def _remove_deletion(self, variant, term):
+        terms = self._deletions.get(variant)
+        if terms == term:
+            del self._deletions[variant]
+        elif isinstance(terms, set):
+            terms.discard(term)
+            if len(terms) == 1:
+                self._deletions[variant] = terms.pop()
+
+    def _deleted_terms(self, variant):
+        terms = self._deletions.get(variant, ())
+        return (terms,) if isinstance(terms, str) else terms
+
+    def _sorted_vocab(self):
+        if self._new_terms:
+            if len(self._new_terms) <= VOCAB_MERGE_LIMIT:
+                for term in self._new_terms:
+                    # A term removed and added again may still be in _vocab as a stale entry
+                    i = bisect.bisect_left(self._vocab, term)
+                    if i == len(self._vocab) or self._vocab[i] != term:
+                        self._vocab.insert(i, term)
+            else:
+                self._vocab = sorted(self._postings)
+            self._new_terms = []
+        return self._vocab
+
+    def _term_matches(self, word, prefix):
+        """Return {term: tier} for vocabulary terms a query word matches"""
+        matches = {}
+        if word in self._postings:
+            matches[word] = EXACT
+        if prefix:
+            vocab = self._sorted_vocab()
+            i = bisect.bisect_left(vocab, word)
+            end = min(len(vocab), i + PREFIX_TERM_LIMIT)
+            while i < end and vocab[i].startswith(word):
+                term = vocab[i]
+                if term not in matches and term in self._postings:
+                    matches[term] = PREFIX
+                i += 1
+        if len(word) >= MIN_TYPO_LENGTH:
+            candidates = set(self._deleted_terms(word))
+            for variant in _deletes(word):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._deleted_terms(variant))
+            for term in candidates:
+                if term not in matches and _within_one_edit(word, term):
+                    matches[term] = TYPO
+        return matches
+
+    def search(self, query, limit=MAX_RESULTS, kinds=None):
+        """Return up to limit (kind, obj) results, best matches first"""
+        words = tokenize(query)
+        if not words:
+            return []
+        with self._lock:
+            matches = [self._term_matches(word, i == len(words) - 1) for i, word in enumerate(words)]
+            if not all(matches):
+                return []
+            scored = self._score(matches, limit, kinds)
+            ranked = sorted(scored, key=scored.__getitem__)[:limit]
+            return [self._docs[doc] for doc in ranked]
+
+    def _score(self, matches, limit, kinds):
+        """Return {doc: (score, kind rank)} holding at least the best limit documents.
+
+        Postings are walked one tier at a time, starting from the most selective word;
+        other words are checked against each candidate's own and album terms. Track
+        documents only post their own name words, so each word gets a turn as the lead.
+        A document first reached at a tier scores at least that tier, so once limit
+        documents score no worse than a finished tier, no later one can beat them.
+        """
+        sizes = [sum(len(self._postings[term]) for term in m) for m in matches]
+        leads = sorted(range(len(matches)), key=sizes.__getitem__)
+        docs, doc_terms, doc_album, context, postings = (
+            self._docs, self._doc_terms, self._doc_album, self._context, self._postings)
+        scored = {}
+        for tier in (EXACT, PREFIX, TYPO):
+            for lead in leads:
+                others = [m for i, m in enumerate(matches) if i != lead]
+                for term in [term for term, t in matches[lead].items() if t == tier]:
+                    for doc in postings[term]:
+                        if doc in scored:
+                            continue
+                        score = tier
+                        terms = doc_terms[doc]
+                        if others and doc_album[doc] >= 0:
+                            terms = terms + context[doc_album[doc]]
+                        for m in others:
+                            best = NO_MATCH
+                            for t in terms:
+                                t_tier = m.get(t, NO_MATCH)
+                                if t_tier < best:
+                                    best = t_tier
+                            if best == NO_MATCH:
+                                break
+                            score += best
+                        else:
+                            kind = docs[doc][0]
+                            if kinds and kind not in kinds:
+                                continue
+                            scored[doc] = (score, KIND_RANK[kind])
+            if sum(1 for score, _ in scored.values() if score <= tier) >= limit:
+                break
+        return scored
@@ -0,0 +1,144 @@
+# seek_index.py
+import struct
+from array import array
+
+# Configuration
+STRIDE = 16            # frames between stored offsets; the rest are found by hopping frame headers
+BLOB_KIND = "seek_index"
+SYNC_CHECK = 3         # consecutive valid headers required when (re)synchronising
+
+# MPEG audio layer III tables
+_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),  # MPEG-1
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),      # MPEG-2
+    0: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),      # MPEG-2.5
+}
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_HEADER = struct.Struct("<IIII")  # sample rate, samples per frame, frame count, stride
+
+def parse_header(data, pos):
+    """Return (frame length, sample rate, samples per frame) for a layer III frame at pos, or None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2 = data[pos + 1], data[pos + 2]
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _BITRATES[version][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    if version == 3:
+        return 144 * bitrate // sample_rate + padding, sample_rate, 1152
+    return 72 * bitrate // sample_rate + padding, sample_rate, 576
+
+def _audio_start(data):
+    """Offset just past an ID3v2 tag, if the file has one"""
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _synced(data, pos):
+    """True if SYNC_CHECK frames in a row start at pos, so a stray 0xFF byte is not taken for a frame"""
+    for _ in range(SYNC_CHECK):
+        header = parse_header(data, pos)
+        if header is None:
+            return pos >= len(data)
+        pos += header[0]
+    return True
+
+def _is_info_frame(data, pos, length):
+    # Xing/Info and VBRI headers sit in an otherwise silent first frame that decoders skip
+    frame = data[pos:pos + min(length, 64)]
+    return b"Xing" in frame or b"Info" in frame or b"VBRI" in frame
+
+class SeekIndex:
+    """Byte offset of every STRIDE-th audio frame of an MP3, for frame-accurate seeking"""
+
+    def __init__(self, sample_rate, frame_samples, frame_count, offsets, stride=STRIDE):
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        self.frame_count = frame_count
+        self.offsets = offsets  # array('I')
+        self.stride = stride
+
+    @property
+    def frame_duration(self):
+        return self.frame_samples / self.sample_rate
+
+    @property
+    def duration(self):
+        return self.frame_count * self.frame_duration
+
+    def locate(self, data, seconds):
+        """Return (byte offset, exact start time) of the frame playing at seconds"""
+        frame = min(max(0, int(seconds / self.frame_duration)), self.frame_count - 1)
+        pos = self.offsets[frame // self.stride]
+        # At most stride - 1 header hops, so every seek costs the same
+        for _ in range(frame % self.stride):
+            header = parse_header(data, pos)
+            if header is None:
+                frame -= frame % self.stride
+                pos = self.offsets[frame // self.stride]
+                break
+            pos += header[0]
+        return pos, frame * self.frame_duration
+
+    def to_bytes(self):
+        return _HEADER.pack(self.sample_rate, self.frame_samples, self.frame_count, self.stride) + self.offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        sample_rate, frame_samples, frame_count, stride = _HEADER.unpack_from(blob)
+        offsets = array("I")
+        offsets.frombytes(blob[_HEADER.size:])
+        return cls(sample_rate, frame_samples, frame_count, offsets, stride)
+
+def build_index(data, stride=STRIDE):
+    """Scan the frame headers of an in-memory MP3 once; returns None if no audio frames are found"""
+    pos = _audio_start(data)
+    end = len(data)
+    if data[end - 128:end - 125] == b"TAG":
+        end -= 128  # ID3v1 tag
+    offsets = array("I")
+    count = 0
+    sample_rate = frame_samples = None
+    synced = False
+    while pos < end:
+        header = parse_header(data, pos)
+        if header is None or (not synced and not _synced(data, pos)):
+            # Junk before or between frames: look for the next place where frames line up again
+            synced = False
+            pos = data.find(b"\xff", pos + 1, end)
+            if pos < 0:
+                break
+            continue
+        synced = True
+        length, rate, samples = header
+        if sample_rate is None:
+            sample_rate, frame_samples = rate, samples
+            if _is_info_frame(data, pos, length):
+                pos += length
+                continue
+        if count % stride == 0:
+            offsets.append(pos)
+        count += 1
+        pos += length
+
+    if not count:
+        return None
+    return SeekIndex(sample_rate, frame_samples, count, offsets, stride)
+
+def load_index(path, data, metadata):
+    """Return the cached seek index for a file, building and caching it on first use"""
+    blob = metadata.get_blob(path, BLOB_KIND)
+    if blob is not None:
+        return SeekIndex.from_bytes(blob)
+    index = build_index(data)
+    if index is not None:
+        metadata.put_blob(path, BLOB_KIND, index.to_bytes())
+    return index
@@ -0,0 +1,108 @@
+# snapshot.py
+import mmap
+import os
+import struct
+import sys
+
+from library_store import LibraryStore, StringTable
+
+# Configuration
+SNAPSHOT_PATH = os.path.join(".cache", "library.snapshot")
+VERSION = 1
+
+_MAGIC = b"LUMALIB\0"
+_HEADER = struct.Struct("<8sHBxIqq")  # magic, version, little-endian, section count, catalog size and mtime (ns)
+_SECTION = struct.Struct("<QQ")       # offset and length of a section
+_ALIGN = 8                            # sections start on 8-byte boundaries, so they can be cast in place
+_TABLES = ("strings", "track_names", "track_locations")  # each stored as its UTF-8 bytes and uint64 end offsets
+_SECTIONS = ("source",) + tuple(f"{t}{part}" for t in _TABLES for part in ("", "_ends")) + LibraryStore.COLUMNS
+
+def source_key(catalog):
+    """(size, mtime in ns) of the catalog a snapshot was made from, or None if it is missing"""
+    try:
+        stat = os.stat(catalog)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def save_snapshot(store, albums, catalog, path=SNAPSHOT_PATH):
+    """Worker: write the listed albums to a snapshot that open_snapshot() can map.
+
+    The file is a header, a table of sections and the sections themselves: the catalog
+    path, the three string tables as raw UTF-8 plus uint64 end offsets, and the
+    fixed-width uint32 columns of track and album records. It is stamped with the
+    catalog's size and mtime, so an edited catalog makes it stale.
+    """
+    key = source_key(catalog)
+    if key is None:
+        return
+    if not store.is_compact(albums):
+        store = store.compacted(albums)  # Drop rows of albums replaced since loading
+    count = len(albums)
+    tracks = store.album_first[count - 1] + store.album_count[count - 1] if count else 0
+    strings = len(store.strings)  # Only ever appended to, so every album's strings are among them
+
+    sections = [os.path.abspath(catalog).encode("utf-8")]
+    for name, rows in zip(_TABLES, (strings, tracks, tracks)):
+        sections.extend(getattr(store, name).buffers(rows))
+    sections.append(store.track_album[:tracks])
+    for name in LibraryStore.COLUMNS[1:]:
+        sections.append(getattr(store, name)[:count])
+
+    header = _HEADER.pack(_MAGIC, VERSION, sys.byteorder == "little", len(sections), *key)
+    table = []
+    offset = _HEADER.size + len(sections) * _SECTION.size
+    for section in sections:
+        offset += -offset % _ALIGN
+        length = memoryview(section).nbytes
+        table.append(_SECTION.pack(offset, length))
+        offset += length
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(header + b"".join(table))
+        for section in sections:
+            f.write(b"\0" * (-f.tell() % _ALIGN))
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(temp, path)  # Readers see the old snapshot or the new one, never half of one
+    except PermissionError:
+        # Windows cannot replace a file the loaded library still maps; a save after its next change can
+        os.remove(temp)
+
+def open_snapshot(catalog, path=SNAPSHOT_PATH):
+    """Map a snapshot and return a LibraryStore over it, or None if it is missing or stale for catalog.
+
+    Nothing is parsed or copied: the columns are memoryviews into the mapping, and the
+    pages a view reads are loaded by the OS when first touched.
+    """
+    key = source_key(catalog)
+    try:
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None  # Missing, or empty
+    view = memoryview(mapping)
+    if len(view) < _HEADER.size:
+        return None
+    magic, version, little, count, size, mtime = _HEADER.unpack_from(view)
+    if (magic != _MAGIC or version != VERSION or little != (sys.byteorder == "little")
+            or count != len(_SECTIONS) or (size, mtime) != key):
+        return None
+    if len(view) < _HEADER.size + count * _SECTION.size:
+        return None  # Truncated inside the section table
+    sections = {}
+    for i, name in enumerate(_SECTIONS):
+        offset, length = _SECTION.unpack_from(view, _HEADER.size + i * _SECTION.size)
+        if offset + length > len(view):
+            return None  # Truncated
+        sections[name] = view[offset:offset + length]
+    if str(sections["source"], "utf-8") != os.path.abspath(catalog):
+        return None
+
+    tables = {name: StringTable(sections[name], sections[name + "_ends"].cast("Q")) for name in _TABLES}
+    columns = {name: sections[name].cast("I") for name in LibraryStore.COLUMNS}
+    return LibraryStore.from_columns(**tables, **columns)
@@ -0,0 +1,205 @@
+# suggestions.py
+from itertools import chain
+from collections import Counter, OrderedDict
+
+# Configuration
+PLAYLIST_SIZE = 20       # tracks per suggested playlist
+MIN_ARTIST_TRACKS = 3    # artists need this many tracks for a collection of their own
+ARTIST_MIXES = 12        # artist collections offered at most
+TOP_SIZE = 50            # most played tracks, albums and artists kept ranked
+RECENT_SIZE = 50         # recently played tracks remembered
+
+def _bump(top, key, counts, size=TOP_SIZE):
+    """Keep top sorted by counts after counts[key] grew; play counts only ever increase"""
+    if key in top:
+        top.remove(key)
+    elif len(top) >= size and counts[key] <= counts[top[-1]]:
+        return
+    # Walk up from the end: keys with more plays stay ahead, ties keep the older key first
+    i = len(top)
+    while i > 0 and counts[top[i - 1]] < counts[key]:
+        i -= 1
+    top.insert(i, key)
+    del top[size:]
+
+class SuggestionEngine:
+    """Builds "Playlists for You" from library aggregates and play history.
+
+    Per-artist track lists and play counts are updated as albums are added or removed
+    and as tracks are played, so nothing is recomputed from the whole library. Each
+    kind of suggestion is cached against the versions of the data it reads and only
+    rebuilt after that data changes; an unchanged library costs O(suggestions).
+    make_playlist(name, tracks) creates the playlist objects handed out.
+    """
+
+    def __init__(self, make_playlist):
+        self.make_playlist = make_playlist
+        self._albums = {}                # album -> None, in library order
+        self._artist_tracks = {}         # artist -> tracks in library order
+        self._track_plays = Counter()
+        self._album_plays = Counter()
+        self._artist_plays = Counter()
+        self._top_tracks = []            # most played first
+        self._top_albums = []
+        self._top_artists = []
+        self._recent = OrderedDict()     # track -> None, most recent last
+        self._artists_by_size = None     # artists with enough tracks, largest first; rebuilt lazily
+        self.library_version = 0
+        self.history_version = 0
+        self._cache = {}                 # section -> (versions, playlists)
+
+    # Library changes
+
+    def add_albums(self, albums):
+        for album in albums:
+            self.add_album(album)
+
+    def add_album(self, album):
+        if album in self._albums:
+            return
+        self._albums[album] = None
+        self._artist_tracks.setdefault(album.artist, []).extend(album.tracks)
+        self._library_changed()
+
+    def remove_album(self, album):
+        if album not in self._albums:
+            return
+        del self._albums[album]
+        removed = set(album.tracks)
+        remaining = [t for t in self._artist_tracks[album.artist] if t not in removed]
+        if remaining:
+            self._artist_tracks[album.artist] = remaining
+        else:
+            del self._artist_tracks[album.artist]
+
+        # Played tracks leave the history too; rankings are rebuilt from the remaining counts
+        forgotten = [t for t in album.tracks if t in self._track_plays or t in self._recent]
+        for track in forgotten:
+            plays = self._track_plays.pop(track, 0)
+            self._artist_plays[album.artist] -= plays
+            self._recent.pop(track, None)
+        self._album_plays.pop(album, None)
+        self._artist_plays += Counter()  # drops artists whose count fell to zero
+        if forgotten:
+            self._top_tracks = [t for t, _ in self._track_plays.most_common(TOP_SIZE)]
+            self._top_albums = [a for a, _ in self._album_plays.most_common(TOP_SIZE)]
+            self._top_artists = [a for a, _ in self._artist_plays.most_common(TOP_SIZE)]
+            self.history_version += 1
+        self._library_changed()
+
+    def _library_changed(self):
+        self._artists_by_size = None
+        self.library_version += 1
+
+    # History changes
+
+    def record_play(self, track):
+        """Count a play of track; only the rankings it touches are updated"""
+        album = track.album
+        self._track_plays[track] += 1
+        self._album_plays[album] += 1
+        self._artist_plays[album.artist] += 1
+        _bump(self._top_tracks, track, self._track_plays)
+        _bump(self._top_albums, album, self._album_plays)
+        _bump(self._top_artists, album.artist, self._artist_plays)
+
+        self._recent.pop(track, None)
+        self._recent[track] = None
+        if len(self._recent) > RECENT_SIZE:
+            self._recent.popitem(last=False)
+        self.history_version += 1
+
+    def restore_history(self, plays, recent):
+        """Replace the history with saved play counts ({track: count}) and recent tracks, oldest first"""
+        self._track_plays = Counter({t: n for t, n in plays.items() if t.album in self._albums})
+        self._album_plays = Counter()
+        self._artist_plays = Counter()
+        for track, count in self._track_plays.items():
+            album = track.album
+            self._album_plays[album] += count
+            self._artist_plays[album.artist] += count
+        self._top_tracks = [t for t, _ in self._track_plays.most_common(TOP_SIZE)]
+        self._top_albums = [a for a, _ in self._album_plays.most_common(TOP_SIZE)]
+        self._top_artists = [a for a, _ in self._artist_plays.most_common(TOP_SIZE)]
+        self._recent = OrderedDict.fromkeys(t for t in recent[-RECENT_SIZE:] if t.album in self._albums)
+        self.history_version += 1
+
+    def add_play_counts(self, counts):
+        """Add saved play counts ({track: count}), e.g. for an album re-added after its files changed"""
+        for track, count in counts.items():
+            album = track.album
+            self._track_plays[track] += count
+            self._album_plays[album] += count
+            self._artist_plays[album.artist] += count
+            _bump(self._top_tracks, track, self._track_plays)
+            _bump(self._top_albums, album, self._album_plays)
+            _bump(self._top_artists, album.artist, self._artist_plays)
+        if counts:
+            self.history_version += 1
+
+    def play_count(self, track):
+        return self._track_plays[track]
+
+    # Suggestions
+
+    def suggestions(self):
+        """Return the suggested playlists, rebuilding only the kinds whose inputs changed"""
+        library, history = self.library_version, self.history_version
+        playlists = []
+        for section, versions, build in (
+            ("most_played", (history,), self._most_played),
+            ("recent", (history,), self._recently_played),
+            ("best_of", (library, history), self._best_of),
+            ("artists", (library, history), self._artist_collections),
+        ):
+            cached = self._cache.get(section)
+            if cached is None or cached[0] != versions:
+                cached = (versions, build())
+                self._cache[section] = cached
+            playlists.extend(cached[1])
+        return playlists
+
+    def _most_played(self):
+        if not self._top_tracks:
+            return []
+        return [self.make_playlist("Your Most Played", self._top_tracks[:PLAYLIST_SIZE])]
+
+    def _recently_played(self):
+        if not self._recent:
+            return []
+        recent = list(reversed(self._recent))[:PLAYLIST_SIZE]
+        return [self.make_playlist("Recently Played", recent)]
+
+    def _best_of(self):
+        """Opening track of the most played albums, topped up in library order"""
+        tracks = []
+        seen = set()
+        for album in chain(self._top_albums, self._albums):
+            if len(tracks) >= PLAYLIST_SIZE:
+                break
+            if album not in seen and album.tracks:
+                seen.add(album)
+                tracks.append(album.tracks[0])
+        if len(tracks) < 2:
+            return []
+        return [self.make_playlist("Best of Your Collection", tracks)]
+
+    def _artist_collections(self):
+        """Collections for the most played artists, then for the artists with the most tracks"""
+        if self._artists_by_size is None:
+            eligible = [a for a, tracks in self._artist_tracks.items() if len(tracks) >= MIN_ARTIST_TRACKS]
+            self._artists_by_size = sorted(eligible, key=lambda a: -len(self._artist_tracks[a]))
+
+        playlists = []
+        chosen = set()
+        for artist in chain(self._top_artists, self._artists_by_size):
+            if len(playlists) >= ARTIST_MIXES:
+                break
+            tracks = self._artist_tracks.get(artist, ())
+            if artist in chosen or len(tracks) < MIN_ARTIST_TRACKS:
+                continue
+            chosen.add(artist)
+            # Favourites first; sorted() is stable, so ties keep album order
+            ranked = sorted(tracks, key=lambda t: -self._track_plays[t])[:PLAYLIST_SIZE]
+            playlists.append(self.make_playlist(f"{artist} Collection", ranked))
+        return playlists
@@ -0,0 +1,113 @@
+# synthetic_library.py
+import os
+import zlib
+import random
+import struct
+import argparse
+from convert_txt_to_json import write_catalog
+
+# Configuration
+TRACKS_PER_ALBUM = 12
+ALBUMS_PER_ARTIST = 4
+FRAMES_PER_FILE = 8      # silent MPEG frames per fake MP3 (about 0.2 s)
+ARTWORK_SIZE = 64
+FILE_LIMIT = 10000       # above this many tracks only the catalog is written, not the audio files
+SEED = 1234
+
+_SYLLABLES = ("ka", "lo", "mi", "ra", "to", "shi", "ne", "vu", "den", "sol", "mar", "quin",
+              "bel", "ash", "tor", "ly", "ven", "zo", "pri", "gal", "hu", "os", "ri", "fen")
+# MPEG-1 layer III, 128 kbps, 44.1 kHz, no padding: 417-byte frames
+_FRAME_HEADER = b"\xff\xfb\x90\x00"
+_FRAME_LENGTH = 417
+
+def _word(rng):
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+def _phrase(rng, words):
+    return " ".join(_word(rng) for _ in range(rng.randint(1, words)))
+
+def iter_albums(tracks, seed=SEED, tracks_per_album=TRACKS_PER_ALBUM):
+    """Yield album dicts in the input.json format adding up to tracks tracks; the same seed gives the same library"""
+    rng = random.Random(seed)
+    number = 0
+    artist = None
+    while tracks > 0:
+        if number % ALBUMS_PER_ARTIST == 0:
+            artist = _phrase(rng, 2)
+        count = min(tracks, tracks_per_album)
+        title = _phrase(rng, 3)
+        folder = f"musics/{number // 1000:04}/{number:07}"
+        yield {
+            "title": title,
+            "artist": artist,
+            "artwork": f"images/album_{number:07}.png",
+            "tracks": [{"name": _phrase(rng, 4), "location": f"{folder}/{i + 1:02}.mp3"} for i in range(count)],
+        }
+        tracks -= count
+        number += 1
+
+def id3_tag(fields):
+    """Minimal ID3v2.4 tag holding UTF-8 text frames, e.g. {"TIT2": "Title"}"""
+    def syncsafe(n):
+        return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
+    body = b""
+    for frame_id, text in fields.items():
+        data = b"\x03" + text.encode("utf-8")
+        body += frame_id.encode("ascii") + syncsafe(len(data)) + b"\x00\x00" + data
+    return b"ID3\x04\x00\x00" + syncsafe(len(body)) + body
+
+def fake_mp3(title, artist, album, number, frames=FRAMES_PER_FILE):
+    """Tagged MP3 of silent frames that tag readers and the seek index accept"""
+    frame = _FRAME_HEADER + b"\x00" * (_FRAME_LENGTH - 4)
+    tags = {"TIT2": title, "TPE1": artist, "TALB": album, "TRCK": str(number)}
+    return id3_tag(tags) + frame * frames
+
+def png_bytes(width, height, rgb):
+    """Solid-colour RGB PNG, written without an imaging library"""
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    raw = (b"\x00" + bytes(rgb) * width) * height
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+def write_input_txt(albums, path):
+    """Write albums in the hand-edited input.txt layout convert_txt_to_json reads"""
+    with open(path, "w", encoding="utf-8") as f:
+        for album in albums:
+            f.write(f"{album['title']}\n{album['artist']}\n{album['artwork']}\n{len(album['tracks'])}\n")
+            for track in album["tracks"]:
+                f.write(f"{track['name']}\n{track['location']}\n")
+            f.write("\n")
+
+def generate_library(root, tracks, seed=SEED, file_limit=FILE_LIMIT):
+    """Create root/ with input.txt, input.json, input.jsonl and, for smaller libraries, musics/ and images/"""
+    os.makedirs(root, exist_ok=True)
+    write_input_txt(iter_albums(tracks, seed), os.path.join(root, "input.txt"))
+    write_catalog(iter_albums(tracks, seed), os.path.join(root, "input.json"), "pretty")
+    write_catalog(iter_albums(tracks, seed), os.path.join(root, "input.jsonl"), "jsonl")
+    if tracks > file_limit:
+        return False
+
+    rng = random.Random(seed)
+    for album in iter_albums(tracks, seed):
+        folder = os.path.join(root, os.path.dirname(album["tracks"][0]["location"]))
+        os.makedirs(folder, exist_ok=True)
+        for number, track in enumerate(album["tracks"], 1):
+            with open(os.path.join(root, track["location"]), "wb") as f:
+                f.write(fake_mp3(track["name"], album["artist"], album["title"], number))
+        artwork = os.path.join(root, album["artwork"])
+        os.makedirs(os.path.dirname(artwork), exist_ok=True)
+        with open(artwork, "wb") as f:
+            f.write(png_bytes(ARTWORK_SIZE, ARTWORK_SIZE, (rng.randrange(256), rng.randrange(256), rng.randrange(256))))
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic music library for benchmarks")
+    parser.add_argument("root")
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--file-limit", type=int, default=FILE_LIMIT, help="largest library that also gets audio and artwork files")
+    args = parser.parse_args()
+
+    with_files = generate_library(args.root, args.tracks, args.seed, args.file_limit)
+    print(f"✅ Generated {args.tracks} tracks in {args.root}" + ("" if with_files else " (catalog only)"))
@@ -0,0 +1,34 @@
+# test_audio_decode.py
+import sys
+import pytest
+
+np = pytest.importorskip("numpy")
+import audio_decode
+from audio_decode import _iter_process, CHANNELS
+
+def _writer(frames):
+    # A child that writes frames of counting int16 stereo samples, like a decoder would
+    script = f"import sys; sys.stdout.buffer.write(bytes(range(256)) * ({frames} * {CHANNELS * 2} // 256))"
+    return [sys.executable, "-c", script]
+
+def test_blocks_are_streamed_from_the_child():
+    blocks = list(_iter_process(_writer(1024), "a.mp3", block_frames=300))
+    assert [len(b) for b in blocks] == [300, 300, 300, 124]
+    assert all(b.shape[1] == CHANNELS and b.dtype == np.int16 for b in blocks)
+
+def test_failed_decode_raises_oserror():
+    command = [sys.executable, "-c", "import sys; sys.exit('not audio')"]
+    with pytest.raises(OSError, match="not audio"):
+        list(_iter_process(command, "a.mp3", block_frames=300))
+
+def test_stopping_early_kills_the_child():
+    blocks = _iter_process(_writer(1 << 22), "a.mp3", block_frames=300)
+    next(blocks)
+    blocks.close()  # Must not hang on the child blocked on a full pipe
+
+def test_without_ffmpeg_the_decoder_runs_as_a_child(monkeypatch):
+    monkeypatch.setattr(audio_decode, "FFMPEG", None)
+    commands = []
+    monkeypatch.setattr(audio_decode, "_iter_process", lambda command, path, frames: iter(commands.append(command) or ()))
+    list(audio_decode.iter_pcm("a.mp3", rate=11025, start=2))
+    assert commands == [[sys.executable, audio_decode.__file__, "a.mp3", "--rate", "11025", "--start", "2"]]
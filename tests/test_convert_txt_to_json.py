@@ -0,0 +1,20 @@
+# test_convert_txt_to_json.py
+from convert_txt_to_json import iter_albums
+
+def _parse(text):
+    errors = []
+    lines = [(number, line) for number, line in enumerate(text.split("\n"), 1) if line]
+    albums = list(iter_albums(lines, lambda line_number, message: errors.append(line_number)))
+    return albums, errors
+
+def test_tracks_in_any_audio_format_are_accepted():
+    albums, errors = _parse("Wonder\nShawn Mendes\nimages/wonder.jpg\n3\n"
+                            "Higher\nmusics/higher.m4a\nMercy\nmusics/mercy.opus\nLost\nmusics/lost.aac\n")
+    assert errors == []
+    assert [t["location"] for t in albums[0]["tracks"]] == ["musics/higher.m4a", "musics/mercy.opus", "musics/lost.aac"]
+
+def test_record_claiming_more_tracks_than_it_has_is_reported():
+    albums, errors = _parse("Wonder\nShawn Mendes\nimages/wonder.jpg\n2\nHigher\nmusics/higher.mp3\n"
+                            "Witness\nKaty Perry\nimages/witness.jpg\n1\nChained\nmusics/chained.mp3\n")
+    assert errors == [8]  # "Katy Perry" where the second track's file should be
+    assert [album["title"] for album in albums] == ["Witness"]
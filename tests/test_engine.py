@@ -0,0 +1,124 @@
+# test_engine.py
+import os
+import asyncio
+import threading
+import pytest
+import engine as engine_module
+from engine import PlayerEngine, AsyncioScheduler
+from metadata_cache import MetadataCache
+from persistence import HistoryStore
+from models import Playlist
+from playback import STOPPED
+
+class FakePlayback:
+    """Playback stand-in that records what the engine asks it to play"""
+
+    def __init__(self, *args, **kwargs):
+        self.state = STOPPED
+        self.played = []
+        self.prefetched = None
+
+    def on(self, event, callback):
+        pass
+
+    def play(self, track, *args, **kwargs):
+        self.played.append(track)
+
+    def prefetch(self, track):
+        self.prefetched = track
+
+    def close(self):
+        pass
+
+def make_engine(tmp_path, history):
+    loop = asyncio.new_event_loop()
+    player = PlayerEngine(AsyncioScheduler(loop), MetadataCache(str(tmp_path / "metadata.db")), history)
+    player.loop = loop
+    return player
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(engine_module, "Playback", FakePlayback)
+    monkeypatch.setattr(engine_module, "LIBRARY_SNAPSHOT", None)
+    player = make_engine(tmp_path, HistoryStore(str(tmp_path / "history")))
+    yield player
+    player.shutdown()
+    player.loop.close()
+
+def settle(engine, seconds=0.3):
+    """Run the engine's loop until its workers and pump have had time to finish"""
+    engine.loop.run_until_complete(asyncio.sleep(seconds))
+
+def add_album(engine, title, artist, names):
+    tracks = [{"name": name, "location": f"musics/{title}/{name}.mp3"} for name in names]
+    return engine.store.add_album(title, artist, f"images/{title}.jpg", tracks)
+
+def test_search_index_is_built_on_a_worker_and_follows_replacements(engine):
+    old = add_album(engine, "Blue Train", "Coltrane", ["Locomotion"])
+    engine._add_albums([old, add_album(engine, "Giant Steps", "Coltrane", ["Naima"])])
+    settle(engine)
+    assert [obj.name for _, obj in engine.search("locomotion")] == ["Locomotion"]
+
+    new = add_album(engine, "Blue Train", "Coltrane", ["Lazy Bird"])
+    engine.replace_albums({old: new})
+    settle(engine)
+    assert engine.search("locomotion") == []
+    assert [obj for _, obj in engine.search("lazy")][0].album is new
+
+def test_rescanned_album_being_played_reloads_the_queue(engine):
+    old = add_album(engine, "Blue Train", "Coltrane", ["Blue Train", "Moment's Notice", "Locomotion"])
+    engine._add_albums([old])
+    engine.play_album(old, start=1)
+    new = add_album(engine, "Blue Train", "Coltrane", ["Blue Train", "Lazy Bird", "Moment's Notice", "Locomotion"])
+    engine.replace_albums({old: new})
+    assert engine.current_album is new
+    assert engine.current_track is new.tracks[2]
+    assert engine.playback.prefetched is new.tracks[3]
+    engine.play_queued(1)  # The ▶ of the new album's second row
+    assert engine.playback.played[-1] is new.tracks[1]
+
+def test_rescan_of_a_playlist_being_played_keeps_the_queue_on_source_positions(engine):
+    old = add_album(engine, "Blue Train", "Coltrane", ["Blue Train", "Locomotion"])
+    other = add_album(engine, "Giant Steps", "Coltrane", ["Naima"])
+    engine._add_albums([old, other])
+    playlist = Playlist("Mix", [other.tracks[0], old.tracks[0], other.tracks[0], old.tracks[1]])
+    engine.add_playlist(playlist)
+    engine.play_playlist(playlist, start=2)
+    new = add_album(engine, "Blue Train", "Coltrane", ["Locomotion"])
+    engine.replace_albums({old: new})
+    assert [t.name for t in playlist.tracks] == ["Naima", "Naima", "Locomotion"]
+    assert engine.queue.current is playlist.tracks[1]  # The second copy, still the one playing
+    engine.remove_from_playlist(playlist, 2)
+    assert engine.queue.tracks == playlist.tracks
+
+def test_history_is_read_on_a_worker_and_matched_once_the_library_is_in(engine, tmp_path, monkeypatch):
+    saved = HistoryStore(os.path.join(".cache", "history"))  # Where the engine's own store looks
+    saved.create_playlist("Mix", ["musics/Blue Train/Locomotion.mp3"])
+    saved.close()
+    reading = threading.Event()
+    load = HistoryStore._load
+    monkeypatch.setattr(HistoryStore, "_load", lambda store: (reading.wait(5), load(store)))
+
+    player = make_engine(tmp_path, None)
+    try:
+        assert not player.history.loaded  # The constructor returned without reading it
+        player._add_albums([add_album(player, "Blue Train", "Coltrane", ["Locomotion"])])
+        player._library_loaded(analyze=False)
+        settle(player)
+        assert player.playlists == []
+        reading.set()
+        settle(player)
+        assert [t.name for t in player.playlists[0].tracks] == ["Locomotion"]
+    finally:
+        player.shutdown()
+        player.loop.close()
+
+def test_removing_a_later_copy_from_a_playlist_is_saved_as_that_copy(engine):
+    album = add_album(engine, "Blue Train", "Coltrane", ["Blue Train", "Locomotion"])
+    engine._add_albums([album])
+    first, second = album.tracks
+    playlist = Playlist("Mix", [first, second, first])
+    engine.add_playlist(playlist)
+    engine.remove_from_playlist(playlist, 2)
+    assert engine.history.playlists[playlist.id][1] == [first.location, second.location]
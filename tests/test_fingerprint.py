@@ -0,0 +1,78 @@
+# test_fingerprint.py
+import struct
+from concurrent.futures import Future
+import pytest
+
+np = pytest.importorskip("numpy")
+import fingerprint
+from fingerprint import FingerprintIndex, DuplicateFinder, DIMENSIONS, BLOB_KIND
+
+def _blob(vector, duration=180.0):
+    return struct.pack("<f", duration) + np.asarray(vector, dtype=np.int8).tobytes()
+
+def _vectors(count, seed=0):
+    return np.random.default_rng(seed).integers(-127, 128, (count, DIMENSIONS))
+
+class FakeMetadata:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob(self, path, kind):
+        return self.blobs.get((path, kind))
+
+    def put_blobs(self, kind, items):
+        for path, data in items:
+            self.blobs[(path, kind)] = data
+
+class InlinePool:
+    """Executor stand-in that runs submitted work at once and counts the calls"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+def test_near_copies_are_clustered():
+    vectors = _vectors(50)
+    index = FingerprintIndex()
+    index.add_many([(f"{i}.mp3", _blob(v)) for i, v in enumerate(vectors)])
+    copy = np.clip(vectors[7] + np.random.default_rng(1).integers(-4, 5, DIMENSIONS), -127, 127)
+    index.add("copy.mp3", _blob(copy, 181.0))
+    assert [sorted(cluster) for cluster in index.clusters()] == [["7.mp3", "copy.mp3"]]
+
+def test_different_lengths_do_not_match():
+    vector = _vectors(1)[0]
+    index = FingerprintIndex()
+    index.add_many([("short.mp3", _blob(vector, 100.0)), ("long.mp3", _blob(vector, 200.0))])
+    assert index.clusters() == []
+
+def test_removed_tracks_leave_their_clusters():
+    vector = _vectors(1)[0]
+    index = FingerprintIndex()
+    index.add_many([("a.mp3", _blob(vector)), ("b.mp3", _blob(vector)), ("c.mp3", _blob(vector))])
+    assert sorted(index.clusters()[0]) == ["a.mp3", "b.mp3", "c.mp3"]
+    index.remove("a.mp3")
+    assert "a.mp3" not in index
+    assert sorted(index.clusters()[0]) == ["b.mp3", "c.mp3"]
+    index.remove("b.mp3")
+    assert index.clusters() == []
+
+def test_fingerprint_computes_missing_files_in_the_process_pool(tmp_path, monkeypatch):
+    computed = []
+    monkeypatch.setattr(fingerprint, "fingerprint_file", lambda path: computed.append(path) or b"new")
+    stored, new, gone = (str(tmp_path / name) for name in ("stored.mp3", "new.mp3", "gone.mp3"))
+    for path in (stored, new):
+        open(path, "wb").close()
+    metadata = FakeMetadata()
+    metadata.blobs[(stored, BLOB_KIND)] = b"old"
+    pool = InlinePool()
+
+    found = DuplicateFinder(metadata).fingerprint([stored, new, gone], pool)
+    assert sorted(found) == sorted([(stored, b"old"), (new, b"new")])
+    assert pool.submitted == [([new],)]
+    assert computed == [new]
+    assert metadata.blobs[(new, BLOB_KIND)] == b"new"
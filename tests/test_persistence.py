@@ -0,0 +1,130 @@
+# test_persistence.py
+import os
+import json
+from persistence import HistoryStore
+
+def _reopen(store):
+    store.close()
+    return HistoryStore(store.directory, store.compact_after)
+
+def _log_lines(store):
+    with open(store.log_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_changes_survive_reopening(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.record_play("a.mp3")
+    store.record_play("b.mp3")
+    store.record_play("a.mp3")
+    mix = store.create_playlist("Mix", ["a.mp3", "b.mp3", "c.mp3"])
+    gone = store.create_playlist("Gone", ["a.mp3"])
+    store.remove_from_playlist(mix, "b.mp3")
+    store.delete_playlist(gone)
+
+    store = _reopen(store)
+    assert store.plays == {"a.mp3": 2, "b.mp3": 1}
+    assert list(store.recent) == ["b.mp3", "a.mp3"]
+    assert store.playlists == {mix: ["Mix", ["a.mp3", "c.mp3"]]}
+    assert store.create_playlist("Next", []) == gone + 1
+    store.close()
+
+def test_events_are_appended_with_sequence_numbers(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.record_play("a.mp3")
+    store.record_play("b.mp3")
+    store.close()
+    assert [(e["seq"], e["track"]) for e in _log_lines(store)] == [(1, "a.mp3"), (2, "b.mp3")]
+    assert not os.path.exists(store.snapshot_path)
+
+def test_compaction_writes_a_snapshot_and_starts_a_new_log(tmp_path):
+    store = HistoryStore(str(tmp_path), compact_after=3)
+    for name in ("a", "b", "c", "d"):
+        store.record_play(f"{name}.mp3")
+    store.close()
+    assert os.path.exists(store.snapshot_path)
+    assert [e["seq"] for e in _log_lines(store)] == [4]
+
+    store = _reopen(store)
+    assert store.seq == 4
+    assert sum(store.plays.values()) == 4
+    store.close()
+
+def test_log_left_from_an_interrupted_compaction_is_not_applied_twice(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.record_play("a.mp3")
+    store.record_play("a.mp3")
+    store.close()
+    with open(store.log_path, "rb") as f:
+        old_log = f.read()
+
+    store = HistoryStore(str(tmp_path))
+    store.compact()
+    store.close()
+    # As if the process died after replacing the snapshot but before the log was emptied
+    with open(store.log_path, "wb") as f:
+        f.write(old_log)
+
+    store = HistoryStore(str(tmp_path))
+    assert store.plays == {"a.mp3": 2}
+    store.record_play("a.mp3")
+    store = _reopen(store)
+    assert store.plays == {"a.mp3": 3}
+    store.close()
+
+def test_incomplete_last_line_is_dropped(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.record_play("a.mp3")
+    store.close()
+    with open(store.log_path, "ab") as f:
+        f.write(b'{"op": "play", "track": "b.m')
+
+    store = HistoryStore(str(tmp_path))
+    assert store.plays == {"a.mp3": 1}
+    store.record_play("c.mp3")
+    store = _reopen(store)
+    assert store.plays == {"a.mp3": 1, "c.mp3": 1}
+    assert [e["track"] for e in _log_lines(store)] == ["a.mp3", "c.mp3"]
+    store.close()
+
+def test_corrupt_line_drops_the_rest_of_the_log(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.record_play("a.mp3")
+    store.close()
+    with open(store.log_path, "ab") as f:
+        f.write(b"not json\n")
+        f.write(json.dumps({"op": "play", "track": "b.mp3", "seq": 2}).encode() + b"\n")
+
+    store = HistoryStore(str(tmp_path))
+    assert store.plays == {"a.mp3": 1}
+    assert store.seq == 1
+    store.close()
+
+def test_removed_copy_of_a_track_survives_reopening(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    mix = store.create_playlist("Mix", ["a.mp3", "b.mp3", "a.mp3", "c.mp3"])
+    store.remove_from_playlist(mix, "a.mp3", nth=1)
+    store = _reopen(store)
+    assert store.playlists[mix][1] == ["a.mp3", "b.mp3", "c.mp3"]
+    store.close()
+
+def test_removal_logged_without_a_copy_number_takes_the_first(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    mix = store.create_playlist("Mix", ["a.mp3", "b.mp3", "a.mp3"])
+    store.close()
+    with open(store.log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "remove", "id": mix, "track": "a.mp3", "seq": store.seq + 1}) + "\n")
+    store = HistoryStore(str(tmp_path))
+    assert store.playlists[mix][1] == ["b.mp3", "a.mp3"]
+    store.close()
+
+def test_store_opened_without_loading_reads_before_its_first_change(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.record_play("a.mp3")
+    store.close()
+    store = HistoryStore(str(tmp_path), load=False)
+    assert not store.loaded and store.plays == {}
+    store.record_play("a.mp3")  # Numbered after the saved play, not over it
+    assert store.loaded and store.plays == {"a.mp3": 2}
+    store = _reopen(store)
+    assert store.plays == {"a.mp3": 2}
+    store.close()
@@ -0,0 +1,150 @@
+# test_play_queue.py
+import random
+import pytest
+from play_queue import PlayQueue, REPEAT_OFF, REPEAT_ALL, REPEAT_ONE
+
+TRACKS = ["a", "b", "c", "d", "e"]
+
+@pytest.fixture(autouse=True)
+def seeded():
+    random.seed(1)
+
+def test_cursor_moves_and_stops_at_the_end():
+    queue = PlayQueue(TRACKS, start=3)
+    assert queue.current == "d"
+    assert queue.peek_next() == "e"
+    assert queue.next(auto=True) == "e"
+    assert queue.peek_next() is None
+    assert queue.next(auto=True) is None
+    assert queue.current == "e"
+    assert queue.next() == "a"  # Skipping by hand wraps around
+    assert queue.previous() == "e"
+
+def test_repeat_modes():
+    queue = PlayQueue(TRACKS, start=4)
+    queue.repeat = REPEAT_ALL
+    assert queue.peek_next() == "a"
+    assert queue.next(auto=True) == "a"
+    queue.repeat = REPEAT_ONE
+    assert queue.next(auto=True) == "a"
+    assert queue.next() == "b"
+    assert queue.cycle_repeat() == REPEAT_OFF
+
+def test_jump_moves_the_cursor():
+    queue = PlayQueue(TRACKS)
+    assert queue.jump(3) == "d"
+    assert queue.next() == "e"
+
+def test_empty_queue():
+    queue = PlayQueue()
+    assert queue.current is None
+    assert queue.next() is None
+    assert queue.peek_next() is None
+    assert queue.previous() is None
+
+def test_play_next_and_add_to_queue():
+    queue = PlayQueue(TRACKS, start=1)
+    queue.add_to_queue("x")
+    queue.add_to_queue("y")
+    queue.play_next("z")
+    assert queue.tracks == ["a", "b", "z", "x", "y", "c", "d", "e"]
+    assert queue.next() == "z"
+    queue.add_to_queue("w")  # Still behind the earlier queued tracks
+    assert queue.tracks == ["a", "b", "z", "x", "y", "w", "c", "d", "e"]
+
+def test_same_track_can_be_queued_twice():
+    queue = PlayQueue(TRACKS, start=0)
+    queue.play_next("a")
+    assert queue.tracks[:2] == ["a", "a"]
+    assert queue.next() == "a"
+    assert queue.next() == "b"
+
+def test_shuffle_keeps_current_first_and_plays_everything():
+    queue = PlayQueue(TRACKS, start=2)
+    queue.set_shuffle(True)
+    assert queue.current == "c"
+    assert queue.tracks[0] == "c"
+    assert sorted(queue.tracks) == TRACKS
+    played = [queue.current] + [queue.next(auto=True) for _ in range(4)]
+    assert sorted(played) == TRACKS
+    assert queue.next(auto=True) is None
+
+def test_unshuffle_returns_to_source_order_at_the_current_track():
+    queue = PlayQueue(TRACKS, start=0)
+    queue.set_shuffle(True)
+    queue.next()
+    current = queue.current
+    queue.set_shuffle(False)
+    assert queue.tracks == TRACKS
+    assert queue.current == current
+
+def test_play_next_while_shuffled_also_follows_current_in_source_order():
+    queue = PlayQueue(TRACKS, start=1)
+    queue.set_shuffle(True)
+    queue.play_next("z")
+    assert queue.next() == "z"
+    queue.set_shuffle(False)
+    assert queue.tracks == ["a", "b", "z", "c", "d", "e"]
+    assert queue.current == "z"
+
+def test_load_while_shuffled_reshuffles():
+    queue = PlayQueue()
+    queue.set_shuffle(True)
+    queue.load(TRACKS, start=3)
+    assert queue.current == "d"
+    assert sorted(queue.tracks) == TRACKS
+
+def test_remove_before_and_after_the_cursor():
+    queue = PlayQueue(TRACKS, start=2)
+    queue.remove(0)
+    assert queue.tracks == ["b", "c", "d", "e"]
+    assert queue.current == "c"
+    queue.remove(2)  # "d"; ids follow the source positions
+    assert queue.tracks == ["b", "c", "e"]
+    assert queue.next() == "e"
+
+def test_remove_current_continues_with_the_following_track():
+    queue = PlayQueue(TRACKS, start=2)
+    queue.remove(2)
+    assert queue.next(auto=True) == "d"
+
+def test_remove_keeps_queued_tracks_in_place():
+    queue = PlayQueue(TRACKS, start=1)
+    queue.add_to_queue("x")
+    queue.remove(0)
+    assert queue.tracks == ["b", "x", "c", "d", "e"]
+    queue.add_to_queue("y")
+    assert queue.tracks == ["b", "x", "y", "c", "d", "e"]
+
+def test_remove_while_shuffled():
+    queue = PlayQueue(TRACKS, start=0)
+    queue.set_shuffle(True)
+    queue.remove(TRACKS.index("c"))
+    assert sorted(queue.tracks) == ["a", "b", "d", "e"]
+    assert queue.current == "a"
+    queue.set_shuffle(False)
+    assert queue.tracks == ["a", "b", "d", "e"]
+
+def test_replaced_tracks_keep_the_cursor_and_queued_tracks():
+    queue = PlayQueue(TRACKS, start=2)
+    queue.add_to_queue("x")
+    # "a" was dropped, "c" and "x" now have new views and "n" was added after "c"
+    queue.replace_tracks(["b", "C", "n", "d", "e"], {"a": None, "c": "C", "x": "X"})
+    assert queue.current == "C"
+    assert queue.tracks == ["b", "C", "X", "n", "d", "e"]
+    assert queue.jump(2) == "n"  # Ids are positions in the new source list again
+
+def test_dropped_current_track_leaves_the_cursor_before_the_next_one():
+    queue = PlayQueue(TRACKS, start=2)
+    queue.replace_tracks(["a", "b", "d", "e"], {"c": None})
+    assert queue.next(auto=True) == "d"
+    queue.replace_tracks([], {track: None for track in "abde"})
+    assert queue.current is None
+    assert queue.next() is None
+
+def test_replaced_tracks_under_shuffle_keep_the_current_track():
+    queue = PlayQueue(TRACKS, start=1)
+    queue.set_shuffle(True)
+    queue.replace_tracks(["a", "B", "c", "d"], {"b": "B", "e": None})
+    assert queue.current == "B"
+    assert sorted(queue.tracks) == ["B", "a", "c", "d"]
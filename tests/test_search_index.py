@@ -0,0 +1,103 @@
+# test_search_index.py
+from library_store import LibraryStore
+from search_index import SearchIndex, ARTIST, ALBUM, TRACK
+
+def _album(store, title, artist, names):
+    tracks = [{"name": name, "location": f"{artist}/{title}/{name}.mp3"} for name in names]
+    return store.add_album(title, artist, f"{artist}/{title}.jpg", tracks)
+
+def _results(index, query):
+    return [(kind, obj if kind == ARTIST else (obj.title if kind == ALBUM else obj.name))
+            for kind, obj in index.search(query)]
+
+def test_finds_artists_albums_and_tracks():
+    store = LibraryStore()
+    index = SearchIndex()
+    index.add_albums([_album(store, "Wonder", "Shawn Mendes", ["Higher", "Mercy Me"])])
+    assert _results(index, "shawn") == [(ARTIST, "Shawn Mendes")]
+    assert _results(index, "wond") == [(ALBUM, "Wonder")]
+    assert _results(index, "mendes mercy") == [(TRACK, "Mercy Me")]
+    assert _results(index, "hgiher") == [(TRACK, "Higher")]  # Adjacent swap
+    assert _results(index, "nothing") == []
+
+def test_removed_album_is_no_longer_found():
+    store = LibraryStore()
+    index = SearchIndex()
+    first = _album(store, "Blue Train", "Coltrane", ["Locomotion"])
+    second = _album(store, "Giant Steps", "Coltrane", ["Naima"])
+    index.add_albums([first, second])
+    index.remove_album(first)
+    assert _results(index, "blue") == []
+    assert _results(index, "locomotion") == []
+    assert _results(index, "coltrane blue") == []
+    assert _results(index, "coltrane naima") == [(TRACK, "Naima")]
+    assert _results(index, "coltrane") == [(ARTIST, "Coltrane")]
+    assert index.artist_albums("Coltrane") == [second]
+
+    index.remove_album(second)
+    assert _results(index, "coltrane") == []
+    assert index.artist_albums("Coltrane") == []
+    assert len(index) == 0
+
+def test_removed_and_readded_terms_appear_once():
+    store = LibraryStore()
+    index = SearchIndex()
+    album = _album(store, "Kind of Blue", "Miles Davis", ["So What"])
+    index.add_albums([album])
+    index.remove_album(album)
+    index.add_album(_album(store, "Kind of Blue", "Miles Davis", ["So What"]))
+    vocab = index._sorted_vocab()
+    assert vocab == sorted(set(vocab))
+    assert _results(index, "kind") == [(ALBUM, "Kind of Blue")]
+    assert _results(index, "so wh") == [(TRACK, "So What")]
+
+def test_terms_removed_before_the_vocabulary_is_sorted_appear_once():
+    store = LibraryStore()
+    index = SearchIndex()
+    album = _album(store, "Abbey Road", "Beatles", ["Something"])
+    index.add_album(album)
+    index.remove_album(album)
+    index.add_album(_album(store, "Abbey Road", "Beatles", ["Something"]))
+    vocab = index._sorted_vocab()
+    assert vocab.count("abbey") == 1
+
+def test_free_doc_ids_are_reused():
+    store = LibraryStore()
+    index = SearchIndex()
+    album = _album(store, "One", "Solo", ["Track"])
+    index.add_albums([album])
+    docs = len(index._docs)
+    index.remove_album(album)
+    index.add_album(_album(store, "Two", "Solo", ["Track"]))
+    assert len(index._docs) == docs
+    assert _results(index, "two") == [(ALBUM, "Two")]
+
+def test_album_words_are_kept_once_per_album():
+    store = LibraryStore()
+    index = SearchIndex()
+    index.add_album(_album(store, "Wonder", "Shawn Mendes", ["Higher", "Mercy"]))
+    assert [sorted(terms) for terms in index._doc_terms[:3]] == [["wonder"], ["higher"], ["mercy"]]
+    assert sorted(index._context[0]) == ["mendes", "shawn", "wonder"]
+    assert _results(index, "shawn high") == [(TRACK, "Higher")]
+
+def test_best_matches_are_kept_when_more_than_limit_match():
+    store = LibraryStore()
+    index = SearchIndex()
+    index.add_albums([_album(store, f"Songs {i}", "Love", [f"Love {i}.{n}" for n in range(10)]) for i in range(10)])
+    index.add_album(_album(store, "Lovely Day", "Bill Withers", ["Lovely Day"]))
+    results = index.search("love", limit=5)
+    assert results[0] == (ARTIST, "Love")  # Found among a hundred equally exact tracks
+    assert len(results) == 5
+    assert (ALBUM, "Lovely Day") not in [(kind, getattr(obj, "title", obj)) for kind, obj in results]
+
+def test_exact_hits_through_a_later_lead_word_beat_typos_of_the_first():
+    store = LibraryStore()
+    index = SearchIndex()
+    # "wonder" has fewer postings, so it leads; its typo "wonders" must not fill the results
+    # before the exact track, which only posts "mercy", is reached through the second word
+    index.add_albums([_album(store, f"Mercy {i}", "Choir", [f"Wonders {i}"]) for i in range(5)])
+    index.add_album(_album(store, "Wonder", "Shawn Mendes", ["Mercy"]))
+    index.add_album(_album(store, "Extra", "Mercy Band", ["Song"]))
+    assert _results(index, "wonder mercy")[0] == (TRACK, "Mercy")
+    kind, track = index.search("wonder mercy", limit=3)[0]
+    assert (kind, track.name) == (TRACK, "Mercy")
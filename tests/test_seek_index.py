@@ -0,0 +1,86 @@
+# test_seek_index.py
+import pytest
+from seek_index import SeekIndex, build_index, load_index, parse_header, BLOB_KIND
+
+HEADER = b"\xff\xfb\x90\x00"  # MPEG-1 layer III, 128 kbit/s, 44.1 kHz, no padding
+FRAME_LENGTH = 144 * 128000 // 44100
+FRAME_DURATION = 1152 / 44100
+
+def _frame(fill=b"\0"):
+    return HEADER + fill * (FRAME_LENGTH - len(HEADER))
+
+def _id3(size):
+    # ID3v2 header with a syncsafe size, followed by that many bytes of tag data
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + b"\xff" * size
+
+class FakeMetadata:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob(self, path, kind):
+        return self.blobs.get((path, kind))
+
+    def put_blob(self, path, kind, data):
+        self.blobs[(path, kind)] = data
+
+def test_parse_header():
+    assert parse_header(_frame(), 0) == (FRAME_LENGTH, 44100, 1152)
+    assert parse_header(b"\xff\xfb\x92\x00", 0) == (FRAME_LENGTH + 1, 44100, 1152)  # Padded
+    assert parse_header(b"\xff\xfb\xf0\x00", 0) is None  # Bad bitrate
+    assert parse_header(b"\xff\xfd\x90\x00", 0) is None  # Layer II
+    assert parse_header(b"\xff\xfb", 0) is None
+
+def test_offsets_of_every_stride_frame():
+    index = build_index(_frame() * 40, stride=16)
+    assert index.frame_count == 40
+    assert list(index.offsets) == [0, 16 * FRAME_LENGTH, 32 * FRAME_LENGTH]
+    assert index.duration == pytest.approx(40 * FRAME_DURATION)
+
+def test_locate_hops_to_the_exact_frame():
+    data = _frame() * 40
+    index = build_index(data, stride=16)
+    assert index.locate(data, 0) == (0, 0)
+    pos, start = index.locate(data, 21.5 * FRAME_DURATION)
+    assert pos == 21 * FRAME_LENGTH
+    assert start == pytest.approx(21 * FRAME_DURATION)
+    assert index.locate(data, 1000)[0] == 39 * FRAME_LENGTH  # Past the end: the last frame
+    assert index.locate(data, -5) == (0, 0)
+
+def test_tags_and_info_frame_are_skipped():
+    tag = _id3(100)
+    info = HEADER + b"Info" + b"\0" * (FRAME_LENGTH - 8)
+    id3v1 = b"TAG" + b"\xff" * 125
+    data = tag + info + _frame() * 5 + id3v1
+    index = build_index(data)
+    assert index.frame_count == 5
+    assert index.offsets[0] == len(tag) + FRAME_LENGTH
+
+def test_junk_between_frames_is_skipped():
+    junk = b"\x00\xff\xfb\x90\x01\xff"  # Includes a header that is not followed by frames
+    data = _frame() * 3 + junk + _frame() * 3
+    index = build_index(data, stride=1)
+    assert index.frame_count == 6
+    assert index.offsets[3] == 3 * FRAME_LENGTH + len(junk)
+
+def test_no_frames():
+    assert build_index(b"") is None
+    assert build_index(b"\0" * 1000) is None
+    assert build_index(_id3(50)) is None
+
+def test_bytes_round_trip():
+    index = build_index(_frame() * 40, stride=8)
+    copy = SeekIndex.from_bytes(index.to_bytes())
+    assert (copy.sample_rate, copy.frame_samples, copy.frame_count, copy.stride) == (44100, 1152, 40, 8)
+    assert list(copy.offsets) == list(index.offsets)
+
+def test_load_index_builds_once_and_then_uses_the_cache():
+    metadata = FakeMetadata()
+    data = _frame() * 20
+    index = load_index("a.mp3", data, metadata)
+    assert index.frame_count == 20
+    assert ("a.mp3", BLOB_KIND) in metadata.blobs
+    cached = load_index("a.mp3", b"", metadata)  # Not scanned again
+    assert cached.frame_count == 20
+    assert load_index("b.mp3", b"", metadata) is None
+    assert ("b.mp3", BLOB_KIND) not in metadata.blobs
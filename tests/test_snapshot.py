@@ -0,0 +1,119 @@
+# test_snapshot.py
+import os
+import pytest
+from library_store import LibraryStore
+from snapshot import save_snapshot, open_snapshot
+
+def _album(store, title, artist, names):
+    tracks = [{"name": name, "location": f"music/{title}/{name}.mp3"} for name in names]
+    return store.add_album(title, artist, f"art/{title}.jpg", tracks)
+
+def _contents(store):
+    albums = [store.album(i) for i in range(len(store.album_first))]
+    return [(a.title, a.artist, a.artwork_path, [(t.name, t.location) for t in a.tracks]) for a in albums]
+
+@pytest.fixture
+def library(tmp_path):
+    catalog = tmp_path / "input.json"
+    catalog.write_text("[]", encoding="utf-8")
+    store = LibraryStore()
+    albums = [
+        _album(store, "Blue Train", "Coltrane", ["Blue Train", "Moment's Notice"]),
+        _album(store, "Ágætis byrjun", "Sigur Rós", ["Svefn-g-englar"]),
+        _album(store, "Giant Steps", "Coltrane", ["Naima"]),
+    ]
+    return store, albums, str(catalog), str(tmp_path / "library.snapshot")
+
+def test_round_trip(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    opened = open_snapshot(catalog, path)
+    assert opened is not None
+    assert _contents(opened) == _contents(store)
+    assert isinstance(opened.album_first, memoryview)  # Mapped, not copied
+
+def test_opened_store_can_be_appended_to(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    opened = open_snapshot(catalog, path)
+    added = _album(opened, "Lush Life", "Coltrane", ["Trane's Slo Blues"])
+    assert added.artist == "Coltrane"
+    assert [t.name for t in added.tracks] == ["Trane's Slo Blues"]
+    assert opened.album(0).title == "Blue Train"
+
+def test_replaced_albums_are_left_out(library):
+    store, albums, catalog, path = library
+    replacement = _album(store, "Blue Train", "Coltrane", ["Blue Train"])
+    save_snapshot(store, [replacement] + albums[1:], catalog, path)
+    opened = open_snapshot(catalog, path)
+    assert len(opened) == 3
+    assert [t.name for t in opened.album(0).tracks] == ["Blue Train"]
+    assert opened.album(2).title == "Giant Steps"
+
+def test_edited_catalog_makes_the_snapshot_stale(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    with open(catalog, "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert open_snapshot(catalog, path) is None
+
+def test_touched_catalog_makes_the_snapshot_stale(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    stat = os.stat(catalog)
+    os.utime(catalog, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert open_snapshot(catalog, path) is None
+
+def test_snapshot_of_another_catalog_is_not_used(library, tmp_path):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    other = tmp_path / "other.json"
+    other.write_text("[]", encoding="utf-8")
+    stat = os.stat(catalog)
+    os.utime(other, ns=(stat.st_atime_ns, stat.st_mtime_ns))  # Same size and mtime
+    assert open_snapshot(str(other), path) is None
+
+def test_truncated_snapshot_is_rejected(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    size = os.path.getsize(path)
+    for length in (size - 1, 40, 10):
+        with open(path, "r+b") as f:
+            f.truncate(length)
+        assert open_snapshot(catalog, path) is None
+
+def test_missing_empty_and_foreign_files_are_rejected(library):
+    store, albums, catalog, path = library
+    assert open_snapshot(catalog, path) is None
+    open(path, "wb").close()
+    assert open_snapshot(catalog, path) is None
+    with open(path, "wb") as f:
+        f.write(b"\0" * 4096)
+    assert open_snapshot(catalog, path) is None
+
+def test_missing_catalog_writes_nothing(library, tmp_path):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, str(tmp_path / "missing.json"), path)
+    assert not os.path.exists(path)
+
+def test_mapped_store_is_saved_over_its_own_file(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    opened = open_snapshot(catalog, path)
+    mapped = [opened.album(i) for i in range(3)]
+    save_snapshot(opened, mapped[1:], catalog, path)  # e.g. after an album was deleted on disk
+    assert isinstance(opened.album_first, memoryview)  # Never copied into memory
+    assert opened.album(0).title == "Blue Train"  # Still reads the old mapping
+    assert [a[0] for a in _contents(open_snapshot(catalog, path))] == ["Ágætis byrjun", "Giant Steps"]
+
+def test_album_locations_are_read_without_track_views(library):
+    store, albums, catalog, path = library
+    save_snapshot(store, albums, catalog, path)
+    opened = open_snapshot(catalog, path)
+    albums = [opened.album(i) for i in range(3)]
+    assert list(opened.album_locations(albums)) == [
+        ["music/Blue Train/Blue Train.mp3", "music/Blue Train/Moment's Notice.mp3"],
+        ["music/Ágætis byrjun/Svefn-g-englar.mp3"],
+        ["music/Giant Steps/Naima.mp3"],
+    ]
+    assert opened._track_views == [None] * 4
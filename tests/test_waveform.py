@@ -0,0 +1,59 @@
+# test_waveform.py
+import pickle
+from concurrent.futures import Future
+import pytest
+
+np = pytest.importorskip("numpy")
+from waveform import Waveform, WaveformBuilder, load_waveform, BLOB_KIND
+
+class FakeMetadata:
+    def __init__(self):
+        self.blobs = {}
+
+    def get_blob(self, path, kind):
+        return self.blobs.get((path, kind))
+
+    def put_blob(self, path, kind, data):
+        self.blobs[(path, kind)] = data
+
+class RecordingPool:
+    """Executor stand-in that records what would have been sent to a worker process"""
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn.__name__, args))
+        future = Future()
+        future.set_result(self.result)
+        return future
+
+def _waveform():
+    builder = WaveformBuilder(window=100)
+    ramp = np.linspace(-32768, 32767, 10000).astype(np.int16)
+    builder.add(np.stack((ramp, ramp), axis=1)[:6000])
+    builder.add(np.stack((ramp, ramp), axis=1)[6000:])
+    return builder.finish(buckets=10)
+
+def test_builder_reduces_blocks_to_buckets():
+    waveform = _waveform()
+    assert len(waveform) == 10
+    assert waveform.mins[0] == -128 and waveform.maxs[-1] == 127
+    assert list(waveform.maxs) == sorted(waveform.maxs)
+    assert WaveformBuilder().finish() is None
+
+def test_bytes_round_trip_and_pickling():
+    waveform = _waveform()
+    for copy in (Waveform.from_bytes(waveform.to_bytes()), pickle.loads(pickle.dumps(waveform))):
+        assert (copy.mins, copy.maxs, copy.rms) == (waveform.mins, waveform.maxs, waveform.rms)
+
+def test_missing_overview_is_computed_in_the_process_pool_and_stored():
+    metadata = FakeMetadata()
+    pool = RecordingPool(_waveform())
+    waveform = load_waveform("a.mp3", metadata, pool)
+    assert pool.calls == [("compute_waveform", ("a.mp3",))]
+    assert metadata.blobs[("a.mp3", BLOB_KIND)] == waveform.to_bytes()
+
+    assert load_waveform("a.mp3", metadata, pool).to_bytes() == waveform.to_bytes()
+    assert len(pool.calls) == 1  # Stored overviews are not decoded again
@@ -0,0 +1,123 @@
+# virtual_list.py
+import tkinter as tk
+import customtkinter as ctk
+from instrumentation import traced
+
+# Configuration
+OVERSCAN = 2  # Extra rows kept above and below the viewport
+SCROLL_STEP = 20  # Pixels per scroll unit
+
+class VirtualList(ctk.CTkFrame):
+    """Scrolling list of fixed-height rows that only creates widgets for the visible window.
+
+    create_row(parent) builds an empty row widget and bind_row(row, index) fills it
+    for an item; rows are recycled as the list scrolls.
+    """
+
+    def __init__(self, master, row_height, create_row, bind_row, overscan=OVERSCAN, **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_height = row_height
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.overscan = overscan
+        self.count = 0
+        self._rows = []     # pooled row widgets
+        self._windows = []  # canvas window ids, parallel to _rows
+        self._bound = []    # item index each pooled row currently shows
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, bd=0, yscrollincrement=SCROLL_STEP,
+                                bg=self._apply_appearance_mode(self.cget("fg_color")))
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+        self.canvas.bind("<Configure>", self._on_resize)
+        # Wheel events go to the widget under the pointer, e.g. a row's label, so they are caught app-wide
+        self._wheel_bindings = [(sequence, self.bind_all(sequence, self._on_mousewheel, add="+"))
+                                for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>")]
+        self.canvas.bind("<Destroy>", self._unbind_wheel)
+
+    def set_count(self, count):
+        """Change the number of items and redraw the visible rows"""
+        self.count = count
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), count * self.row_height))
+        if self.canvas.canvasy(0) > max(0, count * self.row_height - self.canvas.winfo_height()):
+            self.canvas.yview_moveto(0)
+        self.refresh(rebind=True)
+
+    def scroll_to(self, index):
+        if self.count:
+            self.canvas.yview_moveto(index / self.count)
+
+    @traced("VirtualList.refresh", widgets=True)
+    def refresh(self, rebind=False):
+        """Lay out rows for the current viewport, rebinding only rows whose item changed"""
+        top = max(0, int(self.canvas.canvasy(0)))
+        height = max(self.canvas.winfo_height(), self.row_height)
+        first = max(0, top // self.row_height - self.overscan)
+        last = min(self.count, (top + height) // self.row_height + 1 + self.overscan)
+
+        needed = last - first
+        if needed > len(self._rows):
+            self._grow(needed)
+            rebind = True
+
+        pool = len(self._rows)
+        visible = set()
+        for index in range(first, last):
+            # Each index always lands in the same slot, so rows that stay on screen keep their widgets untouched
+            slot = index % pool
+            visible.add(slot)
+            if rebind or self._bound[slot] != index:
+                self.bind_row(self._rows[slot], index)
+                self._bound[slot] = index
+                self.canvas.coords(self._windows[slot], 0, index * self.row_height)
+                self.canvas.itemconfigure(self._windows[slot], state="normal")
+
+        for slot in range(pool):
+            if slot not in visible and self._bound[slot] is not None:
+                self._bound[slot] = None
+                self.canvas.itemconfigure(self._windows[slot], state="hidden")
+
+    def _grow(self, size):
+        width = self.canvas.winfo_width()
+        while len(self._rows) < size:
+            row = self.create_row(self.canvas)
+            window = self.canvas.create_window(0, 0, anchor="nw", window=row,
+                                               width=width, height=self.row_height, state="hidden")
+            self._rows.append(row)
+            self._windows.append(window)
+            self._bound.append(None)
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def _on_resize(self, event):
+        for window in self._windows:
+            self.canvas.itemconfigure(window, width=event.width)
+        self.canvas.configure(scrollregion=(0, 0, event.width, self.count * self.row_height))
+        self.refresh()
+
+    def _unbind_wheel(self, event):
+        # unbind_all() would drop every list's handler, so only this list's line is taken out of the script
+        for sequence, funcid in self._wheel_bindings:
+            script = self.tk.call("bind", "all", sequence)
+            self.tk.call("bind", "all", sequence, "\n".join(line for line in script.split("\n") if funcid not in line))
+            self.deletecommand(funcid)
+        self._wheel_bindings = []
+
+    def _on_mousewheel(self, event):
+        # Same approach as CTkScrollableFrame: react only to wheel events over this list
+        if not self.winfo_ismapped() or not str(event.widget).startswith(str(self.canvas)):
+            return
+        if event.num == 4:
+            step = -1
+        elif event.num == 5:
+            step = 1
+        elif abs(event.delta) >= 120:
+            step = -int(event.delta / 120)
+        else:
+            step = -event.delta
+        self.canvas.yview_scroll(step, "units")
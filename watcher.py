@@ -0,0 +1,249 @@
+# watcher.py
+import os
+import abc
+import time
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+
+# Configuration
+QUIET_PERIOD = 0.5    # seconds without new events before a batch is handed over
+MAX_DELAY = 3.0       # a steady stream of events is still handed over at least this often
+POLL_INTERVAL = 5.0   # seconds between directory scans when inotify is unavailable
+READ_TIMEOUT = 0.5    # seconds the inotify thread blocks before checking whether it should stop
+
+# inotify(7) event bits
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# Files are reported once fully written or moved in, never while a copy is half done
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+def _walk_dirs(directory):
+    """Yield directory and every directory below it"""
+    stack = [directory]
+    while stack:
+        path = stack.pop()
+        yield path
+        try:
+            stack.extend(entry.path for entry in os.scandir(path) if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            pass
+
+def _walk_files(directory):
+    """Yield (path, size, mtime) for every file below directory"""
+    for path in _walk_dirs(directory):
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path.replace(os.sep, "/"), st.st_size, st.st_mtime_ns
+
+class Watcher(abc.ABC):
+    """Collects paths changed below some directories on a thread and hands them over in batches.
+
+    take() is called from the consumer's thread and returns (paths, rescan) only once
+    no event has arrived for QUIET_PERIOD, or MAX_DELAY after the first one, so a burst
+    of thousands of copies becomes a few batches. rescan is True when events were lost
+    and the directories should be compared against the library in full. on_ready() is
+    called on a watcher thread whenever a batch has settled, so nobody has to poll
+    take(); it is not called again until take() was.
+    """
+
+    def __init__(self, directories, on_ready=None):
+        self.directories = [d for d in directories if os.path.isdir(d)]
+        self.on_ready = on_ready
+        self._lock = threading.Lock()
+        self._settled = threading.Condition(self._lock)
+        self._paths = set()
+        self._rescan = False
+        self._first = None  # monotonic time of the oldest and newest event not yet taken
+        self._last = None
+        self._signalled = False  # on_ready() was called and take() not since
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        if self.on_ready is not None:
+            threading.Thread(target=self._signal, name=f"{type(self).__name__}-batches", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        with self._settled:
+            self._settled.notify_all()
+        if self._thread is not None:
+            self._thread.join(READ_TIMEOUT * 2)
+
+    def take(self):
+        with self._lock:
+            self._signalled = False
+            self._settled.notify_all()  # A batch still settling is signalled again when it has
+            if self._first is None:
+                return None
+            now = time.monotonic()
+            if now - self._last < QUIET_PERIOD and now - self._first < MAX_DELAY:
+                return None
+            batch = (self._paths, self._rescan)
+            self._paths = set()
+            self._rescan = False
+            self._first = self._last = None
+        return batch
+
+    def _changed(self, paths=(), rescan=False):
+        now = time.monotonic()
+        with self._lock:
+            self._paths.update(paths)
+            self._rescan = self._rescan or rescan
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._settled.notify_all()
+
+    def _signal(self):
+        """Sleep until a batch settles and call on_ready(), without waking while nothing changes"""
+        while not self._stop.is_set():
+            with self._settled:
+                if self._first is None or self._signalled:
+                    self._settled.wait()
+                    continue
+                due = min(self._last + QUIET_PERIOD, self._first + MAX_DELAY)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._settled.wait(delay)
+                    continue
+                self._signalled = True
+            self.on_ready()  # Outside the lock: it may wait on the consumer's thread, which may be in take()
+
+    @abc.abstractmethod
+    def _run(self):
+        """Thread: report changes through _changed() until stop() is called"""
+
+class InotifyWatcher(Watcher):
+    """Linux watcher on inotify through ctypes, one watch per directory"""
+
+    def __init__(self, directories, on_ready=None):
+        super().__init__(directories, on_ready)
+        path = ctypes.util.find_library("c")
+        try:
+            self._libc = ctypes.CDLL(path, use_errno=True)
+            self._libc.inotify_init1
+        except (OSError, AttributeError, TypeError):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # watch descriptor -> directory path
+        try:
+            for directory in self.directories:
+                self._add_tree(directory)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_tree(self, directory):
+        """Watch directory and its subdirectories; returns the directories added"""
+        added = []
+        for path in _walk_dirs(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    continue  # Gone again before we got to it
+                raise OSError(error, f"inotify_add_watch failed for {path}")  # e.g. ENOSPC: out of watches
+            self._dirs[wd] = path.replace(os.sep, "/")
+            added.append(path)
+        return added
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                if not select.select([self._fd], [], [], READ_TIMEOUT)[0]:
+                    continue
+                try:
+                    data = os.read(self._fd, 1 << 16)
+                except BlockingIOError:
+                    continue
+                self._handle(data)
+        finally:
+            os.close(self._fd)
+
+    def _handle(self, data):
+        changed = []
+        rescan = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = f"{directory}/{os.fsdecode(name)}"
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have landed before the new directory was watched, so report them all
+                    try:
+                        self._add_tree(path)
+                    except OSError:
+                        rescan = True
+                    changed.extend(p for p, _, _ in _walk_files(path))
+                elif mask & IN_MOVED_FROM:
+                    rescan = True  # A directory moved away takes its files without an event for each
+            elif not mask & IN_CREATE:
+                # Created files are reported when closed after writing
+                changed.append(path)
+        if changed or rescan:
+            self._changed(changed, rescan)
+
+class PollingWatcher(Watcher):
+    """Fallback watcher that compares directory listings every POLL_INTERVAL seconds"""
+
+    def _snapshot(self):
+        return {path: (size, mtime) for directory in self.directories for path, size, mtime in _walk_files(directory)}
+
+    def _run(self):
+        before = self._snapshot()
+        while not self._stop.wait(POLL_INTERVAL):
+            after = self._snapshot()
+            changed = [path for path in before.keys() | after.keys() if before.get(path) != after.get(path)]
+            if changed:
+                self._changed(changed)
+            before = after
+
+def watch(directories, on_ready=None):
+    """Start watching directories with inotify, or by polling where inotify cannot be used"""
+    try:
+        watcher = InotifyWatcher(directories, on_ready)
+    except OSError:
+        watcher = PollingWatcher(directories, on_ready)
+    watcher.start()
+    return watcher
@@ -0,0 +1,117 @@
+# waveform.py
+import struct
+from array import array
+
+# NumPy and the decoder are imported inside the functions that decode, which run in worker processes;
+# the window only reads stored overviews, and waveform_view.py draws them
+
+# Configuration
+BUCKETS = 400          # columns in a stored overview
+WINDOW_FRAMES = 1024   # frames reduced at a time while decoding; buckets are merged from these windows
+BLOB_KIND = "waveform"
+
+_HEADER = struct.Struct("<I")  # bucket count
+
+class Waveform:
+    """Per-bucket minimum and maximum sample (int8) and RMS level (uint8) of a whole track"""
+
+    __slots__ = ("mins", "maxs", "rms")
+
+    def __init__(self, mins, maxs, rms):
+        self.mins = mins
+        self.maxs = maxs
+        self.rms = rms
+
+    def __len__(self):
+        return len(self.mins)
+
+    def to_bytes(self):
+        return _HEADER.pack(len(self.mins)) + self.mins.tobytes() + self.maxs.tobytes() + self.rms.tobytes()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        count = _HEADER.unpack_from(blob)[0]
+        columns = []
+        for i, typecode in enumerate("bbB"):
+            column = array(typecode)
+            start = _HEADER.size + i * count
+            column.frombytes(blob[start:start + count])
+            columns.append(column)
+        return cls(*columns)
+
+class WaveformBuilder:
+    """Reduces decoded int16 blocks to per-window minimum, maximum and mean square as they arrive.
+
+    Only these window summaries are kept, a few hundred bytes per second of audio, so
+    the overview is built while the track streams past, e.g. during loudness analysis.
+    """
+
+    def __init__(self, window=WINDOW_FRAMES):
+        import numpy as np
+        self._np = np
+        self.window = window
+        self._mins = []
+        self._maxs = []
+        self._squares = []
+        self._carry = None
+
+    def add(self, block):
+        np = self._np
+        if self._carry is not None and len(self._carry):
+            block = np.concatenate((self._carry, block))
+        n = len(block) // self.window
+        self._carry = block[n * self.window:]
+        if n:
+            self._reduce(block[:n * self.window].reshape(n, -1))
+
+    def _reduce(self, windows):
+        # One row per window, both channels side by side
+        np = self._np
+        self._mins.append(windows.min(axis=1))
+        self._maxs.append(windows.max(axis=1))
+        self._squares.append(np.square(windows, dtype=np.float32).mean(axis=1))
+
+    def finish(self, buckets=BUCKETS):
+        """Merge the windows into at most buckets columns; None for a track with no audio"""
+        np = self._np
+        if self._carry is not None and len(self._carry):
+            self._reduce(self._carry.reshape(1, -1))
+            self._carry = None
+        if not self._mins:
+            return None
+        mins = np.concatenate(self._mins)
+        maxs = np.concatenate(self._maxs)
+        squares = np.concatenate(self._squares)
+
+        count = len(mins)
+        n = min(buckets, count)
+        starts = np.arange(n) * count // n  # strictly increasing, so every bucket gets at least one window
+        sizes = np.diff(np.append(starts, count))
+        rms = np.sqrt(np.add.reduceat(squares, starts) / sizes)
+        return Waveform(
+            array("b", (np.minimum.reduceat(mins, starts) >> 8).astype(np.int8).tobytes()),
+            array("b", (np.maximum.reduceat(maxs, starts) >> 8).astype(np.int8).tobytes()),
+            array("B", np.clip(rms / 128, 0, 255).astype(np.uint8).tobytes()),
+        )
+
+def compute_waveform(path):
+    """Decode a file once and return its Waveform"""
+    from audio_decode import iter_pcm
+    builder = WaveformBuilder()
+    for block in iter_pcm(path):
+        builder.add(block)
+    return builder.finish()
+
+def cached_waveform(path, metadata):
+    """Return the stored Waveform for a file, or None"""
+    blob = metadata.get_blob(path, BLOB_KIND)
+    return Waveform.from_bytes(blob) if blob else None
+
+def load_waveform(path, metadata, processes):
+    """Worker: return the stored Waveform for a file, computing it in the processes pool and storing it on first use"""
+    waveform = cached_waveform(path, metadata)
+    if waveform is None:
+        waveform = processes.submit(compute_waveform, path).result()
+        if waveform is not None:
+            metadata.put_blob(path, BLOB_KIND, waveform.to_bytes())
+    return waveform
@@ -0,0 +1,73 @@
+# waveform_view.py
+import tkinter as tk
+
+# Configuration
+HEIGHT = 28            # px of the overview drawn above the seek slider
+BACKGROUND = "#262626"
+PEAK_COLORS = ("#3d5f8a", "#4a4a4a")   # played, not yet played
+RMS_COLORS = ("#5b9be0", "#767676")
+
+class WaveformView(tk.Canvas):
+    """Draws a Waveform as peak and RMS bars, highlighting the part already played.
+
+    Moving the playhead recolours only the bars it passed, so it can follow every
+    position update. on_seek(fraction) is called when the overview is clicked.
+    """
+
+    def __init__(self, master, on_seek=None, height=HEIGHT, **kwargs):
+        super().__init__(master, height=height, bg=BACKGROUND, highlightthickness=0, bd=0, **kwargs)
+        self.on_seek = on_seek
+        self.waveform = None
+        self._bars = []     # (peak item, rms item) per drawn column
+        self._played = 0    # columns drawn in the played colours
+        self._fraction = 0.0
+        self.bind("<Configure>", lambda event: self._draw())
+        self.bind("<Button-1>", self._on_click)
+
+    def show(self, waveform):
+        """Draw waveform, or clear the overview for None"""
+        self.waveform = waveform
+        self._fraction = 0.0
+        self._draw()
+
+    def set_progress(self, fraction):
+        self._fraction = min(1.0, max(0.0, fraction))
+        played = round(self._fraction * len(self._bars))
+        if played == self._played:
+            return
+        low, high = sorted((played, self._played))
+        colors = 0 if played > self._played else 1
+        for peak, rms in self._bars[low:high]:
+            self.itemconfigure(peak, fill=PEAK_COLORS[colors])
+            self.itemconfigure(rms, fill=RMS_COLORS[colors])
+        self._played = played
+
+    def _draw(self):
+        self.delete("all")
+        self._bars = []
+        self._played = 0
+        waveform = self.waveform
+        width = self.winfo_width()
+        height = int(self["height"])
+        if not waveform or width <= 1:
+            return
+        # One bar per bucket, or per pixel when the canvas is narrower than the overview
+        columns = min(len(waveform), width)
+        step = width / columns
+        middle = height / 2
+        scale = middle / 128
+        for i in range(columns):
+            bucket = i * len(waveform) // columns
+            x = i * step + step / 2
+            level = waveform.rms[bucket] / 2  # RMS bytes span 0-255, samples -128-127
+            peak = self.create_line(x, middle - max(waveform.maxs[bucket] * scale, 1), x,
+                                    middle - min(waveform.mins[bucket] * scale, -1),
+                                    width=max(1, step - 1), fill=PEAK_COLORS[1])
+            rms = self.create_line(x, middle - level * scale, x, middle + level * scale,
+                                   width=max(1, step - 1), fill=RMS_COLORS[1])
+            self._bars.append((peak, rms))
+        self.set_progress(self._fraction)
+
+    def _on_click(self, event):
+        if self.waveform and self.on_seek and self.winfo_width() > 1:
+            self.on_seek(min(1.0, max(0.0, event.x / self.winfo_width())))
@@ -0,0 +1,189 @@
+# workers.py
+import time
+import heapq
+import queue
+import itertools
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import traced
+
+# Configuration
+WORKERS = 4
+PUMP_INTERVAL = 10   # ms between checks for finished tasks while any are outstanding
+PUMP_SLICE = 0.008   # seconds of completion callbacks per pump, so the UI stays responsive
+PROCESSES = 2        # worker processes behind WorkerPool.processes
+
+# Priorities, lowest first
+PLAYBACK = 0   # a track the user asked to hear
+VISIBLE = 1    # artwork for rows on screen
+LIBRARY = 2    # catalog loading
+PREFETCH = 3   # read-ahead nobody is waiting for yet
+
+# Task states
+PENDING = "pending"
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+
+def report_error(error):
+    """Print an error a worker ran into with its traceback, as the pump does for failing callbacks"""
+    traceback.print_exception(error)
+
+class Task:
+    """Handle for submitted work; on_done(result) or on_error(error) runs on the scheduler's thread"""
+
+    __slots__ = ("fn", "args", "priority", "on_done", "on_error", "state", "result", "error", "_lock")
+
+    def __init__(self, fn, args, priority, on_done, on_error, lock):
+        self._lock = lock  # the pool's, so state changes never race a worker picking the task up
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.on_done = on_done
+        self.on_error = on_error
+        self.state = PENDING
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        """Drop the task; returns False if it had already started, in which case only its callback is skipped"""
+        with self._lock:
+            started = self.state != PENDING
+            if self.state in (PENDING, RUNNING):
+                self.state = CANCELLED
+        return not started
+
+    @property
+    def cancelled(self):
+        return self.state == CANCELLED
+
+class WorkerPool:
+    """Threads that run blocking work by priority and hand results back through one after() pump.
+
+    scheduler is the Tk root or an AsyncioScheduler; submit(), cancel() and every
+    callback happen on its thread, and only post() may be called from others. The pump
+    only runs while tasks are outstanding or posted callbacks are waiting, and delivers
+    them all in one go, so any number of subsystems share a single polling loop.
+    """
+
+    def __init__(self, scheduler, workers=WORKERS):
+        self.scheduler = scheduler
+        self._heap = []     # (priority, sequence, task)
+        self._sequence = itertools.count()  # keeps equal priorities first-in, first-out
+        self._ready = threading.Condition()
+        self._done = queue.SimpleQueue()  # finished tasks and posted callbacks, in completion order
+        self._outstanding = 0
+        self._pumping = False
+        self._pump_lock = threading.Lock()  # post() starts the pump from other threads
+        self._closed = False
+        self._processes = None
+        self._processes_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._work, name=f"worker-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority=LIBRARY, on_done=None, on_error=None):
+        task = Task(fn, args, priority, on_done, on_error, self._ready)
+        with self._ready:
+            heapq.heappush(self._heap, (priority, next(self._sequence), task))
+            self._ready.notify()
+        self._outstanding += 1
+        self._start_pump()
+        return task
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the scheduler's thread, e.g. to stream partial results.
+
+        Callable from any thread: a worker, or a long-running thread of its own that
+        would otherwise hold a worker and keep the pump polling for its whole run.
+        """
+        self._done.put((None, callback, args))
+        self._start_pump()
+
+    @property
+    def processes(self):
+        """Process pool, started on first use, for decoding audio outside the player's process.
+
+        Workers hand it files to decode and wait for the result, so decoding never holds
+        the GIL the UI needs or touches the player's mixer.
+        """
+        with self._processes_lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(max_workers=PROCESSES)
+            return self._processes
+
+    def shutdown(self):
+        with self._ready:
+            self._closed = True
+            for _, _, task in self._heap:
+                task.state = CANCELLED
+            self._heap = []
+            self._ready.notify_all()
+        with self._processes_lock:
+            if self._processes is not None:
+                self._processes.shutdown(wait=False, cancel_futures=True)
+                self._processes = None
+
+    def _work(self):
+        while True:
+            with self._ready:
+                while not self._heap and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                task = heapq.heappop(self._heap)[2]
+                if task.state != PENDING:
+                    self._done.put((task, None, None))  # Cancelled while queued; still settles the count
+                    continue
+                task.state = RUNNING
+            try:
+                task.result = task.fn(*task.args)
+            except Exception as e:
+                task.error = e
+            with self._ready:
+                if task.state == RUNNING:
+                    task.state = FINISHED
+            self._done.put((task, None, None))
+
+    def _start_pump(self):
+        with self._pump_lock:
+            if self._pumping:
+                return
+            self._pumping = True
+        # From another thread, Tk and AsyncioScheduler hand the call over to the scheduler's
+        self.scheduler.after(PUMP_INTERVAL, self._pump)
+
+    @traced("WorkerPool._pump")
+    def _pump(self):
+        deadline = time.perf_counter() + PUMP_SLICE
+        while time.perf_counter() < deadline:
+            try:
+                task, callback, args = self._done.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if task is None:
+                    callback(*args)
+                    continue
+                self._outstanding -= 1
+                if task.state == CANCELLED:
+                    continue
+                if task.error is not None:
+                    if task.on_error is None:
+                        raise task.error
+                    task.on_error(task.error)
+                elif task.on_done is not None:
+                    task.on_done(task.result)
+            except Exception:
+                # One failing callback must not stall every other subsystem's results
+                traceback.print_exc()
+
+        with self._pump_lock:
+            # Checked under the lock, so a callback posted meanwhile either is seen here or restarts the pump
+            waiting = not self._done.empty()
+            self._pumping = bool(self._outstanding or waiting)
+        if self._pumping:
+            # Come straight back if the slice ran out with results still waiting
+            self.scheduler.after(1 if waiting else PUMP_INTERVAL, self._pump)